@@ -0,0 +1,231 @@
+"""
+Server side animations.
+
+Animations are described as a timeline of keyframes, each of which assigns a color to the six LEDs. The timeline is
+rendered up front into a frame buffer, and a player walks the buffer at the requested frame rate, only sending the
+LEDs that changed since the last frame.
+
+```
+{
+    "fps": 30,
+    "repeat": 0,
+    "space": "oklab",
+    "easing": "ease-in-out",
+    "keyframes": [
+        {"time": 0, "colors": "red"},
+        {"time": 0.5, "colors": ["red", "red", "red", "blue", "blue", "blue"], "easing": "step"},
+        {"time": 1, "colors": "red"}
+    ]
+}
+```
+
+`time` is in seconds, `colors` is either a single color for all LEDs or a list of six colors, and a `repeat` of 0
+will loop the animation until it is stopped. Colors are interpolated in `space` (`srgb` or `oklab`), and the transition
+from a keyframe to the next follows its `easing` (defaulting to the animation's `easing`, or `linear`). See
+`interpolate.EASINGS` for the available easings.
+"""
+import time
+import gevent
+from . import usb
+from . import interpolate
+from . import common as cmn
+
+LED_COUNT = interpolate.LED_COUNT
+FPS_DEFAULT = 30
+FPS_MAX = 60
+# An hour at the maximum frame rate.
+FRAMES_MAX = 3600 * FPS_MAX
+
+LEDS = (cmn.LED_1, cmn.LED_2, cmn.LED_3, cmn.LED_4, cmn.LED_5, cmn.LED_6)
+
+
+class Animation:
+    """Rendered animation."""
+
+    def __init__(self, timeline, fps=FPS_DEFAULT, repeat=1):
+        """Initialize."""
+
+        if not len(timeline):
+            raise ValueError('Animations must have at least one frame')
+        self.timeline = timeline
+        self.count = len(timeline)
+        self.fps = fps
+        self.repeat = repeat
+
+    def frame(self, index):
+        """Get the LED colors of the given frame."""
+
+        return self.timeline.frame(index)
+
+
+def resolve_colors(colors):
+    """Resolve a keyframe's colors to a list of six RGB tuples."""
+
+    if isinstance(colors, str):
+        colors = [colors] * LED_COUNT
+    elif not isinstance(colors, list) or len(colors) != LED_COUNT:
+        raise ValueError("'colors' must be a color or a list of {} colors".format(LED_COUNT))
+    rgb = []
+    for color in colors:
+        cmn.is_str('colors', color)
+        rgb.append(usb.resolve_color(color))
+    return rgb
+
+
+def resolve_easing(easing):
+    """Resolve an easing function by name."""
+
+    cmn.is_str('easing', easing)
+    if easing not in interpolate.EASINGS:
+        raise ValueError(
+            'Easing must be one of {}, {} was given'.format(', '.join(sorted(interpolate.EASINGS)), easing)
+        )
+    return interpolate.EASINGS[easing]
+
+
+def parse_animation(obj):
+    """Validate an animation description and render it."""
+
+    if not isinstance(obj, dict):
+        raise TypeError('Animation must be a JSON object')
+
+    fps = obj.get('fps', FPS_DEFAULT)
+    cmn.is_int('fps', fps)
+    if not 1 <= fps <= FPS_MAX:
+        raise ValueError('Frame rate must be between 1 and {}, {} was given'.format(FPS_MAX, fps))
+    repeat = obj.get('repeat', 1)
+    cmn.is_int('repeat', repeat)
+    cmn.validate_repeat(repeat)
+    space = obj.get('space', interpolate.SPACE_SRGB)
+    cmn.is_str('space', space)
+    if space not in interpolate.SPACES:
+        raise ValueError(
+            'Interpolation space must be one of {}, {} was given'.format(', '.join(sorted(interpolate.SPACES)), space)
+        )
+    easing = obj.get('easing', 'linear')
+
+    entries = obj.get('keyframes')
+    if not isinstance(entries, list) or not entries:
+        raise ValueError("'keyframes' must be a non-empty list")
+
+    keyframes = []
+    last = 0
+    for entry in entries:
+        if not isinstance(entry, dict):
+            raise TypeError('Keyframes must be JSON objects')
+        t = entry.get('time', last)
+        if isinstance(t, bool) or not isinstance(t, (int, float)) or t < last:
+            raise ValueError("Keyframe 'time' must be a number of seconds no earlier than the previous keyframe")
+        keyframes.append((t, resolve_colors(entry.get('colors')), resolve_easing(entry.get('easing', easing))))
+        last = t
+
+    count = round(last * fps) + 1
+    if count > FRAMES_MAX:
+        raise ValueError('Animations cannot exceed {} frames, {} frames were given'.format(FRAMES_MAX, count))
+
+    return Animation(interpolate.render(keyframes, fps, space), fps, repeat)
+
+
+class Player:
+    """
+    Animation player.
+
+    Frames are scheduled against a monotonic clock relative to the start of the animation, so timing errors do not
+    accumulate. If the player falls behind, late frames are dropped (and counted) to catch up.
+    """
+
+    def __init__(self, write, timer=time.monotonic):
+        """
+        Initialize.
+
+        `write` receives a list of device reports to send for a frame, and returns `True` if the frame was shown.
+        """
+
+        self.write = write
+        self.timer = timer
+        self.greenlet = None
+        self.shown = None
+        self.played = 0
+        self.dropped = 0
+        self.writes = 0
+
+    @property
+    def running(self):
+        """Check if an animation is playing."""
+
+        return self.greenlet is not None and not self.greenlet.dead
+
+    def play(self, animation):
+        """Play an animation, replacing any that is already playing."""
+
+        self.stop()
+        self.greenlet = gevent.spawn(self._run, animation)
+
+    def stop(self):
+        """Stop the current animation."""
+
+        if self.greenlet is not None:
+            if self.greenlet is not gevent.getcurrent():
+                self.greenlet.kill()
+            self.greenlet = None
+        # Another command is about to change the LEDs, so we no longer know what is shown.
+        self.shown = None
+
+    def stats(self):
+        """Get player statistics."""
+
+        return {
+            "running": self.running,
+            "played": self.played,
+            "dropped": self.dropped,
+            "writes": self.writes
+        }
+
+    def reports(self, frame):
+        """Build the reports needed to go from the currently shown frame to the given frame."""
+
+        shown = self.shown
+        changed = [
+            led for led in range(LED_COUNT)
+            if shown is None or frame[led * 3:led * 3 + 3] != shown[led * 3:led * 3 + 3]
+        ]
+        if not changed:
+            return []
+        if len(changed) > 1 and frame[:3] * LED_COUNT == frame:
+            return [bytes([usb.CMD_REPORT_NUM, usb.MODE_STATIC, cmn.LED_ALL, *frame[:3], 0, 0, 0])]
+        return [
+            bytes([usb.CMD_REPORT_NUM, usb.MODE_STATIC, LEDS[led], *frame[led * 3:led * 3 + 3], 0, 0, 0])
+            for led in changed
+        ]
+
+    def _run(self, animation):
+        """Play the animation."""
+
+        interval = 1.0 / animation.fps
+        end = animation.count * animation.repeat if animation.repeat else None
+        start = self.timer()
+        index = 0
+        while end is None or index < end:
+            target = start + index * interval
+            now = self.timer()
+            if now < target:
+                gevent.sleep(target - now)
+            else:
+                late = int((now - target) / interval)
+                if end is not None:
+                    # Always show the final frame.
+                    late = min(late, end - index - 1)
+                self.dropped += late
+                index += late
+
+            frame = animation.frame(index % animation.count)
+            reports = self.reports(frame)
+            if reports:
+                if self.write(reports):
+                    self.writes += len(reports)
+                else:
+                    # We no longer know what is shown.
+                    frame = None
+            self.shown = frame
+            self.played += 1
+            index += 1
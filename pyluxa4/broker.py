@@ -0,0 +1,289 @@
+"""
+Local device broker.
+
+Opening a Luxafor device means loading the hidapi library, enumerating devices, and opening the device, which a short
+lived script has to pay on every run. The broker keeps devices open and accepts pre-encoded device reports, framed as
+described in `protocol`, over a local Unix domain socket. Access to the broker is controlled by the socket's file
+permissions, so frame tokens are ignored, and the frame's device selector is the index of the device to use.
+
+`open_luxafor` returns a proxy to the broker's device if a broker is running, and opens the device directly otherwise.
+"""
+import getpass
+import os
+import socket
+import socketserver
+import stat
+import tempfile
+import threading
+from . import usb
+from . import protocol
+from .common import LED_ALL, WAVE_SHORT
+
+SOCKET_MODE = 0o600
+TIMEOUT = 1.0
+
+
+def default_socket_path():
+    """Get the default path of the broker socket."""
+
+    runtime = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime:
+        return os.path.join(runtime, 'pyluxa4.sock')
+    return os.path.join(tempfile.gettempdir(), 'pyluxa4-{}.sock'.format(getpass.getuser()))
+
+
+class BrokerHandler(socketserver.StreamRequestHandler):
+    """Handle a connection to the broker."""
+
+    def handle(self):
+        """Forward frames to the device until the client disconnects."""
+
+        while True:
+            try:
+                frame = protocol.read_frame(self.rfile.read)
+            except protocol.ProtocolError:
+                # We can't recover the frame boundaries, so drop the connection.
+                break
+            if frame is None:
+                break
+            self.wfile.write(protocol.encode_response(frame.seq, self.server.broker.send(frame.device, frame.report)))
+
+
+class BrokerServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Threaded Unix domain socket server."""
+
+    daemon_threads = True
+
+    def __init__(self, path, broker, mode=SOCKET_MODE):
+        """Initialize."""
+
+        self.broker = broker
+        self.mode = mode
+        super().__init__(path, BrokerHandler)
+
+    def server_bind(self):
+        """Bind the socket so that it is never accessible beyond the configured mode."""
+
+        umask = os.umask(0o777 & ~self.mode)
+        try:
+            super().server_bind()
+        finally:
+            os.umask(umask)
+        os.chmod(self.server_address, self.mode)
+
+
+class Broker:
+    """Keep Luxafor devices open and send reports to them."""
+
+    def __init__(self, path=None, mode=SOCKET_MODE, device_path=None):
+        """Initialize."""
+
+        self.path = default_socket_path() if path is None else path
+        self.mode = mode
+        self.device_path = device_path
+        self.devices = {}
+        self.lock = threading.Lock()
+        self.server = None
+
+    def device(self, index):
+        """Get the device, opening it if it isn't already open."""
+
+        device = self.devices.get(index)
+        if device is None:
+            if self.device_path is not None:
+                if index != protocol.DEVICE_DEFAULT:
+                    raise ValueError('Only device {} is served by this broker'.format(protocol.DEVICE_DEFAULT))
+                device = usb.Luxafor(path=self.device_path, supervisor=usb.ReconnectSupervisor())
+            else:
+                device = usb.Luxafor(index, supervisor=usb.ReconnectSupervisor())
+            self.devices[index] = device
+        return device
+
+    def send(self, index, report):
+        """
+        Send a report to the device.
+
+        Returns a protocol status.
+        """
+
+        try:
+            usb.validate_report(report)
+        except ValueError:
+            return protocol.STATUS_BAD_REQUEST
+
+        with self.lock:
+            try:
+                if self.device(index).send_report(report):
+                    return protocol.STATUS_FAILED
+            except Exception:
+                return protocol.STATUS_FAILED
+        return protocol.STATUS_OK
+
+    def _remove_stale(self):
+        """Remove a socket left over by a broker that is no longer running."""
+
+        if not os.path.exists(self.path):
+            return
+        if not stat.S_ISSOCK(os.stat(self.path).st_mode):
+            raise RuntimeError('{} already exists and is not a socket'.format(self.path))
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.path)
+        except OSError:
+            os.remove(self.path)
+        else:
+            raise RuntimeError('A broker is already running on {}'.format(self.path))
+        finally:
+            sock.close()
+
+    def serve_forever(self):
+        """Serve until shutdown."""
+
+        if not hasattr(socket, 'AF_UNIX'):
+            raise RuntimeError('Unix domain sockets are not supported on this platform')
+
+        self._remove_stale()
+        self.server = BrokerServer(self.path, self, self.mode)
+        try:
+            self.server.serve_forever()
+        finally:
+            self.close()
+
+    def shutdown(self):
+        """Stop serving, must be called from another thread."""
+
+        if self.server is not None:
+            self.server.shutdown()
+
+    def close(self):
+        """Close the server and the devices."""
+
+        if self.server is not None:
+            self.server.server_close()
+            self.server = None
+            if os.path.exists(self.path):
+                os.remove(self.path)
+        with self.lock:
+            for device in self.devices.values():
+                device.close()
+            self.devices.clear()
+
+
+class BrokerDevice:
+    """
+    Luxafor device served by a broker.
+
+    Provides the same commands as `usb.Luxafor`, and like `usb.Luxafor`, commands return `True` if they failed.
+    The broker cannot wait for commands to complete, so `wait` is ignored.
+    """
+
+    def __init__(self, sock, index=protocol.DEVICE_DEFAULT):
+        """Initialize."""
+
+        self.sock = sock
+        self.reader = sock.makefile('rb')
+        self.index = index
+        self.seq = 0
+
+    def __enter__(self):
+        """Enter."""
+
+        return self
+
+    def __exit__(self, type, value, traceback):  # noqa: A002
+        """Exit."""
+
+        return self.close()
+
+    def close(self):
+        """Close the connection to the broker."""
+
+        if self.sock is not None:
+            self.reader.close()
+            self.sock.close()
+            self.sock = None
+            self.reader = None
+
+    def send_report(self, report, *, wait=False):
+        """Send a pre-encoded report."""
+
+        usb.validate_report(report)
+        if self.sock is None:
+            return True
+        self.seq = (self.seq + 1) & protocol.SEQ_MAX
+        try:
+            self.sock.sendall(protocol.encode_frame(report, self.seq, device=self.index))
+            seq, status = protocol.decode_response(self.reader.read(protocol.RESPONSE.size))
+        except (OSError, protocol.ProtocolError):
+            self.close()
+            return True
+        if seq != self.seq:
+            # Out of step with the broker, so the connection can no longer be used.
+            self.close()
+            return True
+        return status != protocol.STATUS_OK
+
+    def off(self):
+        """Set all LEDs to off."""
+
+        return self.send_report(usb.off_report())
+
+    def basic_color(self, color):
+        """Set a basic color."""
+
+        return self.send_report(usb.basic_color_report(color))
+
+    def color(self, color, *, led=LED_ALL):
+        """Set a static color."""
+
+        return self.send_report(usb.color_report(color, led=led))
+
+    def fade(self, color, *, led=LED_ALL, speed=1, wait=False):
+        """Fade to a color."""
+
+        return self.send_report(usb.fade_report(color, led=led, speed=speed))
+
+    def wave(self, color, *, wave=WAVE_SHORT, speed=0, repeat=0, wait=False):
+        """Use the wave effect."""
+
+        return self.send_report(usb.wave_report(color, wave=wave, speed=speed, repeat=repeat))
+
+    def strobe(self, color, *, led=LED_ALL, speed=0, repeat=0, wait=False):
+        """Strobe a color."""
+
+        return self.send_report(usb.strobe_report(color, led=led, speed=speed, repeat=repeat))
+
+    def pattern(self, pattern, *, repeat=0, wait=False):
+        """Use a built-in pattern."""
+
+        return self.send_report(usb.pattern_report(pattern, repeat=repeat))
+
+
+def connect(index=protocol.DEVICE_DEFAULT, path=None, timeout=TIMEOUT):
+    """Connect to a running broker, returns `None` if no broker is running."""
+
+    if not hasattr(socket, 'AF_UNIX'):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(default_socket_path() if path is None else path)
+    except OSError:
+        sock.close()
+        return None
+    return BrokerDevice(sock, index)
+
+
+def open_luxafor(index=0, path=None, hidapi=None, socket_path=None, backend=usb.BACKEND_HIDAPI):
+    """
+    Open a Luxafor device through the broker if one is running, and directly otherwise.
+
+    Devices selected by `path` are always opened directly.
+    """
+
+    if path is None:
+        device = connect(index, socket_path)
+        if device is not None:
+            return device
+    usb.init(hidapi, backend)
+    return usb.Luxafor(index, path)
@@ -0,0 +1,85 @@
+"""Caching utilities."""
+import time
+from collections import OrderedDict
+
+
+class ExpiringCache:
+    """
+    Bounded, time expiring, least recently used cache.
+
+    Entries expire `ttl` seconds after they are set, and the least recently used entry is evicted when the cache is
+    full. Lookups are counted so that the effectiveness of the cache can be reported.
+    """
+
+    def __init__(self, size=256, ttl=300, timer=time.monotonic):
+        """Initialize."""
+
+        if size < 1:
+            raise ValueError('Cache size must be greater than zero')
+        self.size = size
+        self.ttl = ttl
+        self.timer = timer
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def __len__(self):
+        """Get the number of cached entries."""
+
+        return len(self.entries)
+
+    def _purge(self, now):
+        """Remove expired entries."""
+
+        # Entries are ordered by use, not by age, so we have to check them all.
+        expired = [key for key, (expires, _) in self.entries.items() if expires <= now]
+        for key in expired:
+            del self.entries[key]
+        self.expired += len(expired)
+
+    def get(self, key, default=None):
+        """Get a cached value."""
+
+        entry = self.entries.get(key)
+        if entry is not None:
+            if entry[0] > self.timer():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            del self.entries[key]
+            self.expired += 1
+        self.misses += 1
+        return default
+
+    def set(self, key, value):  # noqa: A003
+        """Cache a value."""
+
+        now = self.timer()
+        if key in self.entries:
+            del self.entries[key]
+        elif len(self.entries) >= self.size:
+            self._purge(now)
+            while len(self.entries) >= self.size:
+                self.entries.popitem(last=False)
+                self.evicted += 1
+        self.entries[key] = (now + self.ttl, value)
+
+    def clear(self):
+        """Clear the cache."""
+
+        self.entries.clear()
+
+    def stats(self):
+        """Get cache statistics."""
+
+        return {
+            "size": len(self.entries),
+            "max_size": self.size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "evicted": self.evicted
+        }
@@ -6,20 +6,40 @@ import json
 from . import common as cmn
 from . import __meta__
 from . import client
+from . import loader
 
 
 def process_schedule(schedule):
-    """Read JSON file."""
+    """Read JSON or JSON Lines schedule file."""
 
     config = None
     if schedule and os.path.exists(schedule) and os.path.isfile(schedule):
-        with open(schedule, 'r') as f:
-            config = json.loads(f.read())
-        if not isinstance(config, list):
-            raise ValueError('JSON file should contain a list of events')
+        config = loader.read_schedule(schedule)
     return config
 
 
+def process_animation(animation):
+    """Read JSON animation file."""
+
+    with open(animation, 'r') as f:
+        config = json.loads(f.read())
+    if not isinstance(config, dict):
+        raise ValueError('JSON file should contain an animation object')
+    return config
+
+
+def process_scenes(scenes):
+    """Read JSON scenes file and compile the scenes."""
+
+    from . import scenes as sc
+
+    if not scenes:
+        return None
+    with open(scenes, 'r') as f:
+        config = json.loads(f.read())
+    return sc.load_scenes(config)
+
+
 class LedAction(argparse.Action):
     """Resolve LED options."""
 
@@ -83,13 +103,41 @@ class TimerAction(argparse.Action):
 def connection_args(parser):
     """Connection arguments to control the request."""
 
-    parser.add_argument('--host', default=client.HOST, help="Host.")
+    parser.add_argument('--host', default=client.HOST, help="Host or local socket in the form unix://<path>.")
     parser.add_argument('--port', type=int, default=client.PORT, help="Port.")
     parser.add_argument(
         '--secure', default=None,
         help="Enable https requests: enable verification (1), disable verification(0), or specify a certificate."
     )
     parser.add_argument('--timeout', type=int, default=client.TIMEOUT, help="Timeout.")
+    parser.add_argument(
+        '--hosts', default=None,
+        help=(
+            "Send the command to many servers in parallel: a comma separated list of host[:port] endpoints, "
+            "or @<file> to read one endpoint per line. Overrides --host."
+        )
+    )
+    parser.add_argument(
+        '--workers', type=int, default=8, help="Maximum number of servers to send to at once when using --hosts."
+    )
+    parser.add_argument(
+        '--retries', type=int, default=0, help="Retry commands that time out or fail to connect this many times."
+    )
+
+
+def get_client(args):
+    """Get the client for the requested connection."""
+
+    token = getattr(args, 'token', '')
+    if args.hosts:
+        if args.hosts.startswith('@'):
+            endpoints = client.read_endpoints(args.hosts[1:])
+        else:
+            endpoints = [e for e in args.hosts.split(',') if e.strip()]
+        return client.LuxFleet(
+            endpoints, args.secure, token, workers=args.workers, port=args.port, retries=args.retries
+        )
+    return client.LuxRest(args.host, args.port, args.secure, token, retries=args.retries)
 
 
 def cmd_color(argv):
@@ -102,7 +150,7 @@ def cmd_color(argv):
     connection_args(parser)
     args = parser.parse_args(argv)
 
-    return client.LuxRest(args.host, args.port, args.secure, args.token).color(
+    return get_client(args).color(
         args.color,
         led=args.led,
         timeout=args.timeout
@@ -120,7 +168,7 @@ def cmd_fade(argv):
     connection_args(parser)
     args = parser.parse_args(argv)
 
-    return client.LuxRest(args.host, args.port, args.secure, args.token).fade(
+    return get_client(args).fade(
         args.color,
         led=args.led,
         speed=args.speed,
@@ -140,7 +188,7 @@ def cmd_strobe(argv):
     connection_args(parser)
     args = parser.parse_args(argv)
 
-    return client.LuxRest(args.host, args.port, args.secure, args.token).strobe(
+    return get_client(args).strobe(
         args.color,
         led=args.led,
         speed=args.speed,
@@ -161,7 +209,7 @@ def cmd_wave(argv):
     connection_args(parser)
     args = parser.parse_args(argv)
 
-    return client.LuxRest(args.host, args.port, args.secure, args.token).wave(
+    return get_client(args).wave(
         args.color,
         wave=args.wave,
         speed=args.speed,
@@ -180,7 +228,7 @@ def cmd_pattern(argv):
     connection_args(parser)
     args = parser.parse_args(argv)
 
-    return client.LuxRest(args.host, args.port, args.secure, args.token).pattern(
+    return get_client(args).pattern(
         args.pattern,
         repeat=args.repeat,
         timeout=args.timeout
@@ -195,7 +243,7 @@ def cmd_off(argv):
     connection_args(parser)
     args = parser.parse_args(argv)
 
-    return client.LuxRest(args.host, args.port, args.secure, args.token).off(
+    return get_client(args).off(
         timeout=args.timeout
     )
 
@@ -207,7 +255,7 @@ def cmd_version(argv):
     connection_args(parser)
     args = parser.parse_args(argv)
 
-    return client.LuxRest(args.host, args.port, args.secure).version(timeout=args.timeout)
+    return get_client(args).version(timeout=args.timeout)
 
 
 def cmd_kill(argv):
@@ -218,7 +266,7 @@ def cmd_kill(argv):
     connection_args(parser)
     args = parser.parse_args(argv)
 
-    return client.LuxRest(args.host, args.port, args.secure, args.token).kill(
+    return get_client(args).kill(
         timeout=args.timeout
     )
 
@@ -227,14 +275,14 @@ def cmd_scheduler(argv):
     """Send a schedule to execute patterns and/or clear existing schedules."""
 
     parser = argparse.ArgumentParser(prog='pyluxa4 scheduler', description="Schedule events.")
-    parser.add_argument('--schedule', help="JSON schedule file.")
+    parser.add_argument('--schedule', help="JSON or JSON Lines schedule file.")
     parser.add_argument('--clear', action='store_true', help="Clear all scheduled events.")
     parser.add_argument('--cancel', action='store_true', help="Cancel timers.")
     parser.add_argument('--token', default='', help="Send API token.")
     connection_args(parser)
     args = parser.parse_args(argv)
 
-    return client.LuxRest(args.host, args.port, args.secure, args.token).scheduler(
+    return get_client(args).scheduler(
         schedule=process_schedule(args.schedule),
         clear=args.clear,
         cancel=args.cancel,
@@ -242,6 +290,43 @@ def cmd_scheduler(argv):
     )
 
 
+def cmd_animation(argv):
+    """Play an animation on the server."""
+
+    parser = argparse.ArgumentParser(prog='pyluxa4 animation', description="Play an animation.")
+    parser.add_argument('animation', help="JSON animation file.")
+    parser.add_argument('--fps', type=int, default=None, help="Frame rate (overrides the file).")
+    parser.add_argument(
+        '--repeat', type=int, default=None, help="Number of times to play, 0 loops forever (overrides the file)."
+    )
+    parser.add_argument('--token', default='', help="Send API token.")
+    connection_args(parser)
+    args = parser.parse_args(argv)
+
+    config = process_animation(args.animation)
+    return get_client(args).animation(
+        config.get('keyframes'),
+        fps=config.get('fps', 30) if args.fps is None else args.fps,
+        repeat=config.get('repeat', 1) if args.repeat is None else args.repeat,
+        timeout=args.timeout
+    )
+
+
+def cmd_scene(argv):
+    """Apply a named scene on the server."""
+
+    parser = argparse.ArgumentParser(prog='pyluxa4 scene', description="Apply a scene.")
+    parser.add_argument('scene', help="Name of a scene loaded by the server.")
+    parser.add_argument('--token', default='', help="Send API token.")
+    connection_args(parser)
+    args = parser.parse_args(argv)
+
+    return get_client(args).scene(
+        args.scene,
+        timeout=args.timeout
+    )
+
+
 def cmd_timer(argv):
     """Setup timers."""
 
@@ -352,7 +437,7 @@ def cmd_timer(argv):
     if led is not None:
         schedule['args']['led'] = led
 
-    return client.LuxRest(args.host, args.port, args.secure, args.token).scheduler(
+    return get_client(args).scheduler(
         schedule=[schedule],
         clear=False,
         timeout=args.timeout
@@ -363,36 +448,96 @@ def cmd_get(argv):
     """Get information."""
 
     parser = argparse.ArgumentParser(prog='pyluxa4 get', description="Get information.")
-    parser.add_argument('info', help="Request information: schedule or timers.")
+    parser.add_argument('info', help="Request information: schedule, timers, or stats.")
     parser.add_argument('--token', default='', help="Send API token.")
     connection_args(parser)
     args = parser.parse_args(argv)
 
     if args.info == 'schedule':
-        return client.LuxRest(args.host, args.port, args.secure, args.token).get_schedule(
+        return get_client(args).get_schedule(
             timeout=args.timeout
         )
     elif args.info == 'timers':
-        return client.LuxRest(args.host, args.port, args.secure, args.token).get_timers(
+        return get_client(args).get_timers(
+            timeout=args.timeout
+        )
+    elif args.info == 'stats':
+        return get_client(args).get_stats(
             timeout=args.timeout
         )
     else:
         parser.error('Unrecognized requested data {}'.format(args.info))
 
 
+def cmd_events(argv):
+    """Stream events."""
+
+    parser = argparse.ArgumentParser(
+        prog='pyluxa4 events', description="Stream device and scheduler events, one JSON object per line."
+    )
+    parser.add_argument('--host', default=client.HOST, help="Host or local socket in the form unix://<path>.")
+    parser.add_argument('--port', type=int, default=client.PORT, help="Port.")
+    parser.add_argument(
+        '--secure', default=None,
+        help="Enable https requests: enable verification (1), disable verification(0), or specify a certificate."
+    )
+    parser.add_argument('--token', default='', help="Send API token.")
+    parser.add_argument('--last-id', type=int, default=None, help="Resume after the given event ID.")
+    parser.add_argument(
+        '--timeout', type=int, default=0, help="Give up if the server sends nothing for this many seconds (0 waits)."
+    )
+    args = parser.parse_args(argv)
+
+    lux = client.LuxRest(args.host, args.port, args.secure, args.token)
+    for event in lux.events(last_id=args.last_id, timeout=args.timeout or None):
+        if event.get('status') == 'fail':
+            print(event)
+            return 1
+        print(json.dumps(event), flush=True)
+    return 0
+
+
 def cmd_serve(argv):
     """Start the server."""
     from . import server
 
     parser = argparse.ArgumentParser(prog='pyluxa4 serve', description="Run server.")
-    parser.add_argument('--schedule', default='', help="JSON schedule file.")
+    parser.add_argument('--schedule', default='', help="JSON or JSON Lines schedule file.")
+    parser.add_argument(
+        '--no-schedule-cache', action='store_true',
+        help="Don't cache the compiled schedule alongside the schedule file."
+    )
+    parser.add_argument('--scenes', default='', help="JSON scenes file.")
     parser.add_argument('--device-path', default=None, help="Luxafor device path.")
     parser.add_argument('--device-index', type=int, default=0, help="Luxafor device index.")
     parser.add_argument(
         '--hidapi', default=None, help="Explicit, absolute path to where the hidapi library can be found."
     )
+    parser.add_argument(
+        '--backend', choices=('hidapi', 'hidraw'), default='hidapi',
+        help="How to access devices: through the hidapi library, or directly through Linux hidraw device nodes."
+    )
     parser.add_argument('--host', default=server.HOST, help="Host")
     parser.add_argument('--port', type=int, default=server.PORT, help="Port.")
+    parser.add_argument(
+        '--stream-port', type=int, default=None, help="Also accept binary command frames on this port."
+    )
+    parser.add_argument(
+        '--unix-socket', default=None,
+        help="Also listen on a local Unix domain socket. Local requests are authorized by file permissions."
+    )
+    parser.add_argument(
+        '--unix-mode', type=lambda x: int(x, 8), default=server.UNIX_MODE,
+        help="Octal file permissions of the Unix domain socket (default 600)."
+    )
+    parser.add_argument(
+        '--write-rate', type=float, default=server.WRITE_RATE,
+        help="Maximum writes per second to the device, the actual rate adapts to the device (0 disables pacing)."
+    )
+    parser.add_argument(
+        '--workers', type=int, default=0,
+        help="Serve HTTP requests from this many worker processes, leaving this process to handle the device."
+    )
     parser.add_argument('--ssl-key', default=None, help="SSL key file (for https://).")
     parser.add_argument('--ssl-cert', default=None, help="SSL cert file (for https://).")
     parser.add_argument(
@@ -407,8 +552,180 @@ def cmd_serve(argv):
         kwargs['keyfile'] = args.ssl_key
     if args.ssl_cert:
         kwargs['certfile'] = args.ssl_cert
+    # A missing schedule file is skipped, as it is by the `scheduler` command.
+    schedule = args.schedule if args.schedule and os.path.isfile(args.schedule) else None
+
+    server.run(
+        args.host, args.port, index, path, args.token, None, args.hidapi,
+        schedule_file=schedule, schedule_cache=not args.no_schedule_cache,
+        stream_port=args.stream_port, unix_socket=args.unix_socket, unix_mode=args.unix_mode,
+        write_rate=args.write_rate, backend=args.backend, scenes=process_scenes(args.scenes), workers=args.workers,
+        **kwargs
+    )
 
-    server.run(args.host, args.port, index, path, args.token, process_schedule(args.schedule), args.hidapi, **kwargs)
+
+def cmd_broker(argv):
+    """Start the device broker."""
+
+    from . import usb
+    from . import broker
+
+    parser = argparse.ArgumentParser(
+        prog='pyluxa4 broker', description="Keep devices open for local scripts (see broker.open_luxafor)."
+    )
+    parser.add_argument('--device-path', default=None, help="Luxafor device path.")
+    parser.add_argument(
+        '--hidapi', default=None, help="Explicit, absolute path to where the hidapi library can be found."
+    )
+    parser.add_argument(
+        '--backend', choices=('hidapi', 'hidraw'), default='hidapi',
+        help="How to access devices: through the hidapi library, or directly through Linux hidraw device nodes."
+    )
+    parser.add_argument('--socket', default=None, help="Path of the Unix domain socket to listen on.")
+    parser.add_argument(
+        '--socket-mode', type=lambda x: int(x, 8), default=broker.SOCKET_MODE,
+        help="Octal file permissions of the Unix domain socket (default 600)."
+    )
+    args = parser.parse_args(argv)
+
+    usb.init(args.hidapi, args.backend)
+    b = broker.Broker(args.socket, args.socket_mode, args.device_path)
+    print('Listening on {}'.format(b.path))
+    try:
+        b.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+def cmd_doctor(argv):
+    """Report how the hidapi library and devices were found."""
+
+    import platform
+    import time
+    from . import hid
+    from . import usb
+
+    parser = argparse.ArgumentParser(prog='pyluxa4 doctor', description="Diagnose USB setup.")
+    parser.add_argument(
+        '--hidapi', default=None, help="Explicit, absolute path to where the hidapi library can be found."
+    )
+    parser.add_argument(
+        '--backend', choices=('hidapi', 'hidraw'), default='hidapi',
+        help="How to access devices: through the hidapi library, or directly through Linux hidraw device nodes."
+    )
+    args = parser.parse_args(argv)
+
+    print('pyluxa4: {}'.format(__meta__.__version__))
+    print('Python: {} ({})'.format(platform.python_version(), hid.cache_key()))
+    print('Backend: {}'.format(args.backend))
+    if args.backend == usb.BACKEND_HIDRAW:
+        from . import hidraw
+
+        try:
+            usb.init(backend=args.backend)
+        except Exception as e:
+            print('hidraw: {}'.format(e))
+            return 1
+        print('hidraw: {}'.format(os.path.join(hidraw.sysfs_root, 'class', 'hidraw')))
+    else:
+        print('Cache: {}'.format(os.path.join(hid.cache_dir(), hid.CACHE_FILE)))
+        try:
+            usb.init(args.hidapi)
+        except Exception as e:
+            print('hidapi: {}'.format(e))
+            return 1
+        print('hidapi: {} ({})'.format(hid.library, hid.library_source))
+        print('hidapi version: {}'.format(hid.version() or 'unknown'))
+        print('Init time: {:.3f} ms'.format(hid.init_time * 1000))
+    start = time.perf_counter()
+    devices = usb.enumerate_luxafor()
+    print('Devices: {:d} found in {:.3f} ms'.format(len(devices), (time.perf_counter() - start) * 1000))
+    for index, device in enumerate(devices):
+        print('{:d}> {}'.format(index, os.fsdecode(device['path'])))
+    return 0
+
+
+def cmd_schedule(argv):
+    """Work with schedule files locally."""
+
+    parser = argparse.ArgumentParser(prog='pyluxa4 schedule', description="Work with schedule files.")
+    parser.add_argument('action', choices=('simulate',), help="Action: simulate.")
+    parser.parse_args(argv[0:1])
+
+    return cmd_simulate(argv[1:])
+
+
+def cmd_simulate(argv):
+    """Simulate a schedule over a range of time."""
+
+    import time
+    from datetime import datetime, timedelta
+    from . import scheduler
+
+    def parse_time(value):
+        """Parse an ISO 8601 date and time in local time."""
+
+        return datetime.fromisoformat(value).timestamp()
+
+    def parse_gap(value):
+        """Parse a sleep gap in the form `<sleep>/<wake>`."""
+
+        sleep, wake = value.split('/')
+        return parse_time(sleep), parse_time(wake)
+
+    parser = argparse.ArgumentParser(
+        prog='pyluxa4 schedule simulate', description="List every event a schedule would run over a range of time."
+    )
+    parser.add_argument('schedule', help="JSON or JSON Lines schedule file.")
+    parser.add_argument('--scenes', default='', help="JSON scenes file used by the schedule.")
+    parser.add_argument(
+        '--start', default=None, help="Start of the simulation, such as 2024-03-08T08:00 (default now)."
+    )
+    parser.add_argument('--days', type=float, default=7, help="Number of days to simulate.")
+    parser.add_argument(
+        '--interval', type=float, default=scheduler.CHECK_INTERVAL, help="Seconds between schedule checks."
+    )
+    parser.add_argument(
+        '--gap', action='append', default=[],
+        help="A time the machine is asleep, such as 2024-03-08T18:00/2024-03-09T08:00. Can be used more than once."
+    )
+    parser.add_argument('--tz', default=None, help="Time zone to simulate in, such as America/New_York (not Windows).")
+    parser.add_argument('--quiet', action='store_true', help="Only print the summary.")
+    args = parser.parse_args(argv)
+
+    if args.tz:
+        os.environ['TZ'] = args.tz
+        time.tzset()
+
+    start = parse_time(args.start) if args.start else time.time()
+    end = (datetime.fromtimestamp(start) + timedelta(days=args.days)).timestamp()
+    try:
+        result = scheduler.simulate(
+            process_schedule(args.schedule), start, end, process_scenes(args.scenes), args.interval,
+            [parse_gap(g) for g in args.gap]
+        )
+    except ValueError as e:
+        print('Error: {}'.format(e))
+        return 1
+
+    writes = 0
+    for firing in result.firings:
+        writes += len(firing.reports)
+        if not args.quiet:
+            print(
+                '{}  {}  (writes: {:d})'.format(
+                    datetime.fromtimestamp(firing.time).isoformat(sep=' ', timespec='seconds'),
+                    ', '.join(e['cmd'] for e in firing.events),
+                    len(firing.reports)
+                )
+            )
+    print(
+        '{:d} firings, {:d} writes, {:d} checks instead of {:d} in {:.3f} ms ({:.1f} us per check)'.format(
+            len(result.firings), writes, result.checks, result.ticks, result.elapsed * 1000,
+            result.elapsed * 1e6 / max(result.checks, 1)
+        )
+    )
+    return 0
 
 
 def cmd_list(argv):
@@ -436,16 +753,24 @@ def main():
         'command',
         action='store',
         help=(
-            "Command to send: color, off, fade, strobe, wave, pattern, api, serve, "
-            "kill, get, schedule, and timer."
+            "Command to send: color, off, fade, strobe, wave, pattern, animation, scene, api, serve, "
+            "broker, kill, get, events, schedule, timer, list, and doctor."
         )
     )
     args = parser.parse_args(argv[0:1])
 
     if args.command == 'serve':
         cmd_serve(argv[1:])
+    elif args.command == 'broker':
+        cmd_broker(argv[1:])
     elif args.command == 'list':
         cmd_list(argv[1:])
+    elif args.command == 'doctor':
+        status = cmd_doctor(argv[1:])
+    elif args.command == 'schedule':
+        status = cmd_schedule(argv[1:])
+    elif args.command == 'events':
+        status = cmd_events(argv[1:])
     else:
         if args.command == 'api':
             resp = cmd_version(argv[1:])
@@ -471,6 +796,12 @@ def main():
         elif args.command == 'pattern':
             resp = cmd_pattern(argv[1:])
 
+        elif args.command == 'animation':
+            resp = cmd_animation(argv[1:])
+
+        elif args.command == 'scene':
+            resp = cmd_scene(argv[1:])
+
         elif args.command == 'scheduler':
             resp = cmd_scheduler(argv[1:])
 
@@ -1,6 +1,15 @@
 """Luxafor client API."""
 import requests
+import asyncio
+import contextlib
 import json
+import http.client
+import select
+import socket
+import ssl
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from .common import (
     LED_ALL, LED_BACK, LED_FRONT, LED_1, LED_2, LED_3, LED_4, LED_5, LED_6,
     WAVE_SHORT, WAVE_LONG, WAVE_OVERLAPPING_SHORT, WAVE_OVERLAPPING_LONG,
@@ -10,10 +19,12 @@ from .common import (
     PATTERN_1, PATTERN_2, PATTERN_3, PATTERN_4, PATTERN_5, PATTERN_6, PATTERN_7, PATTERN_8
 )
 
+from . import usb
+from . import protocol
 from . import __meta__
 
 __all__ = (
-    'LuxRest',
+    'LuxRest', 'LuxStream', 'LuxFleet', 'AsyncLuxRest', 'AsyncHTTPPool', 'gather_commands', 'gather_each',
     'LED_ALL', 'LED_BACK', 'LED_FRONT', 'LED_1', 'LED_2', 'LED_3', 'LED_4', 'LED_5', 'LED_6',
     'WAVE_SHORT', 'WAVE_LONG', 'WAVE_OVERLAPPING_SHORT', 'WAVE_OVERLAPPING_LONG',
     'WAVE_1', 'WAVE_2', 'WAVE_3', 'WAVE_4', 'WAVE_5',
@@ -24,13 +35,117 @@ __all__ = (
 
 HOST = "127.0.0.1"
 PORT = 5000
+STREAM_PORT = 5001
 TIMEOUT = 5
 
 
+UNIX_SCHEME = 'unix://'
+
+CONNECTION_ERRORS = (requests.exceptions.ConnectionError, ConnectionRefusedError, FileNotFoundError)
+# Errors after which a request may or may not have reached the server.
+RETRY_ERRORS = (
+    requests.exceptions.ConnectionError, requests.exceptions.Timeout, ConnectionError, socket.timeout
+)
+
+# Errors that end an event stream.
+STREAM_ERRORS = RETRY_ERRORS + (requests.exceptions.ChunkedEncodingError, http.client.IncompleteRead)
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+# Methods that can be sent again without changing the result.
+IDEMPOTENT_METHODS = frozenset(('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'))
+
+
+def api_path(command):
+    """Get the versioned API path for a command."""
+
+    return '/pyluxa4/api/v%s.%s/%s' % (
+        __meta__.__version_info__[0],
+        __meta__.__version_info__[1],
+        command
+    )
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTP connection over a Unix domain socket."""
+
+    def __init__(self, socket_path, timeout=None):
+        """Initialize."""
+
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        """Connect to the Unix domain socket."""
+
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+        except Exception:
+            sock.close()
+            raise
+        self.sock = sock
+
+
+class RawResponse:
+    """Minimal response object mirroring the parts of `requests.Response` we use."""
+
+    def __init__(self, status_code, headers, content):
+        """Initialize."""
+
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+    @classmethod
+    def from_http_client(cls, resp):
+        """Create from an `http.client` response."""
+
+        return cls(resp.status, resp.headers, resp.read())
+
+    @property
+    def text(self):
+        """Get the decoded response body."""
+
+        return self.content.decode('utf-8', errors='replace')
+
+
+def parse_events(lines):
+    """
+    Parse server-sent events from the lines of a stream.
+
+    Yields each event as a dictionary with the event's `id`, `event` type, and decoded `data`. Comments, such as the
+    server's keep-alives, are skipped.
+    """
+
+    event = {"id": None, "event": "message"}
+    data = []
+    for line in lines:
+        line = line.decode('utf-8').rstrip('\r\n') if isinstance(line, bytes) else line.rstrip('\r\n')
+        if not line:
+            if data:
+                event["data"] = json.loads('\n'.join(data))
+                yield event
+            event = {"id": None, "event": "message"}
+            data = []
+            continue
+        if line.startswith(':'):
+            continue
+        field, _, value = line.partition(':')
+        if value.startswith(' '):
+            value = value[1:]
+        if field == 'data':
+            data.append(value)
+        elif field == 'event':
+            event["event"] = value
+        elif field == 'id':
+            event["id"] = int(value) if value.isdigit() else value
+
+
 class LuxRest:
     """Class to post commands to the REST API."""
 
-    def __init__(self, host=HOST, port=PORT, verify=None, token=''):
+    def __init__(self, host=HOST, port=PORT, verify=None, token='', binary=False, retries=0):
         """Initialize."""
 
         self.host = host
@@ -38,7 +153,15 @@ class LuxRest:
         self.http = 'http'
         self.verify = True
         self.token = token
-        if verify:
+        self.binary = binary
+        self.retries = retries
+        self.seq = 0
+        self.unix_socket = None
+        self.connection = None
+        if host.startswith(UNIX_SCHEME):
+            # Local servers are authorized by socket permissions, so HTTPS is not used.
+            self.unix_socket = host[len(UNIX_SCHEME):]
+        elif verify:
             self.http = 'https'
             if verify == '0':
                 self.verify = False
@@ -54,6 +177,70 @@ class LuxRest:
             r = {"status": "fail", "code": resp.status_code, "error": resp.text}
         return r
 
+    def _send_unix(self, method, path, data, headers, timeout):
+        """Send a request over the Unix domain socket reusing the connection when possible."""
+
+        # The request may have reached the server before the connection was lost, so it is only sent again if doing so
+        # cannot run it twice.
+        retry = method in IDEMPOTENT_METHODS or IDEMPOTENCY_HEADER in headers
+        for attempt in range(2):
+            if self.connection is not None and self.connection.sock is not None:
+                # An idle connection that is readable before anything was sent was closed by the server.
+                if select.select([self.connection.sock], [], [], 0)[0]:
+                    self.connection.close()
+                    self.connection = None
+            if self.connection is None:
+                self.connection = UnixHTTPConnection(self.unix_socket, timeout)
+            self.connection.timeout = timeout
+            if self.connection.sock is not None:
+                self.connection.sock.settimeout(timeout)
+            try:
+                self.connection.request(method, path, body=data, headers=headers)
+                return RawResponse.from_http_client(self.connection.getresponse())
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                # The connection was lost, try once more with a fresh one if it is safe to do so.
+                self.connection.close()
+                self.connection = None
+                if attempt or not retry:
+                    raise
+            except Exception:
+                self.connection.close()
+                self.connection = None
+                raise
+
+    def _send(self, method, path, data=None, headers=None, timeout=None):
+        """
+        Send a request to the server.
+
+        Commands are sent with an idempotency key so that they can be safely retried: if the original request did
+        reach the server, the server will replay the original response instead of running the command again.
+        """
+
+        if method != 'POST' or not self.retries:
+            return self._send_once(method, path, data, headers, timeout)
+
+        headers = dict(headers or {})
+        headers.setdefault(IDEMPOTENCY_HEADER, uuid.uuid4().hex)
+        for _ in range(self.retries):
+            with contextlib.suppress(*RETRY_ERRORS):
+                return self._send_once(method, path, data, headers, timeout)
+        return self._send_once(method, path, data, headers, timeout)
+
+    def _send_once(self, method, path, data=None, headers=None, timeout=None):
+        """Send a single request to the server."""
+
+        if self.unix_socket is not None:
+            return self._send_unix(method, path, data, headers or {}, timeout)
+
+        return requests.request(
+            method,
+            '%s://%s:%d%s' % (self.http, self.host, self.port, path),
+            data=data,
+            headers=headers,
+            timeout=timeout,
+            verify=self.verify
+        )
+
     def _post(self, command, payload, timeout):
         """Post a REST command."""
 
@@ -67,25 +254,45 @@ class LuxRest:
             headers['content-type'] = 'application/json'
 
         try:
-            resp = requests.post(
-                '%s://%s:%d/pyluxa4/api/v%s.%s/command/%s' % (
-                    self.http,
-                    self.host,
-                    self.port,
-                    __meta__.__version_info__[0],
-                    __meta__.__version_info__[1],
-                    command
-                ),
-                data=payload,
-                headers=headers,
-                timeout=timeout,
-                verify=self.verify
-            )
-        except requests.exceptions.ConnectionError:
+            resp = self._send('POST', api_path('command/' + command), payload, headers, timeout)
+        except CONNECTION_ERRORS:
+            return {"status": "fail", "code": 0, "error": "Server does not appear to be running"}
+        except Exception as e:
+            return {"status": "fail", "code": 0, "error": str(e)}
+
+        return self._format_respose(resp)
+
+    def _post_report(self, command, build, *args, timeout=TIMEOUT, **kwargs):
+        """Post a pre-encoded report as a binary frame."""
+
+        if timeout == 0:
+            timeout = None
+
+        path = api_path('command/' + command)
+
+        try:
+            self.seq = (self.seq + 1) & protocol.SEQ_MAX
+            payload = protocol.encode_frame(build(*args, **kwargs), self.seq)
+        except Exception as e:
+            return {"status": "fail", "code": 0, "error": str(e)}
+
+        headers = {
+            'Authorization': 'Bearer {}'.format(self.token),
+            'content-type': protocol.MIMETYPE
+        }
+
+        try:
+            resp = self._send('POST', path, payload, headers, timeout)
+        except CONNECTION_ERRORS:
             return {"status": "fail", "code": 0, "error": "Server does not appear to be running"}
         except Exception as e:
             return {"status": "fail", "code": 0, "error": str(e)}
 
+        if resp.headers.get('content-type') == protocol.MIMETYPE:
+            try:
+                return protocol.response_to_dict(path, resp.content)
+            except Exception as e:
+                return {"status": "fail", "code": resp.status_code, "error": str(e)}
         return self._format_respose(resp)
 
     def _get(self, command, timeout):
@@ -97,20 +304,8 @@ class LuxRest:
         headers = {'Authorization': 'Bearer {}'.format(self.token)}
 
         try:
-            resp = requests.get(
-                '%s://%s:%d/pyluxa4/api/v%s.%s/%s' % (
-                    self.http,
-                    self.host,
-                    self.port,
-                    __meta__.__version_info__[0],
-                    __meta__.__version_info__[1],
-                    command
-                ),
-                headers=headers,
-                timeout=timeout,
-                verify=self.verify
-            )
-        except requests.exceptions.ConnectionError:
+            resp = self._send('GET', api_path(command), headers=headers, timeout=timeout)
+        except CONNECTION_ERRORS:
             return {"status": "fail", "code": 0, "error": "Server does not appear to be running"}
         except Exception as e:
             return {"status": "fail", "code": 0, "error": str(e)}
@@ -124,16 +319,8 @@ class LuxRest:
             timeout = None
 
         try:
-            resp = requests.get(
-                '%s://%s:%d/pyluxa4/api/version' % (
-                    self.http,
-                    self.host,
-                    self.port
-                ),
-                verify=self.verify,
-                timeout=timeout
-            )
-        except requests.exceptions.ConnectionError:
+            resp = self._send('GET', '/pyluxa4/api/version', timeout=timeout)
+        except CONNECTION_ERRORS:
             return {"status": "fail", "code": 0, "error": "Server does not appear to be running"}
         except Exception as e:
             return {"status": "fail", "code": 0, "error": str(e)}
@@ -143,6 +330,9 @@ class LuxRest:
     def color(self, color, *, led=LED_ALL, timeout=TIMEOUT):
         """Create command to set colors."""
 
+        if self.binary:
+            return self._post_report("color", usb.color_report, color, led=led, timeout=timeout)
+
         return self._post(
             "color",
             {
@@ -155,6 +345,9 @@ class LuxRest:
     def fade(self, color, *, led=LED_ALL, speed=0, timeout=TIMEOUT):
         """Create command to fade colors."""
 
+        if self.binary:
+            return self._post_report("fade", usb.fade_report, color, led=led, speed=speed, timeout=timeout)
+
         return self._post(
             "fade",
             {
@@ -168,6 +361,11 @@ class LuxRest:
     def strobe(self, color, *, led=LED_ALL, speed=0, repeat=0, timeout=TIMEOUT):
         """Create command to strobe colors."""
 
+        if self.binary:
+            return self._post_report(
+                "strobe", usb.strobe_report, color, led=led, speed=speed, repeat=repeat, timeout=timeout
+            )
+
         return self._post(
             "strobe",
             {
@@ -182,6 +380,11 @@ class LuxRest:
     def wave(self, color, *, wave=WAVE_SHORT, speed=0, repeat=0, timeout=TIMEOUT):
         """Create command to use the wave effect."""
 
+        if self.binary:
+            return self._post_report(
+                "wave", usb.wave_report, color, wave=wave, speed=speed, repeat=repeat, timeout=timeout
+            )
+
         return self._post(
             "wave",
             {
@@ -196,6 +399,9 @@ class LuxRest:
     def pattern(self, pattern, *, led=LED_ALL, repeat=0, timeout=TIMEOUT):
         """Create command to use the wave effect."""
 
+        if self.binary:
+            return self._post_report("pattern", usb.pattern_report, pattern, repeat=repeat, timeout=timeout)
+
         return self._post(
             "pattern",
             {
@@ -208,12 +414,39 @@ class LuxRest:
     def off(self, *, timeout=TIMEOUT):
         """Turn off all lights."""
 
+        if self.binary:
+            return self._post_report("off", usb.off_report, timeout=timeout)
+
         return self._post(
             "off",
             None,
             timeout
         )
 
+    def animation(self, keyframes, *, fps=30, repeat=1, timeout=TIMEOUT):
+        """Play an animation on the server."""
+
+        return self._post(
+            "animation",
+            {
+                "keyframes": keyframes,
+                "fps": fps,
+                "repeat": repeat
+            },
+            timeout
+        )
+
+    def scene(self, scene, *, timeout=TIMEOUT):
+        """Apply a named scene loaded by the server."""
+
+        return self._post(
+            "scene",
+            {
+                "scene": scene
+            },
+            timeout
+        )
+
     def scheduler(self, *, schedule=None, clear=False, cancel=False, timeout=TIMEOUT):
         """Scheduler command."""
 
@@ -256,3 +489,727 @@ class LuxRest:
         """Request the version from the running server."""
 
         return self._get_version(timeout)
+
+    def get_stats(self, *, timeout=TIMEOUT):
+        """Get server statistics."""
+
+        return self._get(
+            "server/stats",
+            timeout
+        )
+
+    def _open_events(self, headers, timeout):
+        """Open the event stream, returns the response and an iterable of lines, or `None` for the lines on failure."""
+
+        path = api_path('events')
+        if self.unix_socket is not None:
+            # The stream holds the connection open, so it gets its own connection.
+            connection = UnixHTTPConnection(self.unix_socket, timeout)
+            connection.request('GET', path, headers=headers)
+            resp = connection.getresponse()
+            if resp.status != 200:
+                resp = RawResponse.from_http_client(resp)
+                connection.close()
+                return resp, None
+            # Closing the connection closes the stream.
+            return connection, iter(resp.readline, b'')
+
+        resp = requests.get(
+            '%s://%s:%d%s' % (self.http, self.host, self.port, path),
+            headers=headers,
+            timeout=timeout,
+            verify=self.verify,
+            stream=True
+        )
+        if resp.status_code != 200:
+            return resp, None
+        return resp, resp.iter_lines(chunk_size=None)
+
+    def events(self, *, last_id=None, timeout=None):
+        """
+        Stream device and scheduler events.
+
+        Yields events as dictionaries with the event's `id`, `event` type, and `data` until the stream ends or is lost.
+        The stream resumes after `last_id` if the events after it are still available. If the stream can't be opened,
+        a single failure response is yielded. `timeout` is how long to wait for the server to send anything before
+        giving up (the server sends keep-alives to idle streams).
+        """
+
+        headers = {'Authorization': 'Bearer {}'.format(self.token)}
+        if last_id is not None:
+            headers['Last-Event-ID'] = str(last_id)
+
+        try:
+            resp, lines = self._open_events(headers, timeout)
+        except CONNECTION_ERRORS:
+            yield {"status": "fail", "code": 0, "error": "Server does not appear to be running"}
+            return
+        except Exception as e:
+            yield {"status": "fail", "code": 0, "error": str(e)}
+            return
+
+        if lines is None:
+            yield self._format_respose(resp)
+            return
+
+        with contextlib.closing(resp):
+            # A stream that times out or is cut off just ends, and can be resumed from the last event's ID.
+            with contextlib.suppress(*STREAM_ERRORS):
+                yield from parse_events(lines)
+
+
+def parse_endpoint(endpoint, port=PORT):
+    """
+    Parse an endpoint into a host and port.
+
+    Endpoints can be in the form `host`, `host:port`, `[IPv6]:port`, or `unix://<path>`.
+    """
+
+    endpoint = endpoint.strip()
+    if endpoint.startswith(UNIX_SCHEME):
+        return endpoint, port
+    if endpoint.startswith('['):
+        host, _, rest = endpoint[1:].partition(']')
+        if rest.startswith(':'):
+            port = int(rest[1:])
+        return host, port
+    if endpoint.count(':') == 1:
+        host, p = endpoint.split(':')
+        return host, int(p)
+    return endpoint, port
+
+
+def read_endpoints(path):
+    """Read endpoints from a file with one endpoint per line. Empty lines and `#` comments are ignored."""
+
+    endpoints = []
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.split('#', 1)[0].strip()
+            if line:
+                endpoints.append(line)
+    return endpoints
+
+
+class LuxFleet:
+    """
+    Class to send commands to a fleet of servers in parallel.
+
+    Each command is dispatched to every server concurrently using a bounded pool of worker threads. Results are
+    aggregated per endpoint along with how long each request took.
+    """
+
+    def __init__(self, endpoints, verify=None, token='', binary=False, workers=8, port=PORT, retries=0):
+        """Initialize."""
+
+        self.clients = {}
+        for endpoint in endpoints:
+            host, p = parse_endpoint(endpoint, port)
+            self.clients[endpoint] = LuxRest(host, p, verify, token, binary, retries)
+        if not self.clients:
+            raise ValueError('At least one endpoint must be specified')
+        self.executor = ThreadPoolExecutor(max_workers=max(1, min(workers, len(self.clients))))
+
+    def __enter__(self):
+        """Enter."""
+
+        return self
+
+    def __exit__(self, type, value, traceback):  # noqa: A002
+        """Exit."""
+
+        self.close()
+
+    def close(self):
+        """Shutdown the worker pool."""
+
+        self.executor.shutdown()
+
+    def _call(self, endpoint, command, args, kwargs):
+        """Call a command on a single endpoint and time it."""
+
+        start = time.perf_counter()
+        try:
+            resp = getattr(self.clients[endpoint], command)(*args, **kwargs)
+        except Exception as e:
+            resp = {"status": "fail", "code": 0, "error": str(e)}
+        resp['elapsed'] = time.perf_counter() - start
+        return resp
+
+    def dispatch(self, commands):
+        """
+        Dispatch commands to their endpoints concurrently.
+
+        `commands` is a dictionary of endpoints to `(command, args, kwargs)` tuples.
+        """
+
+        start = time.perf_counter()
+        futures = {}
+        for endpoint, (command, args, kwargs) in commands.items():
+            if endpoint not in self.clients:
+                raise ValueError('Unrecognized endpoint {}'.format(endpoint))
+            futures[endpoint] = self.executor.submit(self._call, endpoint, command, args, kwargs)
+
+        results = {endpoint: future.result() for endpoint, future in futures.items()}
+        failed = [endpoint for endpoint, resp in results.items() if resp.get('status') != 'success']
+        return {
+            "status": 'fail' if failed else 'success',
+            "code": 0 if failed else 200,
+            "error": '{} of {} hosts failed: {}'.format(len(failed), len(results), ', '.join(failed)) if failed else '',
+            "elapsed": time.perf_counter() - start,
+            "hosts": results
+        }
+
+    def broadcast(self, command, *args, **kwargs):
+        """Send the same command to all endpoints."""
+
+        return self.dispatch(dict.fromkeys(self.clients, (command, args, kwargs)))
+
+    def color(self, color, *, led=LED_ALL, timeout=TIMEOUT):
+        """Create command to set colors."""
+
+        return self.broadcast("color", color, led=led, timeout=timeout)
+
+    def fade(self, color, *, led=LED_ALL, speed=0, timeout=TIMEOUT):
+        """Create command to fade colors."""
+
+        return self.broadcast("fade", color, led=led, speed=speed, timeout=timeout)
+
+    def strobe(self, color, *, led=LED_ALL, speed=0, repeat=0, timeout=TIMEOUT):
+        """Create command to strobe colors."""
+
+        return self.broadcast("strobe", color, led=led, speed=speed, repeat=repeat, timeout=timeout)
+
+    def wave(self, color, *, wave=WAVE_SHORT, speed=0, repeat=0, timeout=TIMEOUT):
+        """Create command to use the wave effect."""
+
+        return self.broadcast("wave", color, wave=wave, speed=speed, repeat=repeat, timeout=timeout)
+
+    def pattern(self, pattern, *, led=LED_ALL, repeat=0, timeout=TIMEOUT):
+        """Create command to use the wave effect."""
+
+        return self.broadcast("pattern", pattern, repeat=repeat, timeout=timeout)
+
+    def off(self, *, timeout=TIMEOUT):
+        """Turn off all lights."""
+
+        return self.broadcast("off", timeout=timeout)
+
+    def animation(self, keyframes, *, fps=30, repeat=1, timeout=TIMEOUT):
+        """Play an animation on the servers."""
+
+        return self.broadcast("animation", keyframes, fps=fps, repeat=repeat, timeout=timeout)
+
+    def scene(self, scene, *, timeout=TIMEOUT):
+        """Apply a named scene on the servers."""
+
+        return self.broadcast("scene", scene, timeout=timeout)
+
+    def scheduler(self, *, schedule=None, clear=False, cancel=False, timeout=TIMEOUT):
+        """Scheduler command."""
+
+        return self.broadcast("scheduler", schedule=schedule, clear=clear, cancel=cancel, timeout=timeout)
+
+    def get_schedule(self, *, timeout=TIMEOUT):
+        """Get schedule from scheduler."""
+
+        return self.broadcast("get_schedule", timeout=timeout)
+
+    def get_timers(self, *, timeout=TIMEOUT):
+        """Get timers from scheduler."""
+
+        return self.broadcast("get_timers", timeout=timeout)
+
+    def kill(self, *, timeout=TIMEOUT):
+        """Kill the server."""
+
+        return self.broadcast("kill", timeout=timeout)
+
+    def version(self, *, timeout=TIMEOUT):
+        """Request the version from the running server."""
+
+        return self.broadcast("version", timeout=timeout)
+
+    def get_stats(self, *, timeout=TIMEOUT):
+        """Get server statistics."""
+
+        return self.broadcast("get_stats", timeout=timeout)
+
+
+class LuxStream:
+    """Class to send pre-encoded commands over a persistent, binary stream."""
+
+    def __init__(self, host=HOST, port=STREAM_PORT, verify=None, token='', device=protocol.DEVICE_DEFAULT):
+        """Initialize."""
+
+        self.host = host
+        self.port = port
+        self.token = token
+        self.device = device
+        self.seq = 0
+        self.context = None
+        self.sock = None
+        self.reader = None
+        if verify:
+            self.context = ssl.create_default_context()
+            if verify == '0':
+                self.context.check_hostname = False
+                self.context.verify_mode = ssl.CERT_NONE
+            elif verify != '1':
+                self.context.load_verify_locations(verify)
+
+    def __enter__(self):
+        """Enter."""
+
+        return self
+
+    def __exit__(self, type, value, traceback):  # noqa: A002
+        """Exit."""
+
+        self.close()
+
+    def _connect(self, timeout):
+        """Connect to the server."""
+
+        sock = socket.create_connection((self.host, self.port), timeout=timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if self.context is not None:
+            sock = self.context.wrap_socket(sock, server_hostname=self.host)
+        self.sock = sock
+        self.reader = sock.makefile('rb')
+
+    def close(self):
+        """Close the connection."""
+
+        if self.sock is not None:
+            self.reader.close()
+            self.sock.close()
+            self.sock = None
+            self.reader = None
+
+    def _send(self, command, build, *args, timeout=TIMEOUT, **kwargs):
+        """Send a pre-encoded report and wait for the response."""
+
+        if timeout == 0:
+            timeout = None
+
+        try:
+            self.seq = (self.seq + 1) & protocol.SEQ_MAX
+            frame = protocol.encode_frame(build(*args, **kwargs), self.seq, self.token, self.device)
+        except Exception as e:
+            return {"status": "fail", "code": 0, "error": str(e)}
+
+        try:
+            if self.sock is None:
+                self._connect(timeout)
+            self.sock.settimeout(timeout)
+            self.sock.sendall(frame)
+            return protocol.response_to_dict(command, self.reader.read(protocol.RESPONSE.size))
+        except ConnectionRefusedError:
+            self.close()
+            return {"status": "fail", "code": 0, "error": "Server does not appear to be running"}
+        except Exception as e:
+            # The stream is in an unknown state, start fresh on the next command.
+            self.close()
+            return {"status": "fail", "code": 0, "error": str(e)}
+
+    def color(self, color, *, led=LED_ALL, timeout=TIMEOUT):
+        """Create command to set colors."""
+
+        return self._send("color", usb.color_report, color, led=led, timeout=timeout)
+
+    def fade(self, color, *, led=LED_ALL, speed=0, timeout=TIMEOUT):
+        """Create command to fade colors."""
+
+        return self._send("fade", usb.fade_report, color, led=led, speed=speed, timeout=timeout)
+
+    def strobe(self, color, *, led=LED_ALL, speed=0, repeat=0, timeout=TIMEOUT):
+        """Create command to strobe colors."""
+
+        return self._send("strobe", usb.strobe_report, color, led=led, speed=speed, repeat=repeat, timeout=timeout)
+
+    def wave(self, color, *, wave=WAVE_SHORT, speed=0, repeat=0, timeout=TIMEOUT):
+        """Create command to use the wave effect."""
+
+        return self._send("wave", usb.wave_report, color, wave=wave, speed=speed, repeat=repeat, timeout=timeout)
+
+    def pattern(self, pattern, *, repeat=0, timeout=TIMEOUT):
+        """Create command to use the wave effect."""
+
+        return self._send("pattern", usb.pattern_report, pattern, repeat=repeat, timeout=timeout)
+
+    def off(self, *, timeout=TIMEOUT):
+        """Turn off all lights."""
+
+        return self._send("off", usb.off_report, timeout=timeout)
+
+
+class NoResponseError(ConnectionError):
+    """The connection was closed before any of the response was received."""
+
+
+class AsyncHTTPPool:
+    """
+    Pool of keep-alive HTTP/1.1 connections built on `asyncio` streams.
+
+    Idle connections are kept per endpoint and reused by later requests. A pool can be shared by many clients, and it
+    is bound to the event loop it is first used in.
+    """
+
+    def __init__(self, limit=8):
+        """Initialize."""
+
+        self.limit = limit
+        self.idle = {}
+        self.closed = False
+
+    async def _open(self, endpoint):
+        """Open a new connection to the endpoint."""
+
+        scheme, host, port, context = endpoint
+        if scheme == 'unix':
+            return await asyncio.open_unix_connection(host)
+        return await asyncio.open_connection(host, port, ssl=context, server_hostname=host if context else None)
+
+    def _release(self, endpoint, reader, writer, reuse):
+        """Return a connection to the pool or close it."""
+
+        idle = self.idle.setdefault(endpoint, [])
+        if reuse and not self.closed and len(idle) < self.limit:
+            idle.append((reader, writer))
+        else:
+            writer.close()
+
+    async def _read_body(self, reader, headers):
+        """Read the response body returning the content and whether the connection can be reused."""
+
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b';', 1)[0], 16)
+                if size == 0:
+                    # Discard trailers
+                    while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                        pass
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readline()
+            return b''.join(chunks), True
+
+        length = headers.get('content-length')
+        if length is not None:
+            return await reader.readexactly(int(length)), True
+
+        # No framing, the server will close the connection.
+        return await reader.read(), False
+
+    async def _exchange(self, reader, writer, request):
+        """Send a request and read the response."""
+
+        try:
+            writer.write(request)
+            await writer.drain()
+            line = await reader.readline()
+        except ConnectionError as e:
+            raise NoResponseError(str(e)) from e
+        if not line:
+            raise NoResponseError('Connection closed by server')
+        version, status = line.decode('latin-1').split(None, 2)[:2]
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, value = line.decode('latin-1').split(':', 1)
+            headers[name.strip().lower()] = value.strip()
+
+        content, reuse = await self._read_body(reader, headers)
+        if headers.get('connection', '').lower() == 'close' or version == 'HTTP/1.0':
+            reuse = False
+        return RawResponse(int(status), headers, content), reuse
+
+    async def request(self, endpoint, method, path, body=None, headers=None):
+        """Send a request to the endpoint."""
+
+        if self.closed:
+            raise RuntimeError('Connection pool is closed')
+
+        lines = [
+            '{} {} HTTP/1.1'.format(method, path),
+            'Host: {}'.format('localhost' if endpoint[0] == 'unix' else endpoint[1]),
+            'Connection: keep-alive',
+            'Content-Length: {}'.format(len(body) if body else 0)
+        ]
+        for k, v in (headers or {}).items():
+            lines.append('{}: {}'.format(k, v))
+        request = ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + (body or b'')
+
+        # The request may have reached the server before the connection was lost, so it is only sent again if doing so
+        # cannot run it twice.
+        retry = method in IDEMPOTENT_METHODS or IDEMPOTENCY_HEADER in (headers or {})
+        idle = self.idle.get(endpoint)
+        while idle:
+            # Reused connections may have been closed by the server while idle.
+            reader, writer = idle.pop()
+            if reader.at_eof() or writer.is_closing():
+                writer.close()
+                continue
+            try:
+                resp, reuse = await self._exchange(reader, writer, request)
+            except NoResponseError:
+                writer.close()
+                if not retry:
+                    raise
+                continue
+            except BaseException:
+                writer.close()
+                raise
+            self._release(endpoint, reader, writer, reuse)
+            return resp
+
+        reader, writer = await self._open(endpoint)
+        try:
+            resp, reuse = await self._exchange(reader, writer, request)
+        except BaseException:
+            writer.close()
+            raise
+        self._release(endpoint, reader, writer, reuse)
+        return resp
+
+    async def close(self):
+        """Close all idle connections."""
+
+        self.closed = True
+        for idle in self.idle.values():
+            for _, writer in idle:
+                writer.close()
+        self.idle.clear()
+
+
+class AsyncLuxRest:
+    """Class to post commands to the REST API from `asyncio` code."""
+
+    def __init__(self, host=HOST, port=PORT, verify=None, token='', binary=False, pool=None):
+        """Initialize."""
+
+        self.host = host
+        self.port = port
+        self.token = token
+        self.binary = binary
+        self.seq = 0
+        # A shared pool belongs to the caller, who closes it once every client is done with it.
+        self._owns_pool = pool is None
+        self.pool = AsyncHTTPPool() if pool is None else pool
+        if host.startswith(UNIX_SCHEME):
+            self.endpoint = ('unix', host[len(UNIX_SCHEME):], None, None)
+        elif verify:
+            context = ssl.create_default_context()
+            if verify == '0':
+                context.check_hostname = False
+                context.verify_mode = ssl.CERT_NONE
+            elif verify != '1':
+                context.load_verify_locations(verify)
+            self.endpoint = ('https', host, port, context)
+        else:
+            self.endpoint = ('http', host, port, None)
+
+    async def __aenter__(self):
+        """Enter."""
+
+        return self
+
+    async def __aexit__(self, type, value, traceback):  # noqa: A002
+        """Exit."""
+
+        await self.close()
+
+    async def close(self):
+        """Close the connection pool, unless it was given to the client to share."""
+
+        if self._owns_pool:
+            await self.pool.close()
+
+    def _format_respose(self, resp):
+        """Format the response."""
+
+        try:
+            r = json.loads(resp.text)
+        except Exception:
+            r = {"status": "fail", "code": resp.status_code, "error": resp.text}
+        return r
+
+    async def _send(self, method, path, body, headers, timeout):
+        """Send a request, handling errors in the same way as `LuxRest`."""
+
+        if timeout == 0:
+            timeout = None
+
+        try:
+            return await asyncio.wait_for(self.pool.request(self.endpoint, method, path, body, headers), timeout)
+        except (ConnectionRefusedError, FileNotFoundError):
+            return {"status": "fail", "code": 0, "error": "Server does not appear to be running"}
+        except asyncio.TimeoutError:
+            return {"status": "fail", "code": 0, "error": "Request timed out"}
+        except Exception as e:
+            return {"status": "fail", "code": 0, "error": str(e)}
+
+    async def _post(self, command, payload, timeout):
+        """Post a REST command."""
+
+        headers = {'Authorization': 'Bearer {}'.format(self.token)}
+
+        if payload is not None:
+            payload = json.dumps(payload).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+
+        resp = await self._send('POST', api_path('command/' + command), payload, headers, timeout)
+        return resp if isinstance(resp, dict) else self._format_respose(resp)
+
+    async def _post_report(self, command, build, *args, timeout=TIMEOUT, **kwargs):
+        """Post a pre-encoded report as a binary frame."""
+
+        path = api_path('command/' + command)
+
+        try:
+            self.seq = (self.seq + 1) & protocol.SEQ_MAX
+            payload = protocol.encode_frame(build(*args, **kwargs), self.seq)
+        except Exception as e:
+            return {"status": "fail", "code": 0, "error": str(e)}
+
+        headers = {
+            'Authorization': 'Bearer {}'.format(self.token),
+            'Content-Type': protocol.MIMETYPE
+        }
+
+        resp = await self._send('POST', path, payload, headers, timeout)
+        if isinstance(resp, dict):
+            return resp
+        if resp.headers.get('content-type') == protocol.MIMETYPE:
+            try:
+                return protocol.response_to_dict(path, resp.content)
+            except Exception as e:
+                return {"status": "fail", "code": resp.status_code, "error": str(e)}
+        return self._format_respose(resp)
+
+    async def _get(self, command, timeout):
+        """Perform a REST request."""
+
+        headers = {'Authorization': 'Bearer {}'.format(self.token)}
+        resp = await self._send('GET', api_path(command), None, headers, timeout)
+        return resp if isinstance(resp, dict) else self._format_respose(resp)
+
+    async def color(self, color, *, led=LED_ALL, timeout=TIMEOUT):
+        """Create command to set colors."""
+
+        if self.binary:
+            return await self._post_report("color", usb.color_report, color, led=led, timeout=timeout)
+
+        return await self._post("color", {"color": color, "led": led}, timeout)
+
+    async def fade(self, color, *, led=LED_ALL, speed=0, timeout=TIMEOUT):
+        """Create command to fade colors."""
+
+        if self.binary:
+            return await self._post_report("fade", usb.fade_report, color, led=led, speed=speed, timeout=timeout)
+
+        return await self._post("fade", {"color": color, "led": led, "speed": speed}, timeout)
+
+    async def strobe(self, color, *, led=LED_ALL, speed=0, repeat=0, timeout=TIMEOUT):
+        """Create command to strobe colors."""
+
+        if self.binary:
+            return await self._post_report(
+                "strobe", usb.strobe_report, color, led=led, speed=speed, repeat=repeat, timeout=timeout
+            )
+
+        return await self._post("strobe", {"color": color, "led": led, "speed": speed, "repeat": repeat}, timeout)
+
+    async def wave(self, color, *, wave=WAVE_SHORT, speed=0, repeat=0, timeout=TIMEOUT):
+        """Create command to use the wave effect."""
+
+        if self.binary:
+            return await self._post_report(
+                "wave", usb.wave_report, color, wave=wave, speed=speed, repeat=repeat, timeout=timeout
+            )
+
+        return await self._post("wave", {"color": color, "wave": wave, "speed": speed, "repeat": repeat}, timeout)
+
+    async def pattern(self, pattern, *, led=LED_ALL, repeat=0, timeout=TIMEOUT):
+        """Create command to use the wave effect."""
+
+        if self.binary:
+            return await self._post_report("pattern", usb.pattern_report, pattern, repeat=repeat, timeout=timeout)
+
+        return await self._post("pattern", {"pattern": pattern, "repeat": repeat}, timeout)
+
+    async def off(self, *, timeout=TIMEOUT):
+        """Turn off all lights."""
+
+        if self.binary:
+            return await self._post_report("off", usb.off_report, timeout=timeout)
+
+        return await self._post("off", None, timeout)
+
+    async def animation(self, keyframes, *, fps=30, repeat=1, timeout=TIMEOUT):
+        """Play an animation on the server."""
+
+        return await self._post("animation", {"keyframes": keyframes, "fps": fps, "repeat": repeat}, timeout)
+
+    async def scene(self, scene, *, timeout=TIMEOUT):
+        """Apply a named scene loaded by the server."""
+
+        return await self._post("scene", {"scene": scene}, timeout)
+
+    async def scheduler(self, *, schedule=None, clear=False, cancel=False, timeout=TIMEOUT):
+        """Scheduler command."""
+
+        return await self._post("scheduler", {"schedule": schedule, "clear": clear, "cancel": cancel}, timeout)
+
+    async def get_schedule(self, *, timeout=TIMEOUT):
+        """Get schedule from scheduler."""
+
+        return await self._get("scheduler/schedule", timeout)
+
+    async def get_timers(self, *, timeout=TIMEOUT):
+        """Get timers from scheduler."""
+
+        return await self._get("scheduler/timers", timeout)
+
+    async def kill(self, *, timeout=TIMEOUT):
+        """Kill the server."""
+
+        return await self._post("kill", None, timeout)
+
+    async def version(self, *, timeout=TIMEOUT):
+        """Request the version from the running server."""
+
+        resp = await self._send('GET', '/pyluxa4/api/version', None, None, timeout)
+        return resp if isinstance(resp, dict) else self._format_respose(resp)
+
+    async def get_stats(self, *, timeout=TIMEOUT):
+        """Get server statistics."""
+
+        return await self._get("server/stats", timeout)
+
+
+async def gather_commands(clients, command, *args, **kwargs):
+    """
+    Send the same command to many clients concurrently.
+
+    Results are returned in the same order as the clients.
+    """
+
+    return await asyncio.gather(*[getattr(client, command)(*args, **kwargs) for client in clients])
+
+
+async def gather_each(calls):
+    """
+    Send different commands to many clients concurrently.
+
+    `calls` is a sequence of `(client, command, args, kwargs)` tuples. Results are returned in the same order.
+    """
+
+    return await asyncio.gather(
+        *[getattr(client, command)(*args, **kwargs) for client, command, args, kwargs in calls]
+    )
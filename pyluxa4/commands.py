@@ -0,0 +1,104 @@
+"""
+Device commands.
+
+Each device command is declared once, with the report builder and a schema of its arguments, and the declaration is
+shared by everything that accepts device commands: the REST API, binary frames, and scenes. A command that is registered
+here is available to all of them, and its arguments are validated the same way everywhere.
+"""
+from collections import namedtuple
+from . import usb
+from . import common as cmn
+
+# Registered device commands, see `register_command`.
+registry = {}
+
+
+class Field(namedtuple('Field', ['name', 'check', 'default'])):
+    """Command argument: name, validator, and the value used when the argument is omitted."""
+
+
+class Command:
+    """
+    Device command.
+
+    The schema is compiled once, when the command is registered.
+    """
+
+    def __init__(self, name, build, fields=(), modes=()):
+        """Initialize."""
+
+        self.name = name
+        self.build = build
+        self.fields = tuple(fields)
+        self.names = frozenset(f.name for f in self.fields)
+        self.modes = frozenset(modes)
+
+    def __repr__(self):
+        """Representation."""
+
+        return 'Command({!r})'.format(self.name)
+
+    def parse(self, data):
+        """Validate the arguments and fill in defaults."""
+
+        if not self.fields:
+            return {}
+        if not isinstance(data, dict):
+            raise TypeError('Command arguments must be a JSON object')
+        kwargs = {}
+        for name, check, default in self.fields:
+            value = data.get(name, default)
+            check(name, value)
+            kwargs[name] = value
+        return kwargs
+
+    def report(self, data):
+        """Validate the arguments and build the device report."""
+
+        return self.build(**self.parse(data))
+
+
+def register_command(name, build, fields=(), modes=()):
+    """
+    Register a device command.
+
+    `build` receives the validated arguments as keywords and returns the device report to send. `modes` are the
+    device report modes the command is allowed to send via binary frames.
+    """
+
+    command = registry[name] = Command(name, build, [Field(*f) for f in fields], modes)
+    return command
+
+
+register_command(
+    'color', usb.color_report,
+    [('color', cmn.is_str, ''), ('led', cmn.is_int, cmn.LED_ALL)],
+    [usb.MODE_BASIC, usb.MODE_STATIC]
+)
+register_command(
+    'fade', usb.fade_report,
+    [('color', cmn.is_str, ''), ('led', cmn.is_int, cmn.LED_ALL), ('speed', cmn.is_int, 0)],
+    [usb.MODE_FADE]
+)
+register_command(
+    'strobe', usb.strobe_report,
+    [
+        ('color', cmn.is_str, ''), ('led', cmn.is_int, cmn.LED_ALL),
+        ('speed', cmn.is_int, 0), ('repeat', cmn.is_int, 0)
+    ],
+    [usb.MODE_STROBE]
+)
+register_command(
+    'wave', usb.wave_report,
+    [
+        ('color', cmn.is_str, ''), ('wave', cmn.is_int, cmn.WAVE_SHORT),
+        ('speed', cmn.is_int, 0), ('repeat', cmn.is_int, 0)
+    ],
+    [usb.MODE_WAVE]
+)
+register_command(
+    'pattern', usb.pattern_report,
+    [('pattern', cmn.is_int, 0), ('repeat', cmn.is_int, 0)],
+    [usb.MODE_PATTERN]
+)
+register_command('off', usb.off_report, (), [usb.MODE_BASIC])
@@ -0,0 +1,186 @@
+"""
+Cron expressions.
+
+An expression has five fields: minute (0-59), hour (0-23), day of the month (1-31), month (1-12 or `jan`-`dec`), and
+day of the week (0-7 or `sun`-`sat`, where both 0 and 7 are Sunday). Each field is `*`, a value, a range (`9-17`), a
+step (`*/15`, `9-17/2`), or a comma separated list of them. `@yearly`, `@monthly`, `@weekly`, `@daily`, and `@hourly`
+are also accepted.
+
+```
+*/15 9-17 * * mon-fri
+```
+
+As with cron, if both the day of the month and the day of the week are restricted, a day matching either is used. A
+day field that starts with `*`, such as `*/2`, does not count as restricted.
+
+Each field is compiled into a bitset, so matching a value is a single bit test, and finding the next matching value is
+a shift and a lowest set bit, which lets the next occurrence be found without stepping through every minute.
+"""
+import calendar
+from datetime import timedelta
+
+MONTHS = {name.lower(): i for i, name in enumerate(calendar.month_abbr) if name}
+WEEKDAYS = {'sun': 0, 'mon': 1, 'tue': 2, 'wed': 3, 'thu': 4, 'fri': 5, 'sat': 6}
+
+MACROS = {
+    '@yearly': '0 0 1 1 *',
+    '@annually': '0 0 1 1 *',
+    '@monthly': '0 0 1 * *',
+    '@weekly': '0 0 * * 0',
+    '@daily': '0 0 * * *',
+    '@midnight': '0 0 * * *',
+    '@hourly': '0 * * * *'
+}
+
+# Name, minimum, maximum, and value names of each field.
+FIELDS = (
+    ('minute', 0, 59, None),
+    ('hour', 0, 23, None),
+    ('day', 1, 31, None),
+    ('month', 1, 12, MONTHS),
+    ('weekday', 0, 7, WEEKDAYS)
+)
+
+# Every valid expression matches within this many years (February 29th only comes around every 4 to 8 years).
+SEARCH_YEARS = 9
+
+
+def next_bit(mask, start):
+    """Get the lowest set bit at or above `start`, or -1 if there is none."""
+
+    mask >>= start
+    if not mask:
+        return -1
+    return start + (mask & -mask).bit_length() - 1
+
+
+def parse_value(value, names, name):
+    """Parse a single field value."""
+
+    value = value.lower()
+    if names is not None and value in names:
+        return names[value]
+    if not value.isdigit():
+        raise ValueError("Invalid {} value '{}'".format(name, value))
+    return int(value)
+
+
+def parse_field(text, name, low, high, names):
+    """Compile a field into a bitset."""
+
+    mask = 0
+    for part in text.split(','):
+        rng, sep, step = part.partition('/')
+        if sep:
+            if not step.isdigit() or int(step) < 1:
+                raise ValueError("Invalid {} step '{}'".format(name, step))
+            step = int(step)
+        else:
+            step = 1
+
+        if rng == '*':
+            start, end = low, high
+        else:
+            first, sep, last = rng.partition('-')
+            start = parse_value(first, names, name)
+            # A value with a step (`5/10`) runs to the end of the range, like cron.
+            end = parse_value(last, names, name) if sep else (high if step > 1 else start)
+        if not low <= start <= end <= high:
+            raise ValueError("The {} range '{}' must be within {}-{}".format(name, rng, low, high))
+
+        for value in range(start, end + 1, step):
+            mask |= 1 << value
+    return mask
+
+
+class Cron:
+    """Compiled cron expression."""
+
+    def __init__(self, expression):
+        """Initialize."""
+
+        if not isinstance(expression, str):
+            raise TypeError("Cron expressions must be strings")
+        self.expression = expression
+        fields = MACROS.get(expression.strip().lower(), expression).split()
+        if len(fields) != len(FIELDS):
+            raise ValueError("Cron expressions must have {} fields, '{}' was given".format(len(FIELDS), expression))
+
+        masks = [parse_field(text, *spec) for text, spec in zip(fields, FIELDS)]
+        self.minutes, self.hours, self.days, self.months, weekdays = masks
+        # Sunday can be 0 or 7.
+        if weekdays & (1 << 7):
+            weekdays = (weekdays | 1) & ~(1 << 7)
+        self.weekdays = weekdays
+        # Like cron, a field that starts with `*`, such as `*/2`, doesn't restrict the days on its own.
+        self.any_day = fields[2].startswith('*')
+        self.any_weekday = fields[4].startswith('*')
+
+    def __repr__(self):
+        """Representation."""
+
+        return 'Cron({!r})'.format(self.expression)
+
+    def match_day(self, year, month, day):
+        """Check if the expression runs on the given day."""
+
+        in_month = bool(self.days >> day & 1)
+        # Python counts weekdays from Monday, cron counts from Sunday.
+        in_week = bool(self.weekdays >> ((calendar.weekday(year, month, day) + 1) % 7) & 1)
+        if self.any_day or self.any_weekday:
+            return in_month and in_week
+        return in_month or in_week
+
+    def next_fire(self, after):
+        """
+        Get the first time after the given time (a naive `datetime`) that the expression runs.
+
+        Returns `None` if the expression never runs (such as February 30th).
+        """
+
+        t = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        year, month, day, hour, minute = t.year, t.month, t.day, t.hour, t.minute
+        limit = year + SEARCH_YEARS
+
+        while year <= limit:
+            m = next_bit(self.months, month)
+            if m < 0:
+                year, month, day, hour, minute = year + 1, 1, 1, 0, 0
+                continue
+            if m != month:
+                month, day, hour, minute = m, 1, 0, 0
+
+            last = calendar.monthrange(year, month)[1]
+            while day <= last and not self.match_day(year, month, day):
+                day, hour, minute = day + 1, 0, 0
+            if day > last:
+                month, day, hour, minute = month + 1, 1, 0, 0
+                if month > 12:
+                    year, month = year + 1, 1
+                continue
+
+            h = next_bit(self.hours, hour)
+            if h < 0:
+                day, hour, minute = day + 1, 0, 0
+                if day > last:
+                    month, day = month + 1, 1
+                    if month > 12:
+                        year, month = year + 1, 1
+                continue
+            if h != hour:
+                hour, minute = h, 0
+
+            mn = next_bit(self.minutes, minute)
+            if mn < 0:
+                hour, minute = hour + 1, 0
+                if hour > 23:
+                    day, hour = day + 1, 0
+                    if day > last:
+                        month, day = month + 1, 1
+                        if month > 12:
+                            year, month = year + 1, 1
+                continue
+
+            return t.replace(year=year, month=month, day=day, hour=hour, minute=mn)
+
+        return None
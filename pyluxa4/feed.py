@@ -0,0 +1,205 @@
+"""
+Server-sent event feed.
+
+Events are serialized once, when they are published, into a fixed size ring buffer that every subscriber reads from,
+so publishing costs the same no matter how many subscribers there are, and a subscriber only keeps its position in the
+buffer. A subscriber that falls more than `backlog` events behind is dropped instead of holding up the server or the
+other subscribers. It can reconnect with the ID of the last event it received (`Last-Event-ID`) and pick up where it
+left off, as long as the events it missed are still in the buffer.
+
+```
+id: 42
+event: state
+data: {"reports":[{"args":{"color":"#ff0000","led":255},"cmd":"color"}]}
+```
+"""
+import json
+import threading
+from . import usb
+from .common import LED_ALL
+
+MIMETYPE = 'text/event-stream'
+
+# Number of events kept in the buffer.
+SIZE = 1024
+# Number of events a subscriber can fall behind before it is dropped.
+BACKLOG = 256
+# Seconds between comments sent to idle subscribers, so dead connections are noticed.
+HEARTBEAT = 15
+
+EVENT_STATE = 'state'
+EVENT_DEVICE = 'device'
+EVENT_FIRED = 'fired'
+EVENT_EXPIRED = 'expired'
+EVENT_ANIMATION = 'animation'
+
+KEEP_ALIVE = b': keep-alive\n\n'
+
+
+def encode_event(kind, data, event_id=None):
+    """Serialize an event."""
+
+    body = json.dumps(data, separators=(',', ':'), sort_keys=True)
+    head = 'id: {}\n'.format(event_id) if event_id is not None else ''
+    return '{}event: {}\ndata: {}\n\n'.format(head, kind, body).encode('utf-8')
+
+
+class Feed:
+    """
+    Broadcast events to subscribers.
+
+    `event` creates the object subscribers wait on for new events, `threading.Event` or an equivalent, such as
+    `gevent.event.Event`.
+    """
+
+    def __init__(self, size=SIZE, backlog=BACKLOG, heartbeat=HEARTBEAT, event=threading.Event):
+        """Initialize."""
+
+        self.size = size
+        self.backlog = min(backlog, size)
+        self.heartbeat = heartbeat
+        self.event = event
+        self.buffer = [b''] * size
+        # ID of the latest event, and the ID before the first event that can be resumed from.
+        self.last = 0
+        self.start = 0
+        self.changed = event()
+        self.closed = False
+        self.subscribers = 0
+        self.dropped = 0
+
+    def publish(self, kind, data):
+        """Publish an event to all subscribers."""
+
+        self.append(self.last + 1, encode_event(kind, data, self.last + 1))
+
+    def append(self, event_id, event):
+        """Publish a serialized event, such as one mirrored from another feed, whose ID must follow the latest event."""
+
+        self.last = event_id
+        self.buffer[event_id % self.size] = event
+        changed, self.changed = self.changed, self.event()
+        changed.set()
+
+    def skip(self, event_id):
+        """
+        Continue from the given event ID, such as when mirroring another feed.
+
+        Events up to the ID can't be resumed from, and current subscribers are dropped.
+        """
+
+        self.start = self.last = event_id
+        changed, self.changed = self.changed, self.event()
+        changed.set()
+
+    def since(self, position):
+        """Get the serialized events after a position."""
+
+        return [self.buffer[i % self.size] for i in range(position + 1, self.last + 1)]
+
+    def close(self):
+        """End all subscriptions."""
+
+        self.closed = True
+        self.changed.set()
+
+    def position(self, last_id=None):
+        """Get where a subscriber starts, resuming after `last_id` if the events after it are still available."""
+
+        if last_id is not None and last_id >= self.start and 0 <= self.last - last_id <= self.backlog:
+            return last_id
+        return self.last
+
+    def subscribe(self, position, initial=b''):
+        """
+        Yield serialized events after the given position until the subscriber falls too far behind.
+
+        `initial` is sent first, such as the current state.
+        """
+
+        self.subscribers += 1
+        try:
+            if initial:
+                yield initial
+            while not self.closed:
+                changed = self.changed
+                behind = self.last - position
+                if behind > self.backlog or position < self.start:
+                    self.dropped += 1
+                    break
+                if behind:
+                    end = self.last
+                    yield b''.join(self.since(position))
+                    position = end
+                elif not changed.wait(self.heartbeat):
+                    yield KEEP_ALIVE
+        finally:
+            self.subscribers -= 1
+
+    def stats(self):
+        """Get feed statistics."""
+
+        return {
+            "published": self.last,
+            "subscribers": self.subscribers,
+            "dropped": self.dropped
+        }
+
+
+class DeviceState:
+    """
+    Track the state of a device from the reports sent to it and publish it to a feed.
+
+    Wraps the device handle, so it can be used anywhere the device's `send_report` is used.
+    """
+
+    def __init__(self, handle, feed):
+        """Initialize."""
+
+        self.handle = handle
+        self.feed = feed
+        # Latest report for each LED target, like `scheduler.net_reports`.
+        self.latest = {}
+
+    def update(self, report):
+        """Record a report that was sent."""
+
+        target = usb.report_target(report)
+        if target == LED_ALL:
+            self.latest.clear()
+        else:
+            self.latest.pop(target, None)
+        self.latest[target] = report
+
+    def send_report(self, report, *, wait=False):
+        """Send a report and publish the new state if it was sent."""
+
+        failed = self.handle.send_report(report, wait=wait)
+        if not failed:
+            self.update(report)
+            self.feed.publish(EVENT_STATE, self.describe())
+        return failed
+
+    def send_reports(self, reports):
+        """
+        Send several reports, such as those of an animation frame, and publish the new state once.
+
+        Returns `True` if a report failed, like `usb.Luxafor` commands.
+        """
+
+        failed = False
+        sent = 0
+        for report in reports:
+            failed = self.handle.send_report(report)
+            if failed:
+                break
+            self.update(report)
+            sent += 1
+        if sent:
+            self.feed.publish(EVENT_STATE, self.describe())
+        return failed
+
+    def describe(self):
+        """Describe the current state."""
+
+        return {"reports": [usb.describe_report(report) for report in self.latest.values()]}
@@ -27,8 +27,11 @@ import os
 import sys
 import ctypes
 import atexit
+import json
+import platform
+import time
 
-__all__ = ['HIDException', 'DeviceInfo', 'Device', 'enumerate']
+__all__ = ['HIDException', 'DeviceInfo', 'DeviceRecord', 'Device', 'enumerate']
 
 
 hidapi = None
@@ -44,6 +47,15 @@ library_paths = (
     'libhidapi-0.dll'
 )
 
+# How the library was loaded: the library, where it came from (explicit, cache, or search), and how long it took.
+library = None
+library_source = None
+init_time = None
+
+CACHE_ENV = 'PYLUXA4_CACHE_DIR'
+CACHE_FILE = 'hidapi.json'
+
+
 class HIDException(Exception):
     """Custom `HID` exception."""
 
@@ -63,49 +75,272 @@ class DeviceInfo(ctypes.Structure):
         return ret
 
 
+DeviceInfo._fields_ = [
+    ('path', ctypes.c_char_p),
+    ('vendor_id', ctypes.c_ushort),
+    ('product_id', ctypes.c_ushort),
+    ('serial_number', ctypes.c_wchar_p),
+    ('release_number', ctypes.c_ushort),
+    ('manufacturer_string', ctypes.c_wchar_p),
+    ('product_string', ctypes.c_wchar_p),
+    ('usage_page', ctypes.c_ushort),
+    ('usage', ctypes.c_ushort),
+    ('interface_number', ctypes.c_int),
+    ('next', ctypes.POINTER(DeviceInfo)),
+]
+
+
+class Enumeration:
+    """Owner of a `hid_enumerate` result, the result is freed once nothing refers to it."""
+
+    __slots__ = ('info',)
+
+    def __init__(self, info):
+        """Initialize."""
+
+        self.info = info
+
+    def __del__(self):
+        """Free the enumeration."""
+
+        if self.info and hidapi is not None:
+            hidapi.hid_free_enumeration(self.info)
+        self.info = None
+
+
+class DeviceRecord:
+    """
+    Enumerated device.
+
+    Numeric fields and the path are copied when enumerating, but the wide character strings are only decoded the
+    first time one of them is accessed. Records can be accessed like the dictionaries that were previously returned
+    (`record['path']`, `record.get('serial_number')`, and `dict(record)`).
+    """
+
+    __slots__ = (
+        '_info', '_owner', '_strings',
+        'interface_number', 'path', 'product_id', 'release_number', 'usage', 'usage_page', 'vendor_id'
+    )
+
+    FIELDS = (
+        'path', 'vendor_id', 'product_id', 'serial_number', 'release_number', 'manufacturer_string', 'product_string',
+        'usage_page', 'usage', 'interface_number'
+    )
+
+    def __init__(self, info, owner=None):
+        """Initialize from a `DeviceInfo` structure."""
+
+        self.path = info.path
+        self.vendor_id = info.vendor_id
+        self.product_id = info.product_id
+        self.release_number = info.release_number
+        self.usage_page = info.usage_page
+        self.usage = info.usage
+        self.interface_number = info.interface_number
+        # Keep the enumeration alive until the strings are decoded.
+        self._info = info
+        self._owner = owner
+        self._strings = None
+
+    def _decode(self):
+        """Decode the string fields."""
+
+        if self._strings is None:
+            info = self._info
+            self._strings = (info.serial_number, info.manufacturer_string, info.product_string)
+            self._info = None
+            self._owner = None
+        return self._strings
+
+    @property
+    def serial_number(self):
+        """Get the serial number."""
+
+        return self._decode()[0]
+
+    @property
+    def manufacturer_string(self):
+        """Get the manufacturer."""
+
+        return self._decode()[1]
+
+    @property
+    def product_string(self):
+        """Get the product."""
+
+        return self._decode()[2]
+
+    def __getitem__(self, key):
+        """Get a field."""
+
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key):
+        """Check if the field exists."""
+
+        return key in self.FIELDS
+
+    def get(self, key, default=None):
+        """Get a field, or the default if the field does not exist."""
+
+        return getattr(self, key) if key in self.FIELDS else default
+
+    def keys(self):
+        """Get the field names."""
+
+        return self.FIELDS
+
+    def as_dict(self):
+        """Return as dictionary."""
+
+        return {name: getattr(self, name) for name in self.FIELDS}
+
+    def __repr__(self):
+        """Representation."""
+
+        return '{}({!r})'.format(self.__class__.__name__, self.as_dict())
+
+
+def cache_dir():
+    """Get the directory of the cache."""
+
+    path = os.environ.get(CACHE_ENV)
+    if path:
+        return path
+    if sys.platform.startswith('win'):
+        base = os.environ.get('LOCALAPPDATA', os.path.expanduser('~'))
+    elif sys.platform == 'darwin':
+        base = os.path.expanduser('~/Library/Caches')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache'))
+    return os.path.join(base, 'pyluxa4')
+
+
+def cache_key():
+    """Get the key of the current platform in the cache."""
+
+    return '{}-{}-{}bit'.format(sys.platform, platform.machine(), ctypes.sizeof(ctypes.c_void_p) * 8)
+
+
+def read_cache():
+    """Read the cache, returns an empty cache if it is missing or unreadable."""
+
+    try:
+        with open(os.path.join(cache_dir(), CACHE_FILE), 'r') as f:
+            cache = json.load(f)
+        return cache if isinstance(cache, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def write_cache(lib):
+    """Remember the library for the current platform, or forget it if `lib` is `None`."""
+
+    cache = read_cache()
+    if lib is None:
+        cache.pop(cache_key(), None)
+    else:
+        cache[cache_key()] = lib
+    try:
+        os.makedirs(cache_dir(), exist_ok=True)
+        with open(os.path.join(cache_dir(), CACHE_FILE), 'w') as f:
+            json.dump(cache, f)
+    except OSError:
+        # Caching is only an optimization.
+        pass
+
+
+def cached_library():
+    """Get the cached library, if it is still valid."""
+
+    lib = read_cache().get(cache_key())
+    if not isinstance(lib, str):
+        return None
+    if os.path.isabs(lib) and not os.path.exists(lib):
+        # The library was removed or updated.
+        write_cache(None)
+        return None
+    return lib
+
+
+def resolve_library(name):
+    """
+    Get the file that was loaded for a library name.
+
+    Only Linux exposes the loaded files (via `/proc`), otherwise the name is returned as is.
+    """
+
+    stem = name.split('.so')[0] + '.so'
+    try:
+        with open('/proc/self/maps', 'r') as f:
+            for line in f:
+                path = line.rstrip('\n').split(' ')[-1]
+                if os.path.basename(path).startswith(stem):
+                    return path
+    except OSError:
+        pass
+    return name
+
+
+def load_library(lib, explicit=False):
+    """Load the library."""
+
+    if not explicit and (3, 8) <= sys.version_info and sys.platform.startswith('win'):
+        return ctypes.CDLL(lib, winmode=0)
+    return ctypes.cdll.LoadLibrary(lib)
+
+
 def init(api=None):
-    """Initialize."""
+    """
+    Initialize.
+
+    If a library isn't specified, the library found by the last search is tried first. It is cached per platform
+    (see `cache_dir`), so we don't have to search on every start.
+    """
 
     global hidapi
+    global library
+    global library_source
+    global init_time
 
+    start = time.perf_counter()
     if api is not None:
         if not os.path.exists(api):
             raise ValueError('Cannot find library path "{}"'.format(api))
         if not os.path.isabs(api):
             raise ValueError('Library paths must be specified as absolute paths, "{}" is not absolute'.format(api))
-        paths = (api,)
+        hidapi = load_library(api, True)
+        library = api
+        library_source = 'explicit'
     else:
-        paths = library_paths
-
-    for lib in paths:
-        try:
-            if api is None and (3, 8) <= sys.version_info and sys.platform.startswith('win'):
-                hidapi = ctypes.CDLL(lib, winmode=0)
+        hidapi = None
+        lib = cached_library()
+        if lib is not None:
+            try:
+                hidapi = load_library(lib)
+                library = lib
+                library_source = 'cache'
+            except OSError:
+                write_cache(None)
+
+        if hidapi is None:
+            for lib in library_paths:
+                try:
+                    hidapi = load_library(lib)
+                    break
+                except OSError:
+                    pass
             else:
-                hidapi = ctypes.cdll.LoadLibrary(lib)
-            break
-        except OSError:
-            pass
-    else:
-        raise ImportError("Unable to load any of the following libraries:{}".format(' '.join(library_paths)))
+                raise ImportError("Unable to load any of the following libraries:{}".format(' '.join(library_paths)))
+            library = resolve_library(lib)
+            library_source = 'search'
+            write_cache(library)
 
     hidapi.hid_init()
     atexit.register(hidapi.hid_exit)
 
-    DeviceInfo._fields_ = [
-        ('path', ctypes.c_char_p),
-        ('vendor_id', ctypes.c_ushort),
-        ('product_id', ctypes.c_ushort),
-        ('serial_number', ctypes.c_wchar_p),
-        ('release_number', ctypes.c_ushort),
-        ('manufacturer_string', ctypes.c_wchar_p),
-        ('product_string', ctypes.c_wchar_p),
-        ('usage_page', ctypes.c_ushort),
-        ('usage', ctypes.c_ushort),
-        ('interface_number', ctypes.c_int),
-        ('next', ctypes.POINTER(DeviceInfo)),
-    ]
-
     hidapi.hid_init.argtypes = []
     hidapi.hid_init.restype = ctypes.c_int
     hidapi.hid_exit.argtypes = []
@@ -145,19 +380,39 @@ def init(api=None):
     hidapi.hid_error.argtypes = [ctypes.c_void_p]
     hidapi.hid_error.restype = ctypes.c_wchar_p
 
+    init_time = time.perf_counter() - start
+
+
+def version():
+    """Get the version of the hidapi library, if the library reports it."""
+
+    try:
+        func = hidapi.hid_version_str
+    except AttributeError:
+        return None
+    func.argtypes = []
+    func.restype = ctypes.c_char_p
+    return func().decode('ascii')
+
 
 def enumerate(vid=0, pid=0):  # noqa: A001
-    """Enumerate USB devices."""
+    """
+    Enumerate USB devices.
+
+    Returns a list of `DeviceRecord`, filtered by vendor and product ID (0 matches any).
+    """
 
     ret = []
     info = hidapi.hid_enumerate(vid, pid)
+    owner = Enumeration(info)
     c = info
 
     while c:
-        ret.append(c.contents.as_dict())
-        c = c.contents.next
-
-    hidapi.hid_free_enumeration(info)
+        entry = c.contents
+        # Skip anything we didn't ask for before creating a record for it.
+        if (not vid or entry.vendor_id == vid) and (not pid or entry.product_id == pid):
+            ret.append(DeviceRecord(entry, owner))
+        c = entry.next
 
     return ret
 
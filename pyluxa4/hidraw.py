@@ -0,0 +1,331 @@
+"""
+Native Linux hidraw backend.
+
+Talks to `/dev/hidrawN` nodes directly with plain reads and writes instead of going through hidapi, so there is no
+library to load and no foreign function call per report. Devices are discovered through sysfs
+(`/sys/class/hidraw/*/device/uevent`).
+
+Provides the same interface as `hid`: `init`, `enumerate`, and `Device`, and errors are raised as `hid.HIDException`.
+`sysfs_root` and `dev_root` can be pointed at another tree, such as a fake tree for testing.
+"""
+import errno
+import os
+import select
+import sys
+from .hid import HIDException
+
+__all__ = ['Device', 'HIDException', 'enumerate']
+
+sysfs_root = '/sys'
+dev_root = '/dev'
+
+BUS_USB = 0x03
+# Time to wait for a device that is not ready to accept a write.
+WRITE_TIMEOUT = 1000
+
+# `ioctl` requests from `linux/hidraw.h`.
+IOC_READ_WRITE = 3
+HIDIOCSFEATURE = 0x06
+HIDIOCGFEATURE = 0x07
+HIDIOCGINPUT = 0x0A
+
+
+def ioc(nr, size):
+    """Build a read/write hidraw `ioctl` request number."""
+
+    return (IOC_READ_WRITE << 30) | (size << 16) | (ord('H') << 8) | nr
+
+
+def init(root=None, dev=None):
+    """
+    Initialize.
+
+    `root` and `dev` override where sysfs and the device nodes are found.
+    """
+
+    global sysfs_root
+    global dev_root
+
+    if root is not None:
+        sysfs_root = root
+    if dev is not None:
+        dev_root = dev
+    if root is None and not sys.platform.startswith('linux'):
+        raise ImportError('The hidraw backend is only available on Linux')
+    if not os.path.isdir(os.path.join(sysfs_root, 'class', 'hidraw')):
+        raise ImportError('Cannot find hidraw devices in {}'.format(sysfs_root))
+
+
+def read_attribute(path, default=''):
+    """Read a sysfs attribute."""
+
+    try:
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            return f.read().strip()
+    except OSError:
+        return default
+
+
+def read_uevent(path):
+    """Read a sysfs `uevent` file into a dictionary."""
+
+    values = {}
+    for line in read_attribute(path).splitlines():
+        key, sep, value = line.partition('=')
+        if sep:
+            values[key] = value
+    return values
+
+
+def device_info(name, vid=0, pid=0):
+    """
+    Get the enumeration info of a hidraw device.
+
+    Returns `None` if the device can't be identified or doesn't match the vendor and product ID (0 matches any).
+    """
+
+    device = os.path.join(sysfs_root, 'class', 'hidraw', name, 'device')
+    uevent = read_uevent(os.path.join(device, 'uevent'))
+
+    # `HID_ID=<bus>:<vendor>:<product>` in hex.
+    try:
+        bus, device_vid, device_pid = (int(x, 16) for x in uevent['HID_ID'].split(':'))
+    except (KeyError, ValueError):
+        return None
+    # Skip anything we didn't ask for before reading the rest of its attributes.
+    if (vid and device_vid != vid) or (pid and device_pid != pid):
+        return None
+
+    # `HID_PHYS` ends with the interface, such as `usb-0000:00:14.0-1/input0`.
+    phys = uevent.get('HID_PHYS', '')
+    _, _, interface = phys.rpartition('/input')
+    interface = int(interface) if interface.isdigit() else -1
+
+    # The USB device two levels up has the individual strings, the HID device only has a combined name.
+    usb = os.path.join(os.path.realpath(device), os.pardir, os.pardir) if bus == BUS_USB else None
+    name_string = uevent.get('HID_NAME', '')
+    release = read_attribute(os.path.join(usb, 'bcdDevice'), '0') if usb else '0'
+
+    return {
+        "path": os.fsencode(os.path.join(dev_root, name)),
+        "vendor_id": device_vid,
+        "product_id": device_pid,
+        "serial_number": uevent.get('HID_UNIQ', '') or (read_attribute(os.path.join(usb, 'serial')) if usb else ''),
+        "release_number": int(release, 16) if release else 0,
+        "manufacturer_string": read_attribute(os.path.join(usb, 'manufacturer')) if usb else '',
+        "product_string": (read_attribute(os.path.join(usb, 'product')) if usb else '') or name_string,
+        "usage_page": 0,
+        "usage": 0,
+        "interface_number": interface
+    }
+
+
+def enumerate(vid=0, pid=0):  # noqa: A001
+    """
+    Enumerate hidraw devices.
+
+    Returns a list of dictionaries with the same keys as `hid.DeviceRecord`, filtered by vendor and product ID
+    (0 matches any).
+    """
+
+    base = os.path.join(sysfs_root, 'class', 'hidraw')
+    try:
+        names = sorted(os.listdir(base), key=lambda n: (len(n), n))
+    except OSError:
+        return []
+
+    ret = []
+    for name in names:
+        info = device_info(name, vid, pid)
+        if info is not None:
+            ret.append(info)
+    return ret
+
+
+class Device(object):
+    """hidraw device object."""
+
+    def __init__(self, vid=None, pid=None, serial=None, path=None):
+        """Initialize."""
+
+        if not path:
+            if not (vid and pid):
+                raise ValueError('specify vid/pid or path')
+            for info in enumerate(vid, pid):
+                if not serial or info['serial_number'] == serial:
+                    path = info['path']
+                    break
+            else:
+                raise HIDException('unable to open device')
+
+        self.__path = os.fsencode(path)
+        self.__name = os.path.basename(os.fsdecode(self.__path))
+        try:
+            self.__fd = os.open(self.__path, os.O_RDWR | os.O_NONBLOCK | os.O_CLOEXEC)
+        except OSError as e:
+            raise HIDException('unable to open device: {}'.format(e.strerror)) from e
+        self._nonblocking = 0
+
+    def __enter__(self):
+        """Provide self when using "with"."""
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        """Close on exit."""
+
+        self.close()
+
+    def __fileno(self):
+        """Get the file descriptor of an open device."""
+
+        if self.__fd is None:
+            raise HIDException('device closed')
+        return self.__fd
+
+    def fileno(self):
+        """Get the file descriptor, so the device can be watched by an event loop."""
+
+        return self.__fileno()
+
+    def __wait(self, fd, write, timeout):
+        """Wait for the device to be ready, returns `False` on timeout."""
+
+        if timeout is not None and timeout < 0:
+            timeout = None
+        ready = select.POLLOUT if write else select.POLLIN
+        poll = select.poll()
+        poll.register(fd, ready)
+        for _, event in poll.poll(timeout):
+            if not event & ready:
+                raise HIDException('device disconnected')
+            return True
+        return False
+
+    def __write(self, fd, data):
+        """Write to the device, returns `None` if the device is not ready."""
+
+        try:
+            return os.write(fd, data)
+        except BlockingIOError:
+            return None
+        except OSError as e:
+            raise HIDException(e.strerror) from e
+
+    def write(self, data):
+        """Write."""
+
+        fd = self.__fileno()
+        count = self.__write(fd, data)
+        if count is None:
+            if self.__wait(fd, True, WRITE_TIMEOUT):
+                count = self.__write(fd, data)
+            if count is None:
+                raise HIDException('timed out writing to device')
+        return count
+
+    def try_write(self, data):
+        """Write without waiting, returns `None` if the device is not ready to accept the write."""
+
+        return self.__write(self.__fileno(), data)
+
+    def read(self, size, timeout=None):
+        """Read."""
+
+        fd = self.__fileno()
+        if timeout is None and self.nonblocking:
+            timeout = 0
+        try:
+            return os.read(fd, size)
+        except BlockingIOError:
+            pass
+        except OSError as e:
+            raise HIDException(e.strerror) from e
+
+        if not self.__wait(fd, False, timeout):
+            return b''
+        try:
+            return os.read(fd, size)
+        except BlockingIOError:
+            return b''
+        except OSError as e:
+            raise HIDException(e.strerror) from e
+
+    def __ioctl(self, request, data, size):
+        """Perform a report `ioctl`."""
+
+        import fcntl
+
+        buf = bytearray(size)
+        buf[:len(data)] = data[:size]
+        try:
+            count = fcntl.ioctl(self.__fileno(), ioc(request, size), buf)
+        except OSError as e:
+            if e.errno == errno.ENOTTY:
+                raise HIDException('operation not supported by device') from e
+            raise HIDException(e.strerror) from e
+        return bytes(buf[:count])
+
+    def get_input_report(self, report_id, size):
+        """Get input report."""
+
+        return self.__ioctl(HIDIOCGINPUT, bytes((report_id,)), size)
+
+    def send_feature_report(self, data):
+        """Send feature report."""
+
+        self.__ioctl(HIDIOCSFEATURE, data, len(data))
+        return len(data)
+
+    def get_feature_report(self, report_id, size):
+        """Get feature report."""
+
+        return self.__ioctl(HIDIOCGFEATURE, bytes((report_id,)), size)
+
+    def close(self):
+        """Close connection."""
+
+        if self.__fd is not None:
+            os.close(self.__fd)
+            self.__fd = None
+
+    @property
+    def nonblocking(self):
+        """Get non-blocking."""
+        return self._nonblocking
+
+    @nonblocking.setter
+    def nonblocking(self, value):
+        """Set non-blocking."""
+
+        self.__fileno()
+        self._nonblocking = value
+
+    def __info(self, key):
+        """Get a string from the device's enumeration info."""
+
+        self.__fileno()
+        info = device_info(self.__name)
+        return info[key] if info is not None else ''
+
+    @property
+    def manufacturer(self):
+        """Get manufacturer."""
+
+        return self.__info('manufacturer_string')
+
+    @property
+    def product(self):
+        """Get product."""
+
+        return self.__info('product_string')
+
+    @property
+    def serial(self):
+        """Get serial."""
+        return self.__info('serial_number')
+
+    def get_indexed_string(self, index, max_length=255):
+        """Get indexed string."""
+
+        raise HIDException('indexed strings are not supported by the hidraw backend')
@@ -0,0 +1,166 @@
+"""
+Keyframe interpolation.
+
+Timelines are rendered into a table of unique frames (six LEDs of 8 bit RGB each) and an index with one entry per
+frame that points into the table. Each transition is quantized to 256 steps, which is all an 8 bit channel can show,
+so a transition never needs more than 256 unique frames no matter how long it runs, and holds only need one.
+
+Colors are interpolated through a 256 entry lookup table per pair of colors, built once per timeline. Perceptual
+interpolation (OKLab) is only done while building the tables, so rendering a frame is just a table lookup.
+"""
+from array import array
+from coloraide import Color
+
+LED_COUNT = 6
+FRAME_SIZE = LED_COUNT * 3
+STEPS = 256
+STEP_MAX = STEPS - 1
+
+SPACE_SRGB = 'srgb'
+SPACE_OKLAB = 'oklab'
+SPACES = frozenset([SPACE_SRGB, SPACE_OKLAB])
+
+
+def linear(t):
+    """Linear easing."""
+
+    return t
+
+
+def ease_in(t):
+    """Cubic ease in."""
+
+    return t * t * t
+
+
+def ease_out(t):
+    """Cubic ease out."""
+
+    t = 1.0 - t
+    return 1.0 - t * t * t
+
+
+def ease_in_out(t):
+    """Cubic ease in and out."""
+
+    if t < 0.5:
+        return 4.0 * t * t * t
+    t = -2.0 * t + 2.0
+    return 1.0 - t * t * t / 2.0
+
+
+def step(t):
+    """Hold the first color until the next keyframe."""
+
+    return 1.0 if t >= 1.0 else 0.0
+
+
+EASINGS = {
+    'linear': linear,
+    'ease-in': ease_in,
+    'ease-out': ease_out,
+    'ease-in-out': ease_in_out,
+    'step': step
+}
+
+
+def color_table(c1, c2, space=SPACE_SRGB):
+    """Build a lookup table of `STEPS` colors going from one RGB color to another."""
+
+    table = bytearray(STEPS * 3)
+    if c1 == c2:
+        table[:] = bytes(c1) * STEPS
+    elif space == SPACE_OKLAB:
+        mix = Color.interpolate(
+            [Color('srgb', [c / 255 for c in c1]), Color('srgb', [c / 255 for c in c2])],
+            space=SPACE_OKLAB
+        )
+        for i in range(STEPS):
+            color = mix(i / STEP_MAX).convert('srgb').fit()
+            table[i * 3:i * 3 + 3] = bytes(round(c * 255) for c in color.coords())
+    else:
+        for i in range(STEPS):
+            for channel in range(3):
+                a = c1[channel]
+                table[i * 3 + channel] = round(a + (c2[channel] - a) * i / STEP_MAX)
+    return table
+
+
+class Timeline:
+    """Rendered timeline: a table of unique frames and the index of each frame into the table."""
+
+    def __init__(self, frames, index):
+        """Initialize."""
+
+        self.frames = frames
+        self.index = index
+
+    def __len__(self):
+        """Get the number of frames."""
+
+        return len(self.index)
+
+    def frame(self, index):
+        """Get the LED colors of the given frame."""
+
+        start = self.index[index] * FRAME_SIZE
+        return self.frames[start:start + FRAME_SIZE]
+
+
+def render(keyframes, fps, space=SPACE_SRGB):
+    """
+    Render keyframes into a timeline.
+
+    `keyframes` is a list of `(time, colors, easing)` tuples, sorted by time, where `colors` is a list of six RGB
+    tuples and `easing` is the easing function used to transition to the next keyframe.
+    """
+
+    count = round(keyframes[-1][0] * fps) + 1
+    tables = {}
+    frames = bytearray()
+    index = array('I')
+    last = len(keyframes) - 1
+    frame = 0
+
+    for segment, (t1, c1, easing) in enumerate(keyframes):
+        t2, c2 = keyframes[segment + 1][:2] if segment < last else (t1, c1)
+        end = count if segment == last else min(round(t2 * fps), count)
+        if frame >= end:
+            continue
+
+        # Build one frame for every step of the transition.
+        rows = []
+        for led in range(LED_COUNT):
+            key = (c1[led], c2[led])
+            if key not in tables:
+                tables[key] = color_table(c1[led], c2[led], space)
+            rows.append(tables[key])
+        base = len(frames) // FRAME_SIZE
+        for i in range(STEPS):
+            for table in rows:
+                frames += table[i * 3:i * 3 + 3]
+
+        # Map every frame of the segment to the step it shows.
+        duration = t2 - t1
+        for f in range(frame, end):
+            t = (f / fps - t1) / duration if duration > 0 else 1.0
+            index.append(base + round(easing(min(max(t, 0.0), 1.0)) * STEP_MAX))
+        frame = end
+
+    return compact(frames, index)
+
+
+def compact(frames, index):
+    """Drop frames that are not used and merge duplicates."""
+
+    unique = {}
+    table = bytearray()
+    remap = {}
+    for i in sorted(set(index)):
+        data = bytes(frames[i * FRAME_SIZE:(i + 1) * FRAME_SIZE])
+        if data not in unique:
+            unique[data] = len(unique)
+            table += data
+        remap[i] = unique[data]
+    typecode = 'H' if len(unique) <= 0xffff else 'I'
+    return Timeline(bytes(table), array(typecode, (remap[i] for i in index)))
@@ -0,0 +1,376 @@
+"""
+Streaming schedule loader.
+
+Schedule files are read an event at a time instead of all at once, so large, generated schedules don't have to fit in
+memory as a single string and list before anything is loaded. Two formats are accepted, and the format is detected
+from the first character of the file:
+
+-   A JSON array of events, as used everywhere else, which is decoded incrementally in chunks.
+-   JSON Lines, one event object per line. Blank lines are ignored.
+
+Events are yielded as `Entry` records with the line the event starts on. Invalid events are yielded with an error
+instead of stopping the file from being read. A syntax error in a JSON array can't be recovered from, so it ends the
+file.
+
+Compiled schedules can be cached in a binary file alongside the schedule file, so that a schedule that hasn't changed
+is loaded without parsing, validating, and resolving colors again. The cache is keyed by a digest of the schedule
+file, the scenes, and the version of `pyluxa4`.
+
+Cache file:
+
+```
+Header:
+Byte 0 - 3:     Magic: LXSC
+Byte 4:         Cache version: 1
+Byte 5 - 7:     NA
+Byte 8 - 39:    SHA-256 digest of the source (see `source_digest`)
+Byte 40 - 43:   Number of events: unsigned 32 bit integer
+Byte 44 - 51:   Size of the file: unsigned 64 bit integer
+
+Event (all integers are little endian):
+Byte 0:         Flags: 0x1 (timer), 0x2 (timer start), 0x4 (timer end), 0x8 (cron)
+Byte 1 - 4:     Priority: signed 32 bit integer
+Byte 5:         Days: bitmask where bit 0 is Monday
+Byte 6:         Number of reports (R)
+Byte 7 - 8:     Number of times (T)
+Byte 9 - 10:    Timer start: minutes from the start of the day
+Byte 11 - 12:   Timer end: minutes from the start of the day
+Byte 13 - 16:   Timer cycles
+Byte 17 - 18:   Length of the cron expression (C)
+Byte 19 - 22:   Length of the event (E)
+Then:           R device reports, T times in minutes (signed 32 bit integers), the UTF-8 cron expression, and the
+                event as UTF-8 JSON.
+```
+"""
+import hashlib
+import json
+import os
+import re
+import struct
+import tempfile
+from collections import namedtuple
+from . import __meta__
+from . import usb
+from .protocol import REPORT_SIZE
+from .scheduler import CompiledEvent
+
+# Amount of the file read at a time.
+CHUNK_SIZE = 65536
+# Largest single event accepted in a JSON array, so a broken file can't be buffered whole looking for the event's end.
+MAX_EVENT_SIZE = 1024 * 1024
+
+RE_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+CACHE_SUFFIX = '.cache'
+CACHE_MAGIC = b'LXSC'
+CACHE_VERSION = 1
+HEADER = struct.Struct('<4sB3x32sIQ')
+RECORD = struct.Struct('<BiBBHHHIHI')
+
+FLAG_TIMER = 0x1
+FLAG_START = 0x2
+FLAG_END = 0x4
+FLAG_CRON = 0x8
+
+Entry = namedtuple('Entry', ['line', 'event', 'error'])
+
+
+class ArrayReader:
+    """Decode the values of a JSON array from a file, a chunk at a time."""
+
+    def __init__(self, f, chunk_size=CHUNK_SIZE):
+        """Initialize."""
+
+        self.file = f
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.pos = 0
+        # Lines are only counted up to `counted` when a line number is needed.
+        self.counted = 0
+        self.line = 1
+
+    def read(self):
+        """Read the next chunk, dropping what has already been consumed. Returns `False` at the end of the file."""
+
+        chunk = self.file.read(self.chunk_size)
+        if not chunk:
+            return False
+        self.line_at(self.pos)
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = self.counted = 0
+        return True
+
+    def line_at(self, pos):
+        """Get the line of a position in the buffer."""
+
+        self.line += self.buffer.count('\n', self.counted, pos)
+        self.counted = pos
+        return self.line
+
+    def peek(self):
+        """Skip whitespace and get the next character, or an empty string at the end of the file."""
+
+        while True:
+            self.pos = RE_WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer) or not self.read():
+                return self.buffer[self.pos:self.pos + 1]
+
+    def decode(self):
+        """Decode the next value into an entry."""
+
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError as e:
+                if len(self.buffer) - self.pos < MAX_EVENT_SIZE and self.read():
+                    continue
+                return Entry(self.line_at(max(e.pos, self.pos)), None, e.msg)
+            # A number or literal at the end of the buffer may continue in the next chunk.
+            if end == len(self.buffer) and self.read():
+                continue
+            entry = Entry(self.line_at(self.pos), value, None)
+            self.pos = end
+            return entry
+
+
+def iter_array(f, chunk_size=CHUNK_SIZE):
+    """Yield the events of a JSON array."""
+
+    reader = ArrayReader(f, chunk_size)
+    if reader.peek() != '[':
+        yield Entry(reader.line_at(reader.pos), None, 'The schedule should be a list of events')
+        return
+    reader.pos += 1
+
+    if reader.peek() == ']':
+        reader.pos += 1
+    else:
+        while True:
+            entry = reader.decode()
+            yield entry
+            if entry.error is not None:
+                return
+
+            c = reader.peek()
+            reader.pos += 1
+            if c == ']':
+                break
+            if c != ',':
+                yield Entry(reader.line_at(reader.pos), None, "Expected ',' or ']' after the event")
+                return
+
+    if reader.peek():
+        yield Entry(reader.line_at(reader.pos), None, 'Unexpected data after the list of events')
+
+
+def decode_line(text):
+    """Decode a line of JSON Lines, returns the event and an error."""
+
+    try:
+        return json.loads(text), None
+    except ValueError as e:
+        return None, 'Invalid JSON: {}'.format(e)
+
+
+def iter_lines(f):
+    """Yield the events of a JSON Lines file."""
+
+    for number, text in enumerate(f, 1):
+        if text.strip():
+            event, error = decode_line(text)
+            yield Entry(number, event, error)
+
+
+def iter_events(f, chunk_size=CHUNK_SIZE):
+    """Yield the events of a schedule file, detecting the format."""
+
+    c = f.read(1)
+    while c and c.isspace():
+        c = f.read(1)
+    f.seek(0)
+    if c == '[':
+        yield from iter_array(f, chunk_size)
+    else:
+        yield from iter_lines(f)
+
+
+def read_file(path, chunk_size=CHUNK_SIZE):
+    """Yield the events of a schedule file."""
+
+    with open(path, 'r', encoding='utf-8') as f:
+        yield from iter_events(f, chunk_size)
+
+
+def read_schedule(path):
+    """
+    Read a whole schedule file into a list of events.
+
+    Raises `ValueError` for the first event that can't be read.
+    """
+
+    events = []
+    for entry in read_file(path):
+        if entry.error is not None:
+            raise ValueError('Line {}: {}'.format(entry.line, entry.error))
+        events.append(entry.event)
+    return events
+
+
+def default_cache_path(path):
+    """Get the path of the cache for a schedule file."""
+
+    return path + CACHE_SUFFIX
+
+
+def source_digest(path, scenes=None):
+    """Get the digest that a cache of the schedule file, compiled with the given scenes, is keyed by."""
+
+    digest = hashlib.sha256()
+    digest.update(__meta__.__version__.encode('utf-8') + b'\0')
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    # Scene events are compiled into the scene's reports, so the cache is stale if the scenes change.
+    for name in sorted(scenes or {}):
+        digest.update(b'\0' + name.encode('utf-8') + b'\0' + b''.join(scenes[name].reports))
+    return digest.digest()
+
+
+def encode_record(event, compiled):
+    """Encode a compiled event for the cache."""
+
+    flags = 0
+    if compiled.timer is not None:
+        flags |= FLAG_TIMER
+    if compiled.start is not None:
+        flags |= FLAG_START
+    if compiled.end is not None:
+        flags |= FLAG_END
+    if compiled.cron is not None:
+        flags |= FLAG_CRON
+    expression = compiled.cron.encode('utf-8') if compiled.cron is not None else b''
+    body = json.dumps(event, separators=(',', ':')).encode('utf-8')
+    return b''.join(
+        (
+            RECORD.pack(
+                flags, compiled.priority, compiled.days, len(compiled.reports), len(compiled.times),
+                compiled.start or 0, compiled.end or 0, compiled.timer or 0, len(expression), len(body)
+            ),
+            *compiled.reports,
+            struct.pack('<{}i'.format(len(compiled.times)), *compiled.times),
+            expression,
+            body
+        )
+    )
+
+
+class CacheWriter:
+    """
+    Write compiled events to a cache.
+
+    The cache is written to a temporary file and only replaces the cache when it is committed, so a cache is never
+    left partially written. Events that can't be cached (such as a priority that doesn't fit) discard the cache.
+    """
+
+    def __init__(self, path, digest):
+        """Initialize."""
+
+        self.path = path
+        self.digest = digest
+        self.count = 0
+        self.size = HEADER.size
+        self.failed = False
+        fd, self.temp = tempfile.mkstemp(prefix='.', suffix='.tmp', dir=os.path.dirname(os.path.abspath(path)))
+        self.file = os.fdopen(fd, 'wb')
+        self.file.write(HEADER.pack(CACHE_MAGIC, CACHE_VERSION, digest, 0, 0))
+
+    def add(self, event, compiled):
+        """Add a compiled event."""
+
+        if self.failed:
+            return
+        try:
+            data = encode_record(event, compiled)
+        except (struct.error, TypeError, ValueError):
+            self.failed = True
+            return
+        self.file.write(data)
+        self.count += 1
+        self.size += len(data)
+
+    def commit(self):
+        """Finish writing and replace the cache, returns `False` if the cache was discarded."""
+
+        if self.failed:
+            self.discard()
+            return False
+        try:
+            self.file.seek(0)
+            self.file.write(HEADER.pack(CACHE_MAGIC, CACHE_VERSION, self.digest, self.count, self.size))
+            self.file.close()
+            os.replace(self.temp, self.path)
+        except OSError:
+            self.discard()
+            raise
+        return True
+
+    def discard(self):
+        """Discard the cache."""
+
+        self.file.close()
+        if os.path.exists(self.temp):
+            os.remove(self.temp)
+
+
+def read_record(f):
+    """Read a compiled event from the cache, returns the event and the compiled event."""
+
+    flags, priority, days, reports, times, start, end, cycles, expression, body = RECORD.unpack(f.read(RECORD.size))
+    size = reports * REPORT_SIZE
+    data = f.read(size + times * 4 + expression + body)
+    pos = size + times * 4
+    event = json.loads(data[pos + expression:])
+    reports = tuple(data[i:i + REPORT_SIZE] for i in range(0, size, REPORT_SIZE))
+    for report in reports:
+        usb.validate_report(report)
+    compiled = CompiledEvent(
+        reports,
+        priority,
+        days,
+        struct.unpack_from('<{}i'.format(times), data, size),
+        cycles if flags & FLAG_TIMER else None,
+        start if flags & FLAG_START else None,
+        end if flags & FLAG_END else None,
+        data[pos:pos + expression].decode('utf-8') if flags & FLAG_CRON else None
+    )
+    return event, compiled
+
+
+def read_cache(path, digest):
+    """
+    Read the compiled events of a cache into a list of `(event, compiled)` pairs.
+
+    Every event is read before any are returned, so that a damaged cache is never partially loaded. Returns `None` if
+    there is no cache, or if the cache is stale or damaged.
+    """
+
+    try:
+        f = open(path, 'rb')
+    except OSError:
+        return None
+    with f:
+        try:
+            magic, version, cached, count, size = HEADER.unpack(f.read(HEADER.size))
+            if magic != CACHE_MAGIC or version != CACHE_VERSION or cached != digest:
+                return None
+            if size != os.fstat(f.fileno()).st_size:
+                return None
+            records = [read_record(f) for _ in range(count)]
+        except (struct.error, ValueError, UnicodeDecodeError):
+            return None
+        # Records that don't fill the file exactly were damaged.
+        if f.tell() != size:
+            return None
+    return records
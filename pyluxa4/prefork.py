@@ -0,0 +1,408 @@
+"""
+Multi-process server.
+
+The HTTP server can run as several worker processes that accept connections on a shared socket, so that parsing,
+authorizing, and validating requests is spread across cores. The process that starts the workers is the device
+process: it is the only process that holds the device and the scheduler, so device access stays serialized.
+
+Each worker is connected to the device process by a socket pair. Device commands are validated and encoded into device
+reports by the worker, and only the report is sent to the device process. Requests that need the device process's
+state, such as scheduling, scenes, animations, and statistics, are forwarded as a whole. Events published by the device
+process are mirrored to every worker with the same IDs, so any worker can serve, and resume, an event stream.
+
+Message (all integers are big endian):
+
+```
+Byte 0:         Kind: 1 (report), 2 (request), 3 (event), 4 (sync)
+Byte 1 - 3:     NA
+Byte 4 - 7:     Sequence number, or the ID of an event: unsigned 32 bit integer
+Byte 8 - 11:    Size of the body: unsigned 32 bit integer
+Byte 12 - N:    Body
+```
+
+-   Report: the worker sends a device report, and the device process replies with a single byte `protocol` status.
+-   Request: the worker sends a line of JSON with the request's WSGI environment variables that are strings, such as
+    the CGI variables, headers, and URL scheme, followed by the request body. The device process replies with a line of
+    JSON with the response's `status` and `headers`, followed by the response body.
+-   Event: the device process sends a serialized event (see `feed`).
+-   Sync: the device process sends the ID of the latest event and the current state as serialized events, when a worker
+    connects, and if a worker falls too far behind to mirror every event.
+"""
+import contextlib
+import json
+import os
+import signal
+import socket
+import struct
+import gevent
+import gevent.os
+import gevent.socket
+from gevent.event import AsyncResult, Event
+from gevent.lock import Semaphore
+from gevent.pool import Group
+from . import protocol
+
+KIND_REPORT = 1
+KIND_REQUEST = 2
+KIND_EVENT = 3
+KIND_SYNC = 4
+
+MESSAGE = struct.Struct('!B3xII')
+
+# Seconds a stopping worker waits for its requests to finish. The device process waits twice as long for the workers.
+STOP_TIMEOUT = 5
+
+ERR_DISCONNECTED = 'The device process is not running'
+
+
+def encode_message(kind, seq, body=b''):
+    """Encode a message."""
+
+    return MESSAGE.pack(kind, seq & protocol.SEQ_MAX, len(body)) + body
+
+
+def read_message(read):
+    """
+    Read a message from a stream.
+
+    Returns the kind, sequence number, and body, or `None` if the stream was closed between messages.
+    """
+
+    data = read(MESSAGE.size)
+    if not data:
+        return None
+    if len(data) != MESSAGE.size:
+        raise protocol.ProtocolError('Message header is truncated')
+    kind, seq, size = MESSAGE.unpack(data)
+    body = read(size)
+    if len(body) != size:
+        raise protocol.ProtocolError('Message is truncated')
+    return kind, seq, body
+
+
+def encode_head(head, body):
+    """Encode a JSON head followed by a body."""
+
+    return json.dumps(head, separators=(',', ':')).encode('utf-8') + b'\n' + body
+
+
+def decode_head(data):
+    """Decode a JSON head followed by a body."""
+
+    head, _, body = data.partition(b'\n')
+    return json.loads(head), body
+
+
+def strip_event(event):
+    """Get the kind of a serialized event and the event without its ID."""
+
+    if event.startswith(b'id:'):
+        event = event.partition(b'\n')[2]
+    return event.partition(b'\n')[0].partition(b':')[2].strip().decode('utf-8'), event
+
+
+class Channel:
+    """Connection between a worker and the device process."""
+
+    def __init__(self, sock):
+        """Initialize."""
+
+        self.sock = sock
+        self.reader = sock.makefile('rb')
+        # Messages are written by many greenlets, and must not be interleaved.
+        self.lock = Semaphore()
+
+    def send(self, data):
+        """Send one or more encoded messages."""
+
+        with self.lock:
+            self.sock.sendall(data)
+
+    def read(self):
+        """Read a message, returns `None` if the connection was closed."""
+
+        return read_message(self.reader.read)
+
+    def shutdown(self):
+        """Tell the other side that nothing more will be sent."""
+
+        with contextlib.suppress(OSError):
+            self.sock.shutdown(socket.SHUT_WR)
+
+    def close(self):
+        """Close the connection."""
+
+        self.reader.close()
+        self.sock.close()
+
+
+class DeviceProcess:
+    """
+    A worker's connection to the device process.
+
+    Events received from the device process are mirrored to `feed`.
+    """
+
+    def __init__(self, sock, feed):
+        """Initialize."""
+
+        self.channel = Channel(sock)
+        self.feed = feed
+        self.seq = 0
+        # Requests waiting for a reply, by sequence number.
+        self.pending = {}
+        # The latest event of each kind that describes the current state, without its ID.
+        self.current = {}
+        self.closed = False
+
+    def sync(self, event_id, body):
+        """Start mirroring events after the given event ID from the given current state."""
+
+        self.current = dict(strip_event(event + b'\n\n') for event in body.split(b'\n\n') if event)
+        self.feed.skip(event_id)
+
+    def connect(self):
+        """Wait for the device process to send the current state, returns `False` if the device process went away."""
+
+        try:
+            message = self.channel.read()
+        except (OSError, protocol.ProtocolError):
+            message = None
+        if message is None or message[0] != KIND_SYNC:
+            self.close()
+            return False
+        self.sync(message[1], message[2])
+        return True
+
+    def run(self):
+        """Receive replies and events until the device process closes the connection."""
+
+        try:
+            while True:
+                message = self.channel.read()
+                if message is None:
+                    break
+                kind, seq, body = message
+                if kind == KIND_EVENT:
+                    self.feed.append(seq, body)
+                    name, event = strip_event(body)
+                    if name in self.current:
+                        self.current[name] = event
+                elif kind == KIND_SYNC:
+                    self.sync(seq, body)
+                else:
+                    result = self.pending.pop(seq, None)
+                    if result is not None:
+                        result.set(body)
+        except (OSError, protocol.ProtocolError):
+            pass
+        finally:
+            self.close()
+
+    def close(self):
+        """Close the connection and fail the requests waiting for a reply."""
+
+        self.closed = True
+        for result in self.pending.values():
+            result.set_exception(ConnectionError(ERR_DISCONNECTED))
+        self.pending.clear()
+        self.channel.close()
+
+    def call(self, kind, body):
+        """Send a message and wait for the reply."""
+
+        if self.closed:
+            raise ConnectionError(ERR_DISCONNECTED)
+        self.seq = (self.seq + 1) & protocol.SEQ_MAX
+        seq = self.seq
+        result = self.pending[seq] = AsyncResult()
+        try:
+            self.channel.send(encode_message(kind, seq, body))
+        except OSError:
+            self.pending.pop(seq, None)
+            raise
+        return result.get()
+
+    def send_report(self, report):
+        """Send a device report, returns a protocol status."""
+
+        return self.call(KIND_REPORT, bytes(report))[0]
+
+    def request(self, environ, data):
+        """Forward a request, returns the response's status, headers, and body."""
+
+        head, body = decode_head(self.call(KIND_REQUEST, encode_head({"environ": environ}, data)))
+        return head['status'], head['headers'], body
+
+    def current_events(self):
+        """Get the current state as serialized events."""
+
+        return b''.join(self.current.values())
+
+
+class Worker:
+    """Worker process, as seen by the device process."""
+
+    def __init__(self, pid, sock):
+        """Initialize."""
+
+        self.pid = pid
+        self.channel = Channel(sock)
+        self.running = True
+        self.reports = 0
+        self.requests = 0
+
+
+class WorkerPool:
+    """
+    Start worker processes and serve them from the device process.
+
+    `send` sends a device report and returns a `protocol` status, `request` runs a forwarded request and returns the
+    response's status, headers, and body, and `current` gets the current state as serialized events.
+    """
+
+    def __init__(self, feed, send, request, current, logger):
+        """Initialize."""
+
+        self.feed = feed
+        self.send = send
+        self.request = request
+        self.current = current
+        self.logger = logger
+        self.workers = []
+        self.handlers = Group()
+        # Set when no workers are left.
+        self.done = Event()
+        self.stopping = False
+
+    def fork(self, count, target):
+        """
+        Fork the worker processes.
+
+        Each worker calls `target` with its end of the connection to the device process, and exits when it returns.
+        """
+
+        for _ in range(count):
+            parent, child = gevent.socket.socketpair()
+            pid = gevent.fork()
+            if pid == 0:
+                status = 1
+                try:
+                    # Interrupts are handled by the device process, which stops the workers.
+                    signal.signal(signal.SIGINT, signal.SIG_IGN)
+                    parent.close()
+                    for worker in self.workers:
+                        worker.channel.close()
+                    target(child)
+                    status = 0
+                except Exception:
+                    self.logger.exception('Worker {} failed'.format(os.getpid()))
+                finally:
+                    os._exit(status)
+            child.close()
+            self.workers.append(Worker(pid, parent))
+
+    def start(self):
+        """Start serving the workers."""
+
+        for worker in self.workers:
+            gevent.spawn(self.serve, worker)
+
+    def serve(self, worker):
+        """Handle a worker's messages until it disconnects."""
+
+        forwarder = gevent.spawn(self.forward_events, worker)
+        try:
+            while True:
+                message = worker.channel.read()
+                if message is None:
+                    break
+                self.handlers.spawn(self.handle, worker, *message)
+        except (OSError, protocol.ProtocolError) as e:
+            self.logger.error(e)
+        finally:
+            forwarder.kill()
+            worker.channel.close()
+            worker.running = False
+            if not self.stopping:
+                self.logger.error('Worker {} exited'.format(worker.pid))
+            if not any(w.running for w in self.workers):
+                self.done.set()
+
+    def handle(self, worker, kind, seq, body):
+        """Handle a message from a worker and reply."""
+
+        if kind == KIND_REPORT:
+            worker.reports += 1
+            reply = bytes((self.send(body),))
+        elif kind == KIND_REQUEST:
+            worker.requests += 1
+            head, data = decode_head(body)
+            status, headers, content = self.request(head['environ'], data)
+            reply = encode_head({"status": status, "headers": headers}, content)
+        else:
+            self.logger.error('Unrecognized message from worker {}'.format(worker.pid))
+            return
+        with contextlib.suppress(OSError):
+            worker.channel.send(encode_message(kind, seq, reply))
+
+    def sync(self, worker):
+        """Send the current state to a worker, returns the ID of the latest event."""
+
+        position = self.feed.last
+        worker.channel.send(encode_message(KIND_SYNC, position, self.current()))
+        return position
+
+    def forward_events(self, worker):
+        """Mirror events to a worker."""
+
+        feed = self.feed
+        with contextlib.suppress(OSError):
+            position = self.sync(worker)
+            while not feed.closed:
+                changed = feed.changed
+                behind = feed.last - position
+                if behind > feed.size:
+                    # The events were overwritten before they could be sent.
+                    position = self.sync(worker)
+                elif behind:
+                    end = feed.last
+                    worker.channel.send(
+                        b''.join(
+                            encode_message(KIND_EVENT, event_id, event)
+                            for event_id, event in enumerate(feed.since(position), position + 1)
+                        )
+                    )
+                    position = end
+                else:
+                    changed.wait()
+
+    def stop(self, timeout=STOP_TIMEOUT):
+        """Stop the workers once the requests they are waiting on are answered."""
+
+        self.stopping = True
+        self.handlers.join(timeout)
+        # Workers stop when their connection to the device process is closed.
+        for worker in self.workers:
+            worker.channel.shutdown()
+        stopped = set()
+        with gevent.Timeout(timeout * 2, False):
+            for worker in self.workers:
+                with contextlib.suppress(ChildProcessError):
+                    gevent.os.waitpid(worker.pid, 0)
+                stopped.add(worker.pid)
+        for worker in self.workers:
+            worker.running = False
+            if worker.pid not in stopped:
+                self.logger.error('Worker {} did not stop'.format(worker.pid))
+                with contextlib.suppress(OSError):
+                    os.kill(worker.pid, signal.SIGKILL)
+                    gevent.os.waitpid(worker.pid, 0)
+
+    def stats(self):
+        """Get statistics for each worker."""
+
+        return [
+            {"pid": w.pid, "running": w.running, "reports": w.reports, "requests": w.requests}
+            for w in self.workers
+        ]
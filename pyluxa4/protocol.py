@@ -0,0 +1,176 @@
+"""
+Compact binary wire protocol.
+
+A frame wraps a single, pre-encoded device report (see `usb.validate_report`) with a small header so that a server
+can authenticate the request and forward the report to the device with minimal parsing.
+
+Request frame:
+
+```
+Byte 0:         Magic: 0x4C
+Byte 1:         Protocol version: 1
+Byte 2:         Device selector: 0-255
+Byte 3:         Token length: 0-255
+Byte 4 - 7:     Sequence number: unsigned 32 bit integer (big endian)
+Byte 8 - N:     Token: UTF-8 encoded string of token length
+Byte N - N + 9: Device report
+```
+
+Response frame:
+
+```
+Byte 0:     Magic: 0x4C
+Byte 1:     Protocol version: 1
+Byte 2:     Status: 0 (success), 1 (device failure), 2 (bad request), 3 (unauthorized), 4 (replaced by a newer report)
+Byte 3:     NA
+Byte 4 - 7: Sequence number of the request being answered
+```
+"""
+import struct
+from collections import namedtuple
+
+MIMETYPE = 'application/x-pyluxa4-frame'
+
+MAGIC = 0x4c
+VERSION = 1
+REPORT_SIZE = 9
+SEQ_MAX = 0xffffffff
+TOKEN_MAX = 0xff
+
+DEVICE_DEFAULT = 0
+
+STATUS_OK = 0
+STATUS_FAILED = 1
+STATUS_BAD_REQUEST = 2
+STATUS_UNAUTHORIZED = 3
+# The report was dropped, as a newer report for the same LEDs arrived before it could be written.
+STATUS_COALESCED = 4
+
+STATUS_CODES = {
+    STATUS_OK: 200,
+    STATUS_FAILED: 400,
+    STATUS_BAD_REQUEST: 400,
+    STATUS_UNAUTHORIZED: 401,
+    STATUS_COALESCED: 200
+}
+
+STATUS_MESSAGES = {
+    STATUS_OK: '',
+    STATUS_FAILED: 'Command could not be executed, possibly due to a disconnected device',
+    STATUS_BAD_REQUEST: 'Malformed frame or invalid device report',
+    STATUS_UNAUTHORIZED: 'Unauthorized Access',
+    STATUS_COALESCED: ''
+}
+
+HEADER = struct.Struct('!BBBBI')
+RESPONSE = struct.Struct('!BBBxI')
+
+
+class ProtocolError(ValueError):
+    """Malformed frame."""
+
+
+class Frame(namedtuple('Frame', ['device', 'seq', 'token', 'report'])):
+    """Decoded request frame."""
+
+
+def encode_frame(report, seq=0, token='', device=DEVICE_DEFAULT):
+    """Encode a report into a request frame."""
+
+    token = token.encode('utf-8') if token else b''
+    if len(token) > TOKEN_MAX:
+        raise ProtocolError('Tokens cannot exceed {} bytes when encoded'.format(TOKEN_MAX))
+    if len(report) != REPORT_SIZE:
+        raise ProtocolError('Reports must be {} bytes, {} bytes were given'.format(REPORT_SIZE, len(report)))
+    return HEADER.pack(MAGIC, VERSION, device, len(token), seq & SEQ_MAX) + token + bytes(report)
+
+
+def decode_token(data):
+    """Decode the token."""
+
+    try:
+        return bytes(data).decode('utf-8')
+    except UnicodeDecodeError as e:
+        raise ProtocolError('Token is not valid UTF-8') from e
+
+
+def decode_header(data):
+    """
+    Decode the fixed size header of a request frame.
+
+    Returns the device selector, sequence number, and the token length.
+    """
+
+    if len(data) != HEADER.size:
+        raise ProtocolError('Frame header is truncated')
+    magic, version, device, size, seq = HEADER.unpack(data)
+    if magic != MAGIC:
+        raise ProtocolError('Unrecognized frame')
+    if version != VERSION:
+        raise ProtocolError('Unsupported protocol version {}'.format(version))
+    return device, seq, size
+
+
+def decode_frame(data):
+    """Decode a complete request frame."""
+
+    device, seq, size = decode_header(data[:HEADER.size])
+    end = HEADER.size + size
+    if len(data) != end + REPORT_SIZE:
+        raise ProtocolError('Frame size does not match the frame header')
+    return Frame(device, seq, decode_token(data[HEADER.size:end]), bytes(data[end:]))
+
+
+def read_frame(read):
+    """
+    Read a request frame from a stream.
+
+    `read` must return exactly the number of bytes requested or fewer if the stream is closed.
+    Returns `None` if the stream was closed between frames.
+    """
+
+    data = read(HEADER.size)
+    if not data:
+        return None
+    device, seq, size = decode_header(data)
+    body = read(size + REPORT_SIZE)
+    if len(body) != size + REPORT_SIZE:
+        raise ProtocolError('Frame is truncated')
+    return Frame(device, seq, decode_token(body[:size]), body[size:])
+
+
+def encode_response(seq, status=STATUS_OK):
+    """Encode a response frame."""
+
+    return RESPONSE.pack(MAGIC, VERSION, status, seq & SEQ_MAX)
+
+
+def decode_response(data):
+    """
+    Decode a response frame.
+
+    Returns the sequence number and status.
+    """
+
+    if len(data) != RESPONSE.size:
+        raise ProtocolError('Response frame is truncated')
+    magic, version, status, seq = RESPONSE.unpack(data)
+    if magic != MAGIC or version != VERSION:
+        raise ProtocolError('Unrecognized response frame')
+    return seq, status
+
+
+def response_to_dict(path, data):
+    """Translate a response frame into the same form as a JSON response."""
+
+    seq, status = decode_response(data)
+    result = {
+        "path": path,
+        "status": 'success' if status in (STATUS_OK, STATUS_COALESCED) else 'fail',
+        "code": STATUS_CODES.get(status, 400),
+        "error": STATUS_MESSAGES.get(status, 'Unrecognized response status {}'.format(status)),
+        "seq": seq
+    }
+    if status == STATUS_COALESCED:
+        result['coalesced'] = True
+    return result
@@ -0,0 +1,96 @@
+"""
+Named scenes.
+
+A scene is a composite state, such as "in a meeting", made of several commands. Scenes are compiled once, when they
+are loaded, into the device reports they send, so applying a scene doesn't need to resolve or validate anything.
+
+```
+{
+    "meeting": [
+        {"cmd": "color", "args": {"color": "red", "led": "back"}},
+        {"cmd": "strobe", "args": {"color": "red", "led": "front", "speed": 20, "repeat": 3}}
+    ],
+    "free": [{"cmd": "off"}]
+}
+```
+
+Steps are the registered device commands (see `commands`) and take the same arguments as the REST API, except that
+LEDs, waves, and patterns can also be given by name, as in schedules.
+"""
+from . import commands
+from . import common as cmn
+
+# Arguments that can be given by name.
+RESOLVERS = {
+    "led": cmn.resolve_led,
+    "wave": cmn.resolve_wave,
+    "pattern": cmn.resolve_pattern
+}
+
+
+class Scene:
+    """Compiled scene."""
+
+    def __init__(self, name, reports):
+        """Initialize."""
+
+        self.name = name
+        self.reports = tuple(reports)
+
+    def apply(self, handle):
+        """
+        Send the scene's reports to the device.
+
+        Returns `True` if a report failed, like `usb.Luxafor` commands.
+        """
+
+        for report in self.reports:
+            if handle.send_report(report):
+                return True
+        return False
+
+
+def compile_step(step):
+    """Compile a scene step into a device report."""
+
+    if not isinstance(step, dict):
+        raise TypeError('Scene steps must be JSON objects')
+    for k in step.keys():
+        if k not in ('cmd', 'args'):
+            raise ValueError('Unexpected scene step parameter {}'.format(k))
+
+    cmd = step.get('cmd')
+    command = commands.registry.get(cmd)
+    if command is None:
+        raise ValueError('Unrecognized command {}'.format(cmd))
+
+    arguments = step.get('args', {})
+    if not isinstance(arguments, dict):
+        raise TypeError("'args' must be a JSON object")
+    values = {}
+    for name, value in arguments.items():
+        if name not in command.names:
+            raise ValueError('Unexpected command argument {}'.format(name))
+        if name in RESOLVERS and isinstance(value, str):
+            value = RESOLVERS[name](value)
+        values[name] = value
+    return command.report(values)
+
+
+def compile_scene(name, steps):
+    """Compile a scene from a list of steps."""
+
+    if not isinstance(steps, list) or not steps:
+        raise ValueError('Scene {} must be a non-empty list of steps'.format(name))
+    try:
+        return Scene(name, [compile_step(step) for step in steps])
+    except Exception as e:
+        raise ValueError('Scene {}: {}'.format(name, e)) from e
+
+
+def load_scenes(obj):
+    """Compile scenes from an object that maps scene names to steps."""
+
+    if not isinstance(obj, dict):
+        raise TypeError('Scenes must be a JSON object of scene names and steps')
+    return {name: compile_scene(name, steps) for name, steps in obj.items()}
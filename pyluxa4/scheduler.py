@@ -1,7 +1,13 @@
 """Scheduler."""
+import logging
+import math
 import time
-import copy
-from datetime import datetime
+import hashlib
+import json
+from collections import namedtuple
+from datetime import datetime, timedelta
+from . import usb
+from . import cron
 from . import common as cmn
 
 MON = 0
@@ -15,6 +21,15 @@ WEEKDAY = (MON, TUE, WED, THU, FRI)
 WEEKEND = (SAT, SUN)
 ALL = WEEKDAY + WEEKEND
 
+# Default priorities, when events that match at the same time conflict, the higher priority wins.
+PRIORITY_SCHEDULE = 0
+PRIORITY_TIMER = 1
+
+# Seconds between schedule checks on the server.
+CHECK_INTERVAL = 10
+# Seconds after its time that an event can still go off.
+WINDOW = 60
+
 DAY_MAP = {
     "mon": (MON,),
     "tue": (TUE,),
@@ -29,24 +44,106 @@ DAY_MAP = {
 }
 
 
+def day_mask(days):
+    """Get the bitmask of the given days."""
+
+    mask = 0
+    for day in days:
+        mask |= 1 << day
+    return mask
+
+
+DAYS_ALL = day_mask(ALL)
+
+
+class CompiledEvent(
+    namedtuple('CompiledEvent', ['reports', 'priority', 'days', 'times', 'timer', 'start', 'end', 'cron'])
+):
+    """
+    Event compiled into a form that doesn't depend on when it is loaded.
+
+    `days` is a bitmask of weekdays, `times` are minutes from the start of the day (or relative minutes for timers),
+    `timer` is the number of timer cycles, `start` and `end` are timer boundaries in minutes from the start of the day,
+    and `cron` is the cron expression.
+    """
+
+
+class Snapshot(namedtuple('Snapshot', ['body', 'etag'])):
+    """Immutable view of scheduled events: the events serialized as JSON, and an entity tag."""
+
+
+def create_snapshot(events):
+    """Create a snapshot of the given events."""
+
+    body = json.dumps(list(events), separators=(',', ':'), sort_keys=True)
+    return Snapshot(body, '"{}"'.format(hashlib.sha1(body.encode('utf-8')).hexdigest()))
+
+
+def net_reports(reports):
+    """
+    Reduce a sequence of reports to those that are still visible once all of them are applied.
+
+    A report is dropped if a later report sets the same LEDs, or if a later report drives the whole device.
+    The order of the remaining reports is kept.
+    """
+
+    latest = {}
+    for report in reports:
+        target = usb.report_target(report)
+        if target == cmn.LED_ALL:
+            latest.clear()
+        else:
+            latest.pop(target, None)
+        latest[target] = report
+    return list(latest.values())
+
+
 class Scheduler:
-    """Scheduler."""
+    """
+    Scheduler.
 
-    def __init__(self, handle, logger):
-        """Initialize."""
+    Whenever the events change, new snapshots of the schedule and timers are published. Readers can use the current
+    snapshots without copying or locking anything, as a published snapshot is never modified.
+
+    Events are compiled into device reports when they are read. When several events match in the same check, only the
+    reports that still have a visible effect once all of them are applied are sent, see `net_reports`.
+
+    Cron events only keep the next time they run, which is found from the compiled expression each time they go off.
+    """
+
+    def __init__(self, handle, logger, scenes=None, clock=time.time):
+        """
+        Initialize.
+
+        `clock` returns the current time as a timestamp, it can be replaced to run the scheduler in virtual time.
+        """
 
         self.logger = logger
         self.handle = handle
+        self.clock = clock
+        self.scenes = scenes if scenes is not None else {}
         self.mode_map = {
-            "color": handle.color,
-            "strobe": handle.strobe,
-            "fade": handle.fade,
-            "wave": handle.wave,
-            "pattern": handle.pattern,
-            "off": handle.off
+            "color": usb.color_report,
+            "strobe": usb.strobe_report,
+            "fade": usb.fade_report,
+            "wave": usb.wave_report,
+            "pattern": usb.pattern_report,
+            "off": usb.off_report,
+            "scene": None
         }
         self.events = []
         self.cmds = []
+        self.writes = 0
+        self.coalesced = 0
+        # Timers that expired in the latest check.
+        self.expired = []
+        self.schedule_snapshot = self.timers_snapshot = create_snapshot([])
+
+    def publish(self):
+        """Publish new snapshots of the schedule and timers."""
+
+        self.schedule_snapshot = create_snapshot(e for e in self.events if e.get('timer') is None)
+        self.timers_snapshot = create_snapshot(e for e in self.events if e.get('timer') is not None)
 
     def clear_timers(self):
         """Clear the timers."""
@@ -60,6 +157,8 @@ class Scheduler:
         for index in reversed(remove):
             del self.events[index]
             del self.cmds[index]
+        if remove:
+            self.publish()
 
     def clear_schedule(self):
         """Clear the schedule."""
@@ -73,20 +172,34 @@ class Scheduler:
         for index in reversed(remove):
             del self.events[index]
             del self.cmds[index]
+        if remove:
+            self.publish()
 
-    def get_timer_increment(self, times):
+    def get_timer_increment(self, minutes):
         """Calculate timer increments."""
 
+        accum = sum(minutes) * 60
+        if accum == 0:
+            accum = 1
+        return accum
+
+    def parse_minutes(self, times, timer=False):
+        """
+        Parse `H:M` times into minutes.
+
+        Times that aren't for timers are times of the day, so they must be valid 24 hour times.
+        """
+
         if not isinstance(times, list):
             times = [times]
 
-        accum = 0
+        minutes = []
         for t in times:
-            h, m = t.split(':')
-            accum += int(h) * 60 * 60 + int(m) * 60
-        if accum == 0:
-            accum = 1
-        return accum
+            h, m = (int(x) for x in t.split(':'))
+            if not timer and not (0 <= h < 24 and 0 <= m < 60):
+                raise ValueError('Invalid time {}'.format(t))
+            minutes.append(h * 60 + m)
+        return minutes
 
     def resolve_times(self, ref, times, timer=False):
         """
@@ -99,31 +212,24 @@ class Scheduler:
         we should add a day.
         """
 
-        if not isinstance(times, list):
-            times = [times]
+        return self.resolve_minutes(ref, self.parse_minutes(times, timer), timer)
 
-        seconds = ref.timestamp()
-        if timer:
-            new_times = []
-            ts = ref.timestamp()
-            for t in times:
-                h, m = t.split(':')
-                new_times.append(ts + int(h) * 60 * 60 + int(m) * 60)
-                ts = new_times[-1]
-        else:
-            new_times = []
-            for t in times:
-                h, m = t.split(':')
-                dt = ref.replace(hour=int(h), minute=int(m), second=0, microsecond=0)
-                t = dt.timestamp()
-                if t < seconds:
-                    t += 24 * 60 * 60
-                new_times.append(dt.timestamp())
+    def resolve_minutes(self, ref, minutes, timer=False):
+        """Resolve times given in minutes, see `resolve_times`."""
+
+        if not timer:
+            return [ref.replace(hour=m // 60, minute=m % 60, second=0, microsecond=0).timestamp() for m in minutes]
+
+        new_times = []
+        ts = ref.timestamp()
+        for m in minutes:
+            ts += m * 60
+            new_times.append(ts)
         return new_times
 
     def resolve_days(self, days):
         """
-        Resolve days.
+        Resolve days into a bitmask.
 
         Days are numbers from 0-6 where Monday is 0.
         """
@@ -138,7 +244,21 @@ class Scheduler:
                 resolved.extend(value)
         if not resolved:
             raise ValueError('No valid days found')
-        return set(resolved)
+        return day_mask(resolved)
+
+    def resolve_cron(self, expression, ref):
+        """
+        Resolve the next time a cron expression runs after the reference time.
+
+        Returns `None` if it never runs.
+        """
+
+        ts = ref.timestamp()
+        t = expression.next_fire(ref)
+        # When daylight saving time ends, the repeated hour resolves to times that have already passed.
+        while t is not None and t.timestamp() <= ts:
+            t = expression.next_fire(t)
+        return t.timestamp() if t is not None else None
 
     def parse_led(self, arguments, kwargs):
         """Parse led."""
@@ -191,6 +311,33 @@ class Scheduler:
         cmn.is_str('color', color)
         args.append(color)
 
+    def parse_scene(self, arguments, args):
+        """Parse scene."""
+
+        name = arguments['scene']
+        cmn.is_str('scene', name)
+        scene = self.scenes.get(name)
+        if scene is None:
+            raise ValueError('Unrecognized scene {}'.format(name))
+        args.append(scene)
+
+    def parse_priority(self, obj, timer):
+        """Parse priority."""
+
+        priority = obj.get('priority', PRIORITY_SCHEDULE if timer is None else PRIORITY_TIMER)
+        cmn.is_int('priority', priority)
+        return priority
+
+    def parse_cron(self, obj):
+        """Parse cron expression."""
+
+        for k in ('days', 'times', 'timer'):
+            if k in obj:
+                raise ValueError("'{}' cannot be used with 'cron'".format(k))
+        # Compile it to validate it.
+        cron.Cron(obj['cron'])
+        return obj['cron']
+
     def parse_timer(self, obj):
         """Parse timer."""
 
@@ -199,15 +346,140 @@ class Scheduler:
         cmn.validate_timer_cycle(timer)
         return timer
 
-    def parse_timer_boundary(self, ref, value, now):
-        """Parse timer boundary."""
+    def parse_timer_boundary(self, value):
+        """Parse timer boundary into minutes."""
+
+        return self.parse_minutes([value])[0] if value is not None else None
+
+    def resolve_timer_boundary(self, now, minutes):
+        """Resolve timer boundary."""
 
-        t = self.resolve_times(ref, [value], False)[0] if value is not None else None
+        t = self.resolve_minutes(now, [minutes])[0] if minutes is not None else None
         # Time is already passed for today, assume tomorrow
         if t is not None and t < now.timestamp():
             t += 24 * 60 * 60
         return t
 
+    def compile_event(self, entry):
+        """Validate an event and compile it into a `CompiledEvent`."""
+
+        if not isinstance(entry, dict):
+            raise TypeError('Events should be JSON objects')
+        start = None
+        end = None
+        expression = None
+
+        allowed = {'cmd', 'days', 'times', 'args', 'timer', 'priority', 'cron'}
+        if 'timer' in entry:
+            allowed.add('start')
+            allowed.add('end')
+        # Throw an error for unexpected parameters
+        for k in entry.keys():
+            if k not in allowed:
+                raise ValueError('Unexpected event parameter {}'.format(k))
+
+        cmd_type = entry['cmd']
+
+        # Handle timer variables
+        timer = self.parse_timer(entry) if 'timer' in entry else None
+        if timer is not None:
+            start = self.parse_timer_boundary(entry.get('start'))
+            end = self.parse_timer_boundary(entry.get('end'))
+        priority = self.parse_priority(entry, timer)
+
+        args = []
+        kwargs = {}
+        if cmd_type in self.mode_map:
+            if 'cron' in entry:
+                days = DAYS_ALL
+                times = ()
+                expression = self.parse_cron(entry)
+            else:
+                days = DAYS_ALL if timer is not None else self.resolve_days(entry['days'])
+                times = tuple(self.parse_minutes(entry['times'], timer is not None))
+            arguments = entry.get('args', {})
+            expected = set()
+            if cmd_type in ('color', 'strobe', 'fade', 'wave'):
+                expected.add('color')
+                self.parse_color(arguments, args)
+
+                if cmd_type in ('color', 'strobe', 'fade'):
+                    expected.add('led')
+                    self.parse_led(arguments, kwargs)
+
+                if cmd_type in ('strobe', 'fade', 'wave'):
+                    expected.add('speed')
+                    self.parse_speed(arguments, kwargs)
+
+                if cmd_type in ('strobe', 'wave'):
+                    expected.add('repeat')
+                    self.parse_repeat(arguments, kwargs)
+
+                if cmd_type == 'wave':
+                    expected.add('wave')
+                    self.parse_wave(arguments, kwargs)
+
+            elif cmd_type == 'pattern':
+                expected.add('pattern')
+                expected.add('repeat')
+                self.parse_pattern(arguments, args)
+                self.parse_repeat(arguments, kwargs)
+
+            elif cmd_type == 'scene':
+                expected.add('scene')
+                self.parse_scene(arguments, args)
+
+            # Throw an error for unexpected arguments
+            for k in arguments.keys():
+                if k not in expected:
+                    raise ValueError('Unexpected command argument {}'.format(k))
+
+            if cmd_type == 'scene':
+                reports = args[0].reports
+            else:
+                reports = (self.mode_map[cmd_type](*args, **kwargs),)
+
+        else:
+            raise ValueError("Unrecognized command {}".format(cmd_type))
+
+        return CompiledEvent(tuple(reports), priority, days, times, timer, start, end, expression)
+
+    def resolve_event(self, compiled, now):
+        """Resolve a compiled event's times relative to now into the form that is checked."""
+
+        timer = compiled.timer
+        start = end = expression = None
+        if compiled.cron is not None:
+            expression = cron.Cron(compiled.cron)
+            # Start from the current minute, like times earlier in the current minute.
+            t = self.resolve_cron(expression, now - timedelta(minutes=1))
+            if t is None:
+                raise ValueError("The cron expression '{}' never runs".format(compiled.cron))
+            times = [t]
+        else:
+            if timer is not None:
+                start = self.resolve_timer_boundary(now, compiled.start)
+                end = self.resolve_timer_boundary(now, compiled.end)
+            times = self.resolve_minutes(
+                (datetime.fromtimestamp(start) if start is not None else now),
+                compiled.times,
+                timer is not None
+            )
+
+        return {
+            'reports': compiled.reports,
+            'priority': compiled.priority,
+            'days': compiled.days,
+            'times': times,
+            'minutes': compiled.times,
+            'cron': expression,
+            'cycles': None if timer is None else [timer] * len(times),
+            'increment': 1 if timer is None else self.get_timer_increment(compiled.times),
+            'timer': timer is not None,
+            'start': start,
+            'end': end
+        }
+
     def read_schedule(self, records):
         """Read schedule."""
 
@@ -221,132 +493,112 @@ class Scheduler:
         events = []
         cmds = []
 
-        now = datetime.now()
+        now = datetime.fromtimestamp(self.clock())
 
-        for entry in records:
-            start = None
-            end = None
+        for index, entry in enumerate(records, 1):
             try:
-                allowed = {'cmd', 'days', 'times', 'args', 'timer'}
-                if 'timer' in entry:
-                    allowed.add('start')
-                    allowed.add('end')
-                # Throw an error for unexpected parameters
-                for k in entry.keys():
-                    if k not in allowed:
-                        raise ValueError('Unexpected event parameter {}'.format(k))
-
-                cmd_type = entry['cmd']
-
-                # Handle timer variables
-                timer = self.parse_timer(entry) if 'timer' in entry else None
-                if timer is not None:
-                    start = self.parse_timer_boundary(now, entry.get('start'), now)
-                    end = self.parse_timer_boundary(now, entry.get('end'), now)
-
-                args = []
-                kwargs = {}
-                if cmd_type in self.mode_map:
-                    cmd = self.mode_map[cmd_type]
-                    if timer is not None:
-                        days = ALL
-                    else:
-                        days = self.resolve_days(entry['days'])
-                    times = self.resolve_times(
-                        (datetime.fromtimestamp(start) if start is not None else now),
-                        entry['times'],
-                        timer is not None
-                    )
-                    arguments = entry.get('args', {})
-                    expected = set()
-                    if cmd_type in ('color', 'strobe', 'fade', 'wave'):
-                        expected.add('color')
-                        self.parse_color(arguments, args)
-
-                        if cmd_type in ('color', 'strobe', 'fade'):
-                            expected.add('led')
-                            self.parse_led(arguments, kwargs)
-
-                        if cmd_type in ('strobe', 'fade', 'wave'):
-                            expected.add('speed')
-                            self.parse_speed(arguments, kwargs)
-
-                        if cmd_type in ('strobe', 'wave'):
-                            expected.add('repeat')
-                            self.parse_repeat(arguments, kwargs)
-
-                        if cmd_type == 'wave':
-                            expected.add('wave')
-                            self.parse_wave(arguments, kwargs)
-
-                    elif cmd_type == 'pattern':
-                        expected.add('pattern')
-                        expected.add('repeat')
-                        self.parse_pattern(arguments, args)
-                        self.parse_repeat(arguments, kwargs)
-
-                    # Throw an error for unexpected arguments
-                    for k in arguments.keys():
-                        if k not in expected:
-                            raise ValueError('Unexpected command argument {}'.format(k))
-
-                else:
-                    raise ValueError("Unrecognized command {}".format(cmd_type))
-
+                cmd = self.resolve_event(self.compile_event(entry), now)
             except Exception as e:
-                err = str(e)
+                err = 'Event {}: {}'.format(index, e)
                 break
 
             events.append(entry)
-            cmds.append(
-                {
-                    'cmd': cmd,
-                    'args': args,
-                    'kwargs': kwargs,
-                    'days': days,
-                    'times': times,
-                    'cycles': None if timer is None else [timer] * len(entry['times']),
-                    'increment': 1 if timer is None else self.get_timer_increment(entry['times']),
-                    'timer': timer is not None,
-                    'start': start,
-                    'end': end
-                }
-            )
-        if not err:
+            cmds.append(cmd)
+        if not err and events:
             self.events.extend(events)
             self.cmds.extend(cmds)
+            self.publish()
 
         return err
 
+    def add_event(self, entry, now, compiled=None, cache=None):
+        """
+        Compile, unless it is already compiled, and add an event. Returns an error if it fails.
+
+        The compiled event is added to `cache` (see `loader.CacheWriter`) if one is given.
+        """
+
+        try:
+            if compiled is None:
+                compiled = self.compile_event(entry)
+            cmd = self.resolve_event(compiled, now)
+        except Exception as e:
+            return str(e)
+        self.events.append(entry)
+        self.cmds.append(cmd)
+        if cache is not None:
+            cache.add(entry, compiled)
+        return ''
+
+    def load_schedule(self, entries, cache=None):
+        """
+        Read events one at a time from `loader.Entry` records, such as from `loader.read_file`.
+
+        Unlike `read_schedule`, events that fail are skipped and the rest are still loaded. Returns a list of errors
+        with the line of each event that failed.
+        """
+
+        errors = []
+        loaded = 0
+        now = datetime.fromtimestamp(self.clock())
+        for entry in entries:
+            err = entry.error if entry.error is not None else self.add_event(entry.event, now, cache=cache)
+            if err:
+                errors.append('Line {}: {}'.format(entry.line, err))
+            else:
+                loaded += 1
+        if loaded:
+            self.publish()
+        return errors
+
+    def load_compiled(self, records):
+        """
+        Read events that are already compiled from `(event, compiled)` pairs, such as from `loader.read_cache`.
+
+        Returns a list of errors.
+        """
+
+        errors = []
+        loaded = 0
+        now = datetime.fromtimestamp(self.clock())
+        for index, (event, compiled) in enumerate(records, 1):
+            err = self.add_event(event, now, compiled)
+            if err:
+                errors.append('Event {}: {}'.format(index, err))
+            else:
+                loaded += 1
+        if loaded:
+            self.publish()
+        return errors
+
+    def stats(self):
+        """Get scheduler statistics."""
+
+        return {
+            "events": len(self.events),
+            "writes": self.writes,
+            "coalesced": self.coalesced
+        }
+
     def get_schedule(self):
-        """Get the schedule."""
+        """Get a copy of the schedule, decoded from the published snapshot."""
 
-        records = []
-        for event in self.events:
-            timer = event.get('timer')
-            if timer is None:
-                records.append(copy.deepcopy(event))
-        return records
+        return json.loads(self.schedule_snapshot.body)
 
     def get_timers(self):
-        """Get the timers."""
+        """Get a copy of the timers, decoded from the published snapshot."""
 
-        records = []
-        for event in self.events:
-            timer = event.get('timer')
-            if timer is not None:
-                records.append(copy.deepcopy(event))
-        return records
+        return json.loads(self.timers_snapshot.body)
 
     def time_expired(self, now, target):
         """Check if target past any usable range."""
 
-        return target is None or (now >= target and (now - target) >= 60)
+        return target is None or (now >= target and (now - target) >= WINDOW)
 
     def time_in_range(self, now, target, day, days):
         """Evaluate if time is in range."""
 
-        return target is not None and now >= target and day in days and (now - target) < 60
+        return target is not None and now >= target and days >> day & 1 and (now - target) < WINDOW
 
     def update_timer(self, cmd, event_index, time_index, dt_now, expired):
         """Update a timer."""
@@ -360,7 +612,8 @@ class Scheduler:
             now = dt_now.timestamp()
             cycles = 0
 
-            while t < now:
+            # The next time must be after now, even if we are checking exactly on time.
+            while t <= now:
                 t += increment
                 cycles += 1
 
@@ -382,13 +635,17 @@ class Scheduler:
     def update_time(self, cmd, event_index, time_index, dt_now):
         """Update a normal event time."""
 
-        times = self.events[event_index]['times']
+        if cmd['cron'] is not None:
+            cmd['times'][time_index] = self.resolve_cron(cmd['cron'], dt_now)
+            return
+
+        minutes = cmd['minutes'][time_index:time_index + 1]
         t = cmd['times'][time_index]
-        t2 = self.resolve_times(dt_now, times[time_index] if isinstance(times, list) else times, False)[0]
+        t2 = self.resolve_minutes(dt_now, minutes)[0]
         if t2 == t:
             # We haven't rolled over to a new day, so we calculated the same time.
-            # Add a day.
-            t2 += 24 * 60 * 60
+            # Use the next day, which isn't always 24 hours away when daylight saving time changes.
+            t2 = self.resolve_minutes(dt_now + timedelta(days=1), minutes)[0]
         cmd['times'][time_index] = t2
 
     def update_times(self, cmd, index, dt_now, expired):
@@ -408,14 +665,47 @@ class Scheduler:
 
         return timer_expired
 
+    def send(self, report):
+        """Send a report to the device."""
+
+        self.writes += 1
+        try:
+            if self.handle.send_report(report):
+                self.logger.error('Scheduled command could not be executed, possibly due to a disconnected device')
+        except Exception as e:
+            self.logger.error(e)
+
+    def next_check(self, now):
+        """
+        Get the earliest time at which checking the events could do anything.
+
+        Checking the events before then neither runs nor updates any of them. Returns `None` if there are no events.
+        """
+
+        candidates = []
+        for cmd in self.cmds:
+            if cmd['timer']:
+                if cmd['start'] is not None:
+                    candidates.append(cmd['start'])
+                    continue
+                if cmd['end'] is not None:
+                    candidates.append(cmd['end'])
+            # Times that have passed can still go off (such as when the day changes) or need refreshing.
+            candidates.extend(t if t > now else now for t in cmd['times'] if t is not None)
+        return min(candidates) if candidates else None
+
     def check_records(self):
-        """Check events."""
+        """
+        Check events.
+
+        Returns the events that went off.
+        """
 
         indexes = []
         timers = []
         expired = []
 
-        now = time.time()
+        now = self.clock()
         dt_now = datetime.fromtimestamp(now)
         day = dt_now.weekday()
 
@@ -448,17 +738,116 @@ class Scheduler:
                         indexes.append(index)
                         self.update_time(cmd, index, i, dt_now)
 
+        # Apply the matched events from the lowest priority to the highest, so the highest priority wins.
+        # Timers follow schedules and events follow the order they were read in when the priorities are equal.
         indexes.extend(timers)
+        indexes.sort(key=lambda i: self.cmds[i]['priority'])
+        reports = [report for index in indexes for report in self.cmds[index]['reports']]
+        surviving = net_reports(reports)
+        self.coalesced += len(reports) - len(surviving)
 
-        # Run the matched event
-        for index in indexes:
-            cmd = self.cmds[index]
-            try:
-                cmd['cmd'](*cmd['args'], **cmd['kwargs'])
-            except Exception as e:
-                self.logger.error(e)
+        # Run the matched events
+        for report in surviving:
+            self.send(report)
+        matched = [self.events[index] for index in indexes]
 
         # Remove expired timers
+        self.expired = [self.events[index] for index in expired]
         for index in reversed(expired):
             del self.cmds[index]
             del self.events[index]
+        if expired:
+            self.publish()
+
+        return matched
+
+
+class VirtualClock:
+    """Clock that only moves when it is told to."""
+
+    def __init__(self, now):
+        """Initialize."""
+
+        self.now = now
+
+    def __call__(self):
+        """Get the current time."""
+
+        return self.now
+
+
+class RecordingHandle:
+    """Device handle that records the reports it is sent instead of sending them."""
+
+    def __init__(self):
+        """Initialize."""
+
+        self.reports = []
+
+    def send_report(self, report, *, wait=False):
+        """Record a report."""
+
+        self.reports.append(report)
+        return False
+
+
+class Firing(namedtuple('Firing', ['time', 'events', 'reports'])):
+    """Events that went off at a schedule check, and the reports that were sent to the device."""
+
+
+class Simulation(namedtuple('Simulation', ['firings', 'checks', 'ticks', 'elapsed'])):
+    """Simulation results: the firings, schedule checks made, checks a polling server would make, and run time."""
+
+
+def simulate(events, start, end, scenes=None, interval=CHECK_INTERVAL, gaps=()):
+    """
+    Compute every firing the scheduler would make between two timestamps.
+
+    Events are checked every `interval` seconds, as on the server, except that checks that can't change anything are
+    skipped (see `Scheduler.next_check`), so long ranges take as long as the number of firings, not the length of the
+    range. `gaps` is a list of `(sleep, wake)` timestamps during which the machine is asleep and no checks are made,
+    checks resume as soon as it wakes. Times are resolved in the local time zone, so daylight saving time transitions
+    are handled as they would be on the server.
+    """
+
+    logger = logging.getLogger(__name__ + '.simulate')
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+    clock = VirtualClock(start)
+    handle = RecordingHandle()
+    scheduler = Scheduler(handle, logger, scenes, clock)
+    err = scheduler.read_schedule(events)
+    if err:
+        raise ValueError(err)
+
+    gaps = sorted(gaps)
+    base = now = start
+    for sleep, wake in gaps:
+        if sleep <= now < wake:
+            base = now = wake
+
+    firings = []
+    checks = 0
+    begin = time.perf_counter()
+    while now < end:
+        clock.now = now
+        handle.reports = []
+        matched = scheduler.check_records()
+        checks += 1
+        if matched:
+            firings.append(Firing(now, matched, handle.reports))
+
+        target = scheduler.next_check(now)
+        if target is None:
+            break
+        # Checks happen on a fixed interval counted from the last time the machine woke up,
+        # so the next check that matters is the first one after now that is at or after the target.
+        tick = base + max(math.floor((now - base) / interval) + 1, math.ceil((target - base) / interval)) * interval
+        for sleep, wake in gaps:
+            if now < sleep <= tick:
+                # The machine falls asleep first, and checks resume as soon as it wakes up.
+                base = wake
+                tick = wake + max(0, math.ceil((target - wake) / interval)) * interval
+        now = tick
+
+    return Simulation(firings, checks, math.ceil((end - start) / interval), time.perf_counter() - begin)
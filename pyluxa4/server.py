@@ -1,13 +1,32 @@
 """Luxafor server."""
+import functools
+import hashlib
+import io
+import json
 import logging
+import os
+import socket
+import stat
+import sys
 from flask import Flask, jsonify, abort, make_response, request
 from flask_httpauth import HTTPTokenAuth
-from gevent.pywsgi import WSGIServer
+from werkzeug.exceptions import HTTPException
+from gevent.pywsgi import WSGIServer, WSGIHandler
+from gevent.server import StreamServer
 from gevent.lock import BoundedSemaphore
+from gevent.event import Event
+from gevent.pool import Pool
 import gevent
+import gevent.socket
 from . import scheduler
+from . import loader
 from . import usb
-from . import common as cmn
+from . import protocol
+from . import cache
+from . import animation
+from . import commands as device_commands
+from . import feed
+from . import prefork
 from . import __meta__
 
 sem = BoundedSemaphore(1)
@@ -20,11 +39,39 @@ app = Flask(__name__)
 auth = HTTPTokenAuth('Bearer')
 tokens = set()
 luxafor = None
+# The device as seen by commands and the scheduler, which publishes the device's state to the event feed.
+device_state = None
 schedule = None
+http_server = None
+stream_server = None
+unix_server = None
+# Worker processes, when running the HTTP server in worker processes (`prefork.WorkerPool`).
+pool = None
+# The connection to the device process, when running as a worker process (`prefork.DeviceProcess`).
+owner = None
+idempotency = cache.ExpiringCache(size=256, ttl=300)
+event_feed = feed.Feed(event=Event)
+# Idempotency keys whose requests are currently executing.
+pending = {}
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+# Marks responses to commands that were replaced by a newer command before they could be written.
+COALESCED_HEADER = 'Pyluxa4-Coalesced'
 HOST = '0.0.0.0'
 PORT = 5000
+UNIX_MODE = 0o600
+# Maximum writes per second to the device, 0 disables pacing.
+WRITE_RATE = 250
+# WSGI environment key that marks requests that are already authorized, such as those received over the local Unix
+# domain socket, or forwarded by a worker process.
+LOCAL_ENVIRON = 'pyluxa4.local'
 ERR_CMD_FAILED = "Command could not be excuted, possibly due to a disconnected device"
 
+# REST endpoints of the registered device commands, see `get_endpoint`.
+endpoints = {}
+# Named scenes, see `scenes.load_scenes`.
+scene_registry = {}
+
 
 def get_api_ver_path():
     """Get the API path."""
@@ -32,229 +79,381 @@ def get_api_ver_path():
     return '/pyluxa4/api/v%s.%s' % __meta__.__version_info__[:2]
 
 
+def is_valid_token(token):
+    """Check if the token is valid."""
+
+    return token in tokens
+
+
+def token_required():
+    """Check if the server was assigned a token that clients must provide."""
+
+    return any(tokens)
+
+
+def is_authorized(token):
+    """Check if a token is authorized, when the server has no token, any token is."""
+
+    return not token_required() or is_valid_token(token)
+
+
 @auth.verify_token
 def verify_token(token):
     """Verify incoming token."""
 
-    if token in tokens:
-        return True
-    return False
+    return is_valid_token(token)
 
 
-def color():
-    """Set colors."""
+def login_required(f):
+    """
+    Require token authentication.
 
-    try:
-        error = ''
-        led = request.json.get("led", cmn.LED_ALL)
-        cmn.is_int('led', led)
-        color = request.json.get('color', '')
-        cmn.is_str('color', color)
-    except Exception as e:
-        logger.error(e)
-        error = str(e)
+    Requests over the local socket are already authorized by the socket's file permissions, requests forwarded by a
+    worker process were authorized by the worker, and if no token was assigned to the server, there is nothing to
+    verify.
+    """
 
-    if not error:
-        sem.acquire()
-        try:
-            if luxafor.color(color, led=led):
-                raise RuntimeError(ERR_CMD_FAILED)
-        except Exception as e:
-            logger.error(e)
-            error = str(e)
-        sem.release()
+    protected = auth.login_required(f)
 
-    if error:
-        abort(400, error)
+    @functools.wraps(f)
+    def decorated(*args, **kwargs):
+        """Skip token verification when not required."""
 
-    return jsonify(
-        {
-            "path": request.path,
-            "status": 'success',
-            "code": 200,
-            "error": error
-        }
-    )
+        if request.environ.get(LOCAL_ENVIRON, False) or not token_required():
+            return f(*args, **kwargs)
+        return protected(*args, **kwargs)
+
+    return decorated
+
+
+class NoDelayHandler(WSGIHandler):
+    """
+    Request handler that disables Nagle's algorithm on TCP connections.
+
+    Responses are written in multiple parts, so keep-alive clients would otherwise stall on delayed ACKs.
+    """
+
+    def __init__(self, sock, address, server, rfile=None):
+        """Initialize."""
+
+        if sock.family in (socket.AF_INET, socket.AF_INET6):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        super().__init__(sock, address, server, rfile)
 
 
-def fade():
-    """Fade colors."""
+class LocalTransport:
+    """WSGI middleware that marks requests as received over the local Unix domain socket."""
 
+    def __init__(self, application):
+        """Initialize."""
+
+        self.application = application
+
+    def __call__(self, environ, start_response):
+        """Mark the request as local."""
+
+        environ[LOCAL_ENVIRON] = True
+        return self.application(environ, start_response)
+
+
+def create_unix_listener(path, mode=UNIX_MODE):
+    """Create a listening Unix domain socket that is only accessible as specified by `mode`."""
+
+    if not hasattr(socket, 'AF_UNIX'):
+        raise RuntimeError('Unix domain sockets are not supported on this platform')
+
+    if os.path.exists(path):
+        if not stat.S_ISSOCK(os.stat(path).st_mode):
+            raise RuntimeError('{} already exists and is not a socket'.format(path))
+        # Left over from a previous run
+        os.remove(path)
+
+    listener = gevent.socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    # Restrict the umask while binding so the socket is never accessible beyond `mode`.
+    umask = os.umask(0o777 & ~mode)
     try:
-        error = ''
-        led = request.json.get("led", cmn.LED_ALL)
-        cmn.is_int('led', led)
-        color = request.json.get('color', '')
-        cmn.is_str('color', color)
-        speed = request.json.get('speed', 0)
-        cmn.is_int('speed', speed)
-    except Exception as e:
-        logger.error(e)
-        error = str(e)
+        listener.bind(path)
+    finally:
+        os.umask(umask)
+    os.chmod(path, mode)
+    listener.listen(socket.SOMAXCONN)
+    return listener
 
-    if not error:
-        sem.acquire()
-        try:
-            if luxafor.fade(color, led=led, speed=speed):
-                raise RuntimeError(ERR_CMD_FAILED)
-        except Exception as e:
-            logger.error(e)
-            error = str(e)
-        sem.release()
 
-    if error:
-        abort(400, error)
+def success_body(path, coalesced=False):
+    """Serialize a success response the same way `jsonify` does."""
 
-    return jsonify(
-        {
-            "path": request.path,
-            "status": 'success',
-            "code": 200,
-            "error": error
-        }
-    )
+    body = {
+        "path": path,
+        "status": 'success',
+        "code": 200,
+        "error": ''
+    }
+    if coalesced:
+        body['coalesced'] = True
+    return json.dumps(
+        body,
+        separators=(',', ':'),
+        sort_keys=True
+    ).encode('utf-8') + b'\n'
+
+
+class Endpoint:
+    """
+    REST endpoint of a registered device command (see `commands.register_command`).
+
+    The success responses are serialized up front as they are the same for every request.
+    """
+
+    def __init__(self, command):
+        """Initialize."""
+
+        self.command = command
+        self.name = command.name
+        self.modes = command.modes
+        self.path = '{}/command/{}'.format(get_api_ver_path(), command.name)
+        self.success = success_body(self.path)
+        self.coalesced = success_body(self.path, True)
+
+    def response(self, written=True):
+        """
+        Create the success response.
+
+        A command that was replaced by a newer one before it could be written still succeeds, as the device ends up in
+        the state that was requested last, but the response is marked as coalesced.
+        """
 
+        if written:
+            return app.response_class(self.success, mimetype='application/json')
+        response = app.response_class(self.coalesced, mimetype='application/json')
+        response.headers[COALESCED_HEADER] = 'true'
+        return response
 
-def strobe():
-    """Strobe colors."""
 
+def get_endpoint(name):
+    """Get the endpoint of a registered device command, returns `None` if there is no such command."""
+
+    command = device_commands.registry.get(name)
+    if command is None:
+        return None
+    endpoint = endpoints.get(name)
+    if endpoint is None or endpoint.command is not command:
+        endpoint = endpoints[name] = Endpoint(command)
+    return endpoint
+
+
+def write_report(report):
+    """
+    Write a report to the device, raising an error if it could not be written.
+
+    Returns `False` if the report was dropped because a newer command replaced it while waiting for the device.
+    """
+
+    if owner is not None:
+        # The device process paces the report and writes it.
+        status = owner.send_report(report)
+        if status == protocol.STATUS_COALESCED:
+            return False
+        if status != protocol.STATUS_OK:
+            raise RuntimeError(ERR_CMD_FAILED)
+        return True
+
+    # The device is being told to do something else.
+    player.stop()
+    if not luxafor.pace(report):
+        return False
+    sem.acquire()
     try:
-        error = ''
-        led = request.json.get("led", cmn.LED_ALL)
-        cmn.is_int('led', led)
-        color = request.json.get('color', '')
-        cmn.is_str('color', color)
-        speed = request.json.get('speed', 0)
-        cmn.is_int('speed', speed)
-        repeat = request.json.get('repeat', 0)
-        cmn.is_int('repeat', repeat)
+        if device_state.send_report(report):
+            raise RuntimeError(ERR_CMD_FAILED)
+    finally:
+        sem.release()
+    return True
+
+
+def write_frame(reports):
+    """
+    Write the reports of an animation frame to the device, returns `True` if the frame was shown.
+
+    Frames are paced and tracked like any other command, so a newer command for the same LEDs replaces a frame that
+    is waiting for the device.
+    """
+
+    for report in reports:
+        if not luxafor.pace(report):
+            return False
+    sem.acquire()
+    try:
+        if device_state.send_reports(reports):
+            raise RuntimeError(ERR_CMD_FAILED)
     except Exception as e:
         logger.error(e)
-        error = str(e)
-
-    if not error:
-        sem.acquire()
-        try:
-            if luxafor.strobe(color, led=led, speed=speed, repeat=repeat):
-                raise RuntimeError(ERR_CMD_FAILED)
-        except Exception as e:
-            logger.error(e)
-            error = str(e)
+        return False
+    finally:
         sem.release()
+    return True
 
-    if error:
-        abort(400, error)
 
-    return jsonify(
-        {
-            "path": request.path,
-            "status": 'success',
-            "code": 200,
-            "error": error
-        }
-    )
+player = animation.Player(write_frame)
+
 
+class ScheduledDevice:
+    """
+    The device as seen by the scheduler.
+
+    Like commands sent to the server, scheduled events stop the animation that is playing before changing the LEDs.
+    """
+
+    def __init__(self, state):
+        """Initialize."""
+
+        self.state = state
 
-def wave():
-    """Wave colors."""
+    def send_report(self, report, *, wait=False):
+        """Stop the animation and send a report."""
+
+        player.stop()
+        return self.state.send_report(report, wait=wait)
+
+
+def play_animation():
+    """Play an animation."""
 
     try:
         error = ''
-        color = request.json.get('color', '')
-        cmn.is_str('color', color)
-        wave = request.json.get('wave', cmn.WAVE_SHORT)
-        cmn.is_int('wave', wave)
-        speed = request.json.get('speed', 0)
-        cmn.is_int('speed', speed)
-        repeat = request.json.get('repeat', 0)
-        cmn.is_int('repeat', repeat)
+        anim = animation.parse_animation(request.get_json(silent=True))
     except Exception as e:
         logger.error(e)
         error = str(e)
 
-    if not error:
-        sem.acquire()
-        try:
-            if luxafor.wave(color, wave=wave, speed=speed, repeat=repeat):
-                raise RuntimeError(ERR_CMD_FAILED)
-        except Exception as e:
-            logger.error(e)
-            error = str(e)
-        sem.release()
-
     if error:
         abort(400, error)
 
-    return jsonify(
-        {
-            "path": request.path,
-            "status": 'success',
-            "code": 200,
-            "error": error
-        }
-    )
+    player.play(anim)
+    event_feed.publish(feed.EVENT_ANIMATION, {"frames": anim.count, "fps": anim.fps, "repeat": anim.repeat})
+    return {
+        "path": request.path,
+        "status": 'success',
+        "code": 200,
+        "error": error
+    }
 
 
-def pattern():
-    """Set pattern."""
+SCENE_SUCCESS = success_body('{}/command/scene'.format(get_api_ver_path()))
 
+
+def apply_scene():
+    """Apply a named scene, whose reports were compiled when the scenes were loaded."""
+
+    data = request.get_json(silent=True)
+    name = data.get('scene') if isinstance(data, dict) else None
+    scene = scene_registry.get(name) if isinstance(name, str) else None
+    if scene is None:
+        logger.error('Unrecognized scene {}'.format(name))
+        abort(400, 'Unrecognized scene {}'.format(name))
+
+    player.stop()
+    sem.acquire()
     try:
-        error = ''
-        pattern = request.json.get('pattern', 0)
-        cmn.is_int('pattern', pattern)
-        repeat = request.json.get('repeat', 0)
-        cmn.is_int('repeat', repeat)
+        failed = scene.apply(device_state)
+    finally:
+        sem.release()
+    if failed:
+        logger.error(ERR_CMD_FAILED)
+        abort(400, ERR_CMD_FAILED)
+
+    return app.response_class(SCENE_SUCCESS, mimetype='application/json')
+
+
+def device_command(endpoint):
+    """Validate and execute a device command sent as JSON."""
+
+    try:
+        report = endpoint.command.report(request.get_json(silent=True))
+        written = write_report(report)
     except Exception as e:
         logger.error(e)
-        error = str(e)
+        abort(400, str(e))
 
-    if not error:
-        sem.acquire()
-        try:
-            if luxafor.pattern(pattern, repeat=repeat):
-                raise RuntimeError(ERR_CMD_FAILED)
-        except Exception as e:
-            logger.error(e)
-            error = str(e)
-        sem.release()
+    return endpoint.response(written)
 
-    if error:
-        abort(400, error)
 
-    return jsonify(
-        {
-            "path": request.path,
-            "status": 'success',
-            "code": 200,
-            "error": error
-        }
-    )
+def send_report(device, report):
+    """
+    Send a pre-encoded report to the device.
 
+    Returns a protocol status.
+    """
 
-def off():
-    """Set off."""
+    if device != protocol.DEVICE_DEFAULT:
+        logger.error('Unrecognized device selector {}'.format(device))
+        return protocol.STATUS_BAD_REQUEST
 
-    error = ''
-    sem.acquire()
     try:
-        if luxafor.off():
-            raise RuntimeError(ERR_CMD_FAILED)
+        usb.validate_report(report)
     except Exception as e:
         logger.error(e)
-        error = str(e)
-    sem.release()
+        return protocol.STATUS_BAD_REQUEST
 
-    if error:
-        abort(400, error)
+    try:
+        status = protocol.STATUS_OK if write_report(report) else protocol.STATUS_COALESCED
+    except Exception as e:
+        logger.error(e)
+        status = protocol.STATUS_FAILED
+    return status
 
-    return jsonify(
-        {
-            "path": request.path,
-            "status": 'success',
-            "code": 200,
-            "error": error
-        }
+
+def binary_command(endpoint):
+    """Execute a command sent as a binary frame."""
+
+    modes = endpoint.modes
+    seq = 0
+    try:
+        frame = protocol.decode_frame(request.get_data())
+        seq = frame.seq
+        if frame.report[1] not in modes:
+            raise protocol.ProtocolError('Report mode does not match the {} command'.format(endpoint.name))
+    except Exception as e:
+        logger.error(e)
+        status = protocol.STATUS_BAD_REQUEST
+    else:
+        status = send_report(frame.device, frame.report)
+
+    response = app.response_class(
+        protocol.encode_response(seq, status),
+        status=protocol.STATUS_CODES[status],
+        mimetype=protocol.MIMETYPE
     )
+    if status == protocol.STATUS_COALESCED:
+        response.headers[COALESCED_HEADER] = 'true'
+    return response
+
+
+def handle_stream(sock, address):
+    """Handle a persistent stream of binary frames."""
+
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    reader = sock.makefile('rb')
+    try:
+        while True:
+            try:
+                frame = protocol.read_frame(reader.read)
+            except protocol.ProtocolError as e:
+                # We can't recover the frame boundaries, so drop the connection.
+                logger.error(e)
+                break
+            if frame is None:
+                break
+            if not is_authorized(frame.token):
+                status = protocol.STATUS_UNAUTHORIZED
+            else:
+                status = send_report(frame.device, frame.report)
+            sock.sendall(protocol.encode_response(frame.seq, status))
+    except OSError as e:
+        logger.error(e)
+    finally:
+        reader.close()
+        sock.close()
 
 
 def kill():
@@ -262,8 +461,16 @@ def kill():
 
     try:
         error = ''
-        http_server.close()
-        http_server.stop(timeout=10)
+        if stream_server is not None:
+            stream_server.close()
+        if unix_server is not None:
+            unix_server.close()
+        # End event subscriptions so the server doesn't wait on them.
+        event_feed.close()
+        if http_server is not None:
+            http_server.close()
+            http_server.stop(timeout=10)
+        player.stop()
         background.kill()
     except Exception as e:
         logger.error(e)
@@ -281,21 +488,26 @@ def kill():
 
 
 def get_records(timers=False):
-    """Return the current schedule or timers from the scheduler."""
+    """
+    Return the current schedule or timers from the scheduler.
 
-    sem.acquire()
-    if timers:
-        report = schedule.get_timers()
+    The scheduler's published snapshot is served as is, so no locking or copying is needed, and clients that already
+    have the snapshot (`If-None-Match`) are told it hasn't changed.
+    """
+
+    snapshot = schedule.timers_snapshot if timers else schedule.schedule_snapshot
+    if request.if_none_match.contains_weak(snapshot.etag.strip('"')):
+        response = app.response_class(status=304)
     else:
-        report = schedule.get_schedule()
-    sem.release()
-    return {
-        "path": request.path,
-        "status": 'success',
-        "code": 200,
-        "schedule": report,
-        "error": ''
-    }
+        # Assemble the body around the pre-serialized records the same way `jsonify` would serialize it.
+        response = app.response_class(
+            '{{"code":200,"error":"","path":{},"schedule":{},"status":"success"}}\n'.format(
+                json.dumps(request.path), snapshot.body
+            ),
+            mimetype='application/json'
+        )
+    response.headers['ETag'] = snapshot.etag
+    return response
 
 
 def setup_schedule():
@@ -328,9 +540,103 @@ def check_schedule():
 
     while True:
         sem.acquire()
-        schedule.check_records()
+        matched = schedule.check_records()
         sem.release()
-        gevent.sleep(10)
+        if matched:
+            event_feed.publish(feed.EVENT_FIRED, {"events": matched})
+        if schedule.expired:
+            event_feed.publish(feed.EVENT_EXPIRED, {"timers": schedule.expired})
+        gevent.sleep(scheduler.CHECK_INTERVAL)
+
+
+def current_events():
+    """Get the current state as serialized events, which new event subscribers are sent first."""
+
+    if owner is not None:
+        return owner.current_events()
+    return (
+        feed.encode_event(feed.EVENT_DEVICE, {"connected": luxafor.connected}) +
+        feed.encode_event(feed.EVENT_STATE, device_state.describe())
+    )
+
+
+def publish_connection(connected):
+    """Publish a change in the device's connection."""
+
+    event_feed.publish(feed.EVENT_DEVICE, {"connected": connected})
+
+
+def forward_request():
+    """Forward the request to the device process."""
+
+    try:
+        error = ''
+        # Only variables that are strings, such as the CGI variables and the URL scheme, can be forwarded.
+        environ = {k: v for k, v in request.environ.items() if isinstance(v, str)}
+        status, headers, body = owner.request(environ, request.get_data())
+    except Exception as e:
+        logger.error(e)
+        error = str(e)
+
+    if error:
+        abort(400, error)
+
+    return app.response_class(body, status=status, headers=headers)
+
+
+def run_forwarded(environ, data):
+    """
+    Run a request forwarded by a worker process, which has already authorized it.
+
+    `environ` holds the request's WSGI environment variables that are strings, and `data` is the request body. Returns
+    the response's status, headers, and body.
+    """
+
+    environ = dict(environ)
+    environ.update(
+        {
+            'CONTENT_LENGTH': str(len(data)),
+            'wsgi.version': (1, 0),
+            'wsgi.input': io.BytesIO(data),
+            'wsgi.input_terminated': True,
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': False,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+            LOCAL_ENVIRON: True
+        }
+    )
+    response = []
+    body = []
+
+    def start_response(status, headers, exc_info=None):
+        """Record the response's status and headers."""
+
+        response[:] = [int(status.split(' ', 1)[0]), headers]
+        return body.append
+
+    result = app(environ, start_response)
+    try:
+        body.extend(result)
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+    status, headers = response
+    return status, headers, b''.join(body)
+
+
+def device_process(f):
+    """Forward requests that need the device process's state to the device process when running as a worker."""
+
+    @functools.wraps(f)
+    def decorated(*args, **kwargs):
+        """Forward the request."""
+
+        if owner is not None:
+            return forward_request()
+        return f(*args, **kwargs)
+
+    return decorated
 
 
 @app.route('/')
@@ -345,38 +651,118 @@ def index():
     return "RESTful Luxafor server!"
 
 
+def run_command(command):
+    """Run the given command."""
+
+    device = get_endpoint(command)
+    if device is not None:
+        if request.mimetype == protocol.MIMETYPE:
+            results = binary_command(device)
+        else:
+            results = device_command(device)
+    elif command == 'kill':
+        # Results won't make it back if successful
+        results = kill()
+    elif command == 'scheduler':
+        results = setup_schedule()
+    elif command == 'animation':
+        results = play_animation()
+    elif command == 'scene':
+        results = apply_scene()
+    else:
+        abort(404)
+
+    return results
+
+
+def run_idempotent_command(command, key):
+    """
+    Run the given command unless a request with the same idempotency key already ran.
+
+    Successful responses are cached by key, and retries of the same request are answered from the cache without
+    touching the device. Failed requests, and commands that were replaced by a newer command before they could be
+    written, are not cached so that they can be retried.
+    """
+
+    cache_key = (request.path, key)
+    fingerprint = hashlib.sha256(request.mimetype.encode('utf-8') + b'\0' + request.get_data()).digest()
+
+    # A retry may arrive while the original request is still executing.
+    while cache_key in pending:
+        pending[cache_key].wait()
+
+    cached = idempotency.get(cache_key)
+    if cached is not None:
+        if cached[0] != fingerprint:
+            abort(400, 'Idempotency key {} was already used for a different request'.format(key))
+        response = app.response_class(cached[1], status=cached[2], mimetype=cached[3])
+        response.headers[REPLAYED_HEADER] = 'true'
+        return response
+
+    done = pending[cache_key] = Event()
+    try:
+        try:
+            response = app.make_response(run_command(command))
+        except HTTPException as e:
+            response = app.make_response(app.handle_http_exception(e))
+        if 200 <= response.status_code < 300 and COALESCED_HEADER not in response.headers:
+            idempotency.set(
+                cache_key,
+                (fingerprint, response.get_data(), response.status_code, response.mimetype)
+            )
+    finally:
+        del pending[cache_key]
+        done.set()
+
+    return response
+
+
 @app.route('%s/command/<string:command>' % get_api_ver_path(), methods=['POST'])
-@auth.login_required
+@login_required
 def execute_command(command):
     """Executes a given command GET or POST command."""
     if request.method == 'POST':
-        if command == 'color':
-            results = color()
-        elif command == 'fade':
-            results = fade()
-        elif command == 'strobe':
-            results = strobe()
-        elif command == 'wave':
-            results = wave()
-        elif command == 'pattern':
-            results = pattern()
-        elif command == 'off':
-            results = off()
-        elif command == 'kill':
-            # Results won't make it back if successful
-            results = kill()
-        elif command == 'scheduler':
-            results = setup_schedule()
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if owner is not None and (key or command not in device_commands.registry):
+            # Only device commands can be handled by a worker. Idempotency keys are tracked by the device process, as
+            # a retry may be received by a different worker.
+            results = forward_request()
+        elif key and command != 'kill':
+            results = run_idempotent_command(command, key)
         else:
-            abort(404)
+            results = run_command(command)
     else:
         abort(404)
 
     return results
 
 
+@app.route('%s/server/stats' % get_api_ver_path(), methods=['GET'])
+@login_required
+@device_process
+def get_stats():
+    """Retrieve server statistics."""
+
+    return {
+        "path": request.path,
+        "status": 'success',
+        "code": 200,
+        "stats": {
+            "idempotency": dict(idempotency.stats(), pending=len(pending)),
+            "animation": player.stats(),
+            "pacing": luxafor.pacer.stats() if luxafor.pacer is not None else None,
+            "device": dict(luxafor.supervisor.stats(), connected=luxafor.connected),
+            "scheduler": schedule.stats(),
+            "events": event_feed.stats(),
+            "workers": pool.stats() if pool is not None else None
+        },
+        "error": ''
+    }
+
+
 @app.route('%s/scheduler/<string:command>' % get_api_ver_path(), methods=['GET'])
-@auth.login_required
+@login_required
+@device_process
 def get_scheduler(command):
     """Retrieve information from scheduler."""
 
@@ -393,6 +779,30 @@ def get_scheduler(command):
     return results
 
 
+@app.route('%s/events' % get_api_ver_path(), methods=['GET'])
+@login_required
+def get_events():
+    """
+    Stream device and scheduler events as server-sent events.
+
+    New subscribers, and subscribers that can't resume from `Last-Event-ID`, are sent the current state first.
+    """
+
+    try:
+        last_id = int(request.headers.get('Last-Event-ID', ''))
+    except ValueError:
+        last_id = None
+
+    position = event_feed.position(last_id)
+    initial = current_events() if position != last_id else b''
+
+    response = app.response_class(event_feed.subscribe(position, initial), mimetype=feed.MIMETYPE)
+    response.headers['Cache-Control'] = 'no-cache'
+    # Don't let proxies hold events back.
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @app.route('/pyluxa4/api/version', methods=['GET'])
 def version():
     """Return version."""
@@ -456,39 +866,147 @@ def server_error(error):
     )
 
 
+def load_schedule_file(path, use_cache=True):
+    """
+    Load a schedule file into the scheduler.
+
+    The compiled schedule is cached alongside the file, and the cache is loaded instead of the file until the file or
+    the scenes change. Schedules with errors are not cached, so the errors are reported every time.
+    """
+
+    if not use_cache:
+        errors = schedule.load_schedule(loader.read_file(path))
+    else:
+        cache_path = loader.default_cache_path(path)
+        digest = loader.source_digest(path, scene_registry)
+        records = loader.read_cache(cache_path, digest)
+        if records is not None:
+            logger.info('Loading compiled schedule from {}'.format(cache_path))
+            errors = schedule.load_compiled(records)
+        else:
+            try:
+                writer = loader.CacheWriter(cache_path, digest)
+            except OSError as e:
+                logger.warning('Schedule cache could not be created: {}'.format(e))
+                writer = None
+            errors = schedule.load_schedule(loader.read_file(path), writer)
+            if writer is not None:
+                if errors:
+                    writer.discard()
+                else:
+                    try:
+                        writer.commit()
+                    except OSError as e:
+                        logger.warning('Schedule cache could not be written: {}'.format(e))
+
+    for err in errors:
+        logger.error(err)
+
+
+def run_worker(sock):
+    """Serve HTTP requests in a worker process until the device process stops."""
+
+    global owner
+
+    owner = prefork.DeviceProcess(sock, event_feed)
+    if not owner.connect():
+        return
+    http_server.start()
+    owner.run()
+    event_feed.close()
+    http_server.close()
+    http_server.stop(timeout=prefork.STOP_TIMEOUT)
+
+
 def run(
     host=HOST, port=PORT, device_index=0, device_path=None, token=None, events=None,
-    hidapi=None, debug=False, **kwargs
+    hidapi=None, debug=False, stream_port=None, unix_socket=None, unix_mode=UNIX_MODE, write_rate=WRITE_RATE,
+    backend=usb.BACKEND_HIDAPI, scenes=None, schedule_file=None, schedule_cache=True, workers=0, **kwargs
 ):
-    """Run server."""
+    """
+    Run server.
+
+    `events` is a list of events to schedule, and `schedule_file` is a schedule file that is streamed into the
+    scheduler, see `loader`. The compiled `schedule_file` is cached unless `schedule_cache` is disabled.
+
+    If `workers` is given, HTTP requests are served by that many worker processes, and this process only handles the
+    device, see `prefork`. The stream port and the local socket are still served by this process.
+    """
 
     global luxafor
     global http_server
+    global stream_server
+    global unix_server
     global tokens
     global schedule
     global background
+    global scene_registry
+    global device_state
+    global pool
 
-    usb.init(hidapi)
+    usb.init(hidapi, backend)
 
     log_handler.setFormatter(
         logging.Formatter(fmt='[%(asctime)s] %(levelname)s: %(message)s', datefmt="%Y-%m-%d %H:%M:%S")
     )
+    tokens = {token,}
+
+    if workers < 0:
+        raise ValueError('The number of workers cannot be negative')
+    if workers:
+        # Workers handle requests in a pool, so they can finish the requests they are handling when they stop.
+        http_server = WSGIServer((host, port), app, handler_class=NoDelayHandler, spawn=Pool(), **kwargs)
+        if not hasattr(os, 'fork'):
+            raise RuntimeError('Worker processes are not supported on this platform')
+        # The workers share the listening socket, so it is created before they are started.
+        http_server.init_socket()
+        pool = prefork.WorkerPool(
+            event_feed, functools.partial(send_report, protocol.DEVICE_DEFAULT), run_forwarded, current_events, logger
+        )
+        pool.fork(workers, run_worker)
+        http_server.close()
+        http_server = None
+    else:
+        http_server = WSGIServer((host, port), app, handler_class=NoDelayHandler, **kwargs)
 
-    with usb.Luxafor(device_index, device_path) as lf:
+    pacer = usb.WritePacer(rate=min(60.0, write_rate), max_rate=write_rate) if write_rate else None
+    supervisor = usb.ReconnectSupervisor(spawn=gevent.spawn, sleep=gevent.sleep, notify=publish_connection)
+    with usb.Luxafor(device_index, device_path, pacer=pacer, sleep=gevent.sleep, supervisor=supervisor) as lf:
         luxafor = lf
-        tokens = {token,}
-        schedule = scheduler.Scheduler(luxafor, logger)
+        device_state = feed.DeviceState(luxafor, event_feed)
+        scene_registry = scenes if scenes is not None else {}
+        schedule = scheduler.Scheduler(ScheduledDevice(device_state), logger, scene_registry)
         if events is not None:
             err = schedule.read_schedule(events)
             if err:
                 logger.error(err)
-        http_server = WSGIServer((host, port), app, **kwargs)
-        serve = gevent.spawn(http_server.start)
+        if schedule_file is not None:
+            load_schedule_file(schedule_file, schedule_cache)
+        if pool is None:
+            serve = gevent.spawn(http_server.start)
+        else:
+            pool.start()
+        if stream_port is not None:
+            stream_server = StreamServer((host, stream_port), handle_stream, **kwargs)
+            stream_server.start()
+        if unix_socket is not None:
+            unix_server = WSGIServer(create_unix_listener(unix_socket, unix_mode), LocalTransport(app))
+            unix_server.start()
         background = gevent.spawn(check_schedule)
 
         try:
-            logger.info('Starting Luxafor server...')
-            gevent.joinall([serve, background])
+            if pool is None:
+                logger.info('Starting Luxafor server...')
+                gevent.joinall([serve, background])
+            else:
+                logger.info('Starting Luxafor server with {} workers...'.format(workers))
+                # Run until the server is killed, or all of the workers have exited.
+                gevent.wait([background, pool.done], count=1)
+                background.kill()
         except KeyboardInterrupt:
             pass
+        if pool is not None:
+            pool.stop()
+        if unix_socket is not None and os.path.exists(unix_socket):
+            os.remove(unix_socket)
         logger.info('Exiting Luxafor server...')
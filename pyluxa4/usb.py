@@ -5,8 +5,16 @@ apmorton/pyhidapi: https://github.com/apmorton/pyhidapi
 libusb/hidapi: https://github.com/libusb/hidapi
 
 """
+import asyncio
 import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from . import hid
+from . import hidraw
 from .common import (
     LED_ALL, LED_BACK, LED_FRONT, LED_1, LED_2, LED_3, LED_4, LED_5, LED_6,
     WAVE_SHORT, WAVE_LONG, WAVE_OVERLAPPING_SHORT, WAVE_OVERLAPPING_LONG,
@@ -21,7 +29,7 @@ from coloraide import Color
 __version__ = '0.1'
 
 __all__ = (
-    'Luxafor', 'enumerate_luxafor',
+    'Luxafor', 'AsyncLuxafor', 'enumerate_luxafor',
     'LED_ALL', 'LED_BACK', 'LED_FRONT', 'LED_1', 'LED_2', 'LED_3', 'LED_4', 'LED_5', 'LED_6',
     'WAVE_SHORT', 'WAVE_LONG', 'WAVE_OVERLAPPING_SHORT', 'WAVE_OVERLAPPING_LONG',
     'WAVE_1', 'WAVE_2', 'WAVE_3', 'WAVE_4', 'WAVE_5',
@@ -47,12 +55,37 @@ MSG_NONE = b''
 MSG_SIZE = 8
 
 CMD_REPORT_NUM = 0
+REPORT_SIZE = 9
 
+# How often `AsyncLuxafor` polls devices that can't be watched by the event loop.
+POLL_INTERVAL = 0.01
 
-def init(hidapi=None):
-    """Initialize USB setup."""
+BACKEND_HIDAPI = 'hidapi'
+BACKEND_HIDRAW = 'hidraw'
+BACKENDS = (BACKEND_HIDAPI, BACKEND_HIDRAW)
 
-    hid.init(hidapi)
+# Module used to access devices, see `init`.
+device_backend = hid
+
+
+def init(hidapi=None, backend=BACKEND_HIDAPI):
+    """
+    Initialize USB setup.
+
+    `backend` selects how devices are accessed: `hidapi` (through the hidapi library) or `hidraw` (Linux hidraw
+    device nodes, without hidapi).
+    """
+
+    global device_backend
+
+    if backend == BACKEND_HIDAPI:
+        hid.init(hidapi)
+        device_backend = hid
+    elif backend == BACKEND_HIDRAW:
+        hidraw.init()
+        device_backend = hidraw
+    else:
+        raise ValueError('Backend must be one of {}, {} was given'.format(', '.join(BACKENDS), backend))
 
 
 def clamp(value, mn=0, mx=255):
@@ -71,7 +104,354 @@ def resolve_color(color):
 def enumerate_luxafor():
     """Enumerate all Luxafor devices."""
 
-    return hid.enumerate(vid=LUXAFOR_VENDOR, pid=LUXAFOR_PRODUCT)
+    return device_backend.enumerate(vid=LUXAFOR_VENDOR, pid=LUXAFOR_PRODUCT)
+
+
+def basic_color_report(color):
+    """Build basic color report."""
+
+    color = ord(color.upper())
+    cmn.validate_simple_color(color)
+    return bytes([CMD_REPORT_NUM, MODE_BASIC, color, 0, 0, 0, 0, 0, 0])
+
+
+def off_report():
+    """Build off report."""
+
+    return basic_color_report('O')
+
+
+def color_report(color, *, led=LED_ALL):
+    """Build static color report."""
+
+    if isinstance(color, str) and len(color) == 1:
+        return basic_color_report(color)
+    red, green, blue = resolve_color(color)
+    cmn.validate_led(led)
+    return bytes([CMD_REPORT_NUM, MODE_STATIC, led, red, green, blue, 0, 0, 0])
+
+
+def fade_report(color, *, led=LED_ALL, speed=1):
+    """Build fade report."""
+
+    red, green, blue = resolve_color(color)
+    cmn.validate_led(led)
+    cmn.validate_speed(speed)
+    return bytes([CMD_REPORT_NUM, MODE_FADE, led, red, green, blue, speed, 0, 0])
+
+
+def strobe_report(color, *, led=LED_ALL, speed=0, repeat=0):
+    """Build strobe report."""
+
+    red, green, blue = resolve_color(color)
+    cmn.validate_led(led)
+    cmn.validate_speed(speed)
+    cmn.validate_repeat(repeat)
+    return bytes([CMD_REPORT_NUM, MODE_STROBE, led, red, green, blue, speed, 0, repeat])
+
+
+def wave_report(color, *, wave=WAVE_SHORT, speed=0, repeat=0):
+    """Build wave report."""
+
+    red, green, blue = resolve_color(color)
+    cmn.validate_wave(wave)
+    cmn.validate_speed(speed)
+    cmn.validate_repeat(repeat)
+    return bytes([CMD_REPORT_NUM, MODE_WAVE, wave, red, green, blue, 0, repeat, speed])
+
+
+def pattern_report(pattern, *, repeat=0):
+    """Build pattern report."""
+
+    cmn.validate_pattern(pattern)
+    cmn.validate_repeat(repeat)
+    return bytes([CMD_REPORT_NUM, MODE_PATTERN, pattern, repeat, 0, 0, 0, 0, 0])
+
+
+def report_repeat(report):
+    """
+    Get the repeat value of a report.
+
+    Returns `None` for reports that do not repeat.
+    """
+
+    mode = report[1]
+    if mode == MODE_STROBE:
+        return report[8]
+    elif mode == MODE_WAVE:
+        return report[7]
+    elif mode == MODE_PATTERN:
+        return report[3]
+    return None
+
+
+RE_USB_PORT = re.compile(r'/(\d+-\d+(?:\.\d+)*):\d+\.(\d+)/')
+
+
+def device_topology(path):
+    """
+    Get the physical location of a device from its path.
+
+    The location is the USB port chain and interface on Linux (resolved through sysfs), the device instance on Windows,
+    and the IOService path on macOS, all of which stay the same when a device is reconnected to the same port.
+    Returns `None` if the location cannot be determined.
+    """
+
+    path = os.fsdecode(path)
+    if path.startswith(os.path.join(hidraw.dev_root, 'hidraw')):
+        device = os.path.realpath(os.path.join(hidraw.sysfs_root, 'class', 'hidraw', os.path.basename(path), 'device'))
+        m = RE_USB_PORT.search(device)
+        return '{}:{}'.format(*m.groups()) if m else None
+    elif path.lower().startswith('\\\\?\\hid#'):
+        # `\\?\hid#vid_04d8&pid_f372#<instance>#{<interface class>}`
+        parts = path.split('#')
+        return parts[2].lower() if len(parts) > 3 else None
+    elif path.startswith('IOService:'):
+        return path
+    return None
+
+
+def device_identity(device, devices):
+    """
+    Identify a device from its enumeration info without opening it.
+
+    The serial number is used if the device reports one that no other device shares, otherwise the device's
+    location is used. Returns `None` if the device can't be identified.
+    """
+
+    serial = device.get('serial_number')
+    if serial and sum(1 for d in devices if d.get('serial_number') == serial) == 1:
+        return ('serial', serial)
+    topology = device_topology(device['path'])
+    if topology is not None:
+        return ('topology', topology)
+    return None
+
+
+def report_target(report):
+    """
+    Get the LEDs a report sets.
+
+    Returns the LED selector for reports that target specific LEDs,
+    and `LED_ALL` for reports that drive the whole device.
+    """
+
+    if report[1] in (MODE_STATIC, MODE_FADE, MODE_STROBE):
+        return report[2]
+    return LED_ALL
+
+
+def describe_report(report):
+    """
+    Describe a report as the command that sends it and the command's arguments, like a scheduled event.
+
+    Colors are given as hex colors, or as the single letter basic colors.
+    """
+
+    mode = report[1]
+    color = '#{:02x}{:02x}{:02x}'.format(*report[3:6])
+    if mode == MODE_BASIC:
+        if report[2] == ord('O'):
+            return {"cmd": "off", "args": {}}
+        return {"cmd": "color", "args": {"color": chr(report[2])}}
+    elif mode == MODE_STATIC:
+        return {"cmd": "color", "args": {"color": color, "led": report[2]}}
+    elif mode == MODE_FADE:
+        return {"cmd": "fade", "args": {"color": color, "led": report[2], "speed": report[6]}}
+    elif mode == MODE_STROBE:
+        return {"cmd": "strobe", "args": {"color": color, "led": report[2], "speed": report[6], "repeat": report[8]}}
+    elif mode == MODE_WAVE:
+        return {"cmd": "wave", "args": {"color": color, "wave": report[2], "speed": report[8], "repeat": report[7]}}
+    return {"cmd": "pattern", "args": {"pattern": report[2], "repeat": report[3]}}
+
+
+def validate_report(report):
+    """Validate a pre-encoded device report."""
+
+    if len(report) != REPORT_SIZE:
+        raise ValueError('Reports must be {} bytes, {} bytes were given'.format(REPORT_SIZE, len(report)))
+    if report[0] != CMD_REPORT_NUM:
+        raise ValueError('Report number must be {}, {} was given'.format(CMD_REPORT_NUM, report[0]))
+
+    mode = report[1]
+    if mode == MODE_BASIC:
+        cmn.validate_simple_color(report[2])
+    elif mode in (MODE_STATIC, MODE_FADE, MODE_STROBE):
+        cmn.validate_led(report[2])
+    elif mode == MODE_WAVE:
+        cmn.validate_wave(report[2])
+    elif mode == MODE_PATTERN:
+        cmn.validate_pattern(report[2])
+    else:
+        raise ValueError('Unrecognized report command mode {}'.format(mode))
+
+
+class WritePacer:
+    """
+    Token bucket that paces writes to the device.
+
+    The write rate adapts to the device: it increases additively while writes complete quickly and is cut in half
+    when writes fail or the average write latency exceeds the target (at most once per `cooldown` seconds).
+    """
+
+    def __init__(
+        self, rate=60.0, burst=6, min_rate=5.0, max_rate=250.0, increase=1.0,
+        target=0.02, cooldown=1.0, timer=time.monotonic
+    ):
+        """Initialize."""
+
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.target = target
+        self.cooldown = cooldown
+        self.timer = timer
+        self.tokens = float(burst)
+        self.stamp = timer()
+        self.backoff = None
+        self.latency = None
+        self.writes = 0
+        self.errors = 0
+        self.waits = 0
+        self.waited = 0.0
+        self.decreases = 0
+        self.coalesced = 0
+
+    def _refill(self):
+        """Add the tokens earned since the last refill."""
+
+        now = self.timer()
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def delay(self):
+        """Get the time until the next write is allowed."""
+
+        self._refill()
+        return 0.0 if self.tokens >= 1.0 else (1.0 - self.tokens) / self.rate
+
+    def wait(self, sleep=time.sleep):
+        """Wait until a write is allowed and take a token for it."""
+
+        d = self.delay()
+        while d > 0:
+            self.waits += 1
+            self.waited += d
+            sleep(d)
+            d = self.delay()
+        self.tokens -= 1.0
+
+    def record(self, latency, failed=False):
+        """Adapt the rate to the outcome of a write."""
+
+        self.writes += 1
+        if failed:
+            self.errors += 1
+        else:
+            self.latency = latency if self.latency is None else self.latency * 0.8 + latency * 0.2
+
+        if failed or self.latency > self.target:
+            now = self.timer()
+            if self.backoff is None or now - self.backoff >= self.cooldown:
+                self.backoff = now
+                self.rate = max(self.min_rate, self.rate / 2)
+                self.decreases += 1
+        else:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def stats(self):
+        """Get pacing statistics."""
+
+        return {
+            "rate": round(self.rate, 2),
+            "max_rate": self.max_rate,
+            "latency": None if self.latency is None else round(self.latency, 6),
+            "writes": self.writes,
+            "errors": self.errors,
+            "waits": self.waits,
+            "waited": round(self.waited, 6),
+            "decreases": self.decreases,
+            "coalesced": self.coalesced
+        }
+
+
+def spawn_thread(func, *args):
+    """Run the function in a daemon thread."""
+
+    thread = threading.Thread(target=func, args=args, daemon=True)
+    thread.start()
+    return thread
+
+
+class ReconnectSupervisor:
+    """
+    Reconnect a disconnected device in the background.
+
+    Attempts are spaced out with exponential backoff and jitter, so a missing device costs little while it is gone.
+    `spawn` and `sleep` can be replaced to run the supervisor in something other than a thread. If given, `notify` is
+    called with `False` when the device is lost and with `True` when it is back.
+    """
+
+    def __init__(self, base=0.5, factor=2.0, max_delay=30.0, spawn=spawn_thread, sleep=time.sleep, notify=None):
+        """Initialize."""
+
+        self.base = base
+        self.factor = factor
+        self.max_delay = max_delay
+        self.spawn = spawn
+        self.sleep = sleep
+        self.notify = notify
+        self.running = False
+        self.attempts = 0
+        self.reconnects = 0
+        self.replayed = 0
+
+    def delay(self, attempt):
+        """Get the delay before the given attempt."""
+
+        delay = min(self.max_delay, self.base * self.factor ** attempt)
+        # Keep at least half the delay, and randomize the rest so devices don't retry in lock step.
+        return delay / 2 + random.random() * delay / 2
+
+    def start(self, device):
+        """Start reconnecting the device if we aren't already."""
+
+        if not self.running:
+            self.running = True
+            if self.notify is not None:
+                self.notify(False)
+            self.spawn(self._run, device)
+
+    def _run(self, device):
+        """Try to reconnect until the device is back or closed."""
+
+        attempt = 0
+        try:
+            while not device._closed:
+                self.sleep(self.delay(attempt))
+                self.attempts += 1
+                replayed = device._recover()
+                if replayed is not None:
+                    self.reconnects += 1
+                    self.replayed += replayed
+                    if self.notify is not None:
+                        self.notify(True)
+                    break
+                attempt += 1
+        finally:
+            self.running = False
+
+    def stats(self):
+        """Get reconnect statistics."""
+
+        return {
+            "running": self.running,
+            "attempts": self.attempts,
+            "reconnects": self.reconnects,
+            "replayed": self.replayed
+        }
 
 
 class Luxafor:
@@ -90,8 +470,16 @@ class Luxafor:
 
     """
 
-    def __init__(self, index=0, path=None):
-        """Initialize."""
+    def __init__(self, index=0, path=None, pacer=None, sleep=time.sleep, supervisor=None):
+        """
+        Initialize.
+
+        Writes are paced with `pacer` (see `WritePacer`) if one is given, and `sleep` is used to wait between writes.
+
+        If a `supervisor` (see `ReconnectSupervisor`) is given, a disconnected device is reconnected in the background
+        instead of on every command. While the device is gone, commands fail immediately, but the latest state is
+        kept and replayed once the device is back.
+        """
 
         device = None
         devices = enumerate_luxafor()
@@ -109,11 +497,23 @@ class Luxafor:
             if index < 0 or index >= len(devices):
                 raise RuntimeError('The Luxafor device at index {} cannot be found'.format(index))
             device = devices[index]['path']
+        info = next(d for d in devices if d['path'] == device)
+        self.pacer = pacer
+        self._sleep = sleep
+        # Sequence number of the latest report for each LED target, see `pace`.
+        self._latest = {}
+        self._seq = 0
+        self.supervisor = supervisor
+        # Latest report for each LED target, sent while the device was disconnected.
+        self._offline = {}
+        self._lock = threading.Lock()
         self._path = device
-        self._device = hid.Device(path=self._path)
+        self._device = device_backend.Device(path=self._path)
         self._closed = False
         self._disconnected = False
-        self._serial = self._get_serial()
+        # Identify the device from enumeration if possible, and only fall back to asking the device for its serial.
+        self._identity = device_identity(info, devices)
+        self._serial = self._get_serial() if self._identity is None else None
 
     def _get_serial(self):
         """Get serial number."""
@@ -139,14 +539,36 @@ class Luxafor:
             self._disconnected = True
             self._device = None
 
+    def _is_identified(self, device):
+        """Check if the enumerated device is our device."""
+
+        kind, value = self._identity
+        if kind == 'serial':
+            return device.get('serial_number') == value
+        return device_topology(device['path']) == value
+
     def _reconnect(self):
         """Reconnect device."""
 
         devices = enumerate_luxafor()
+        if self._identity is not None:
+            # Check the last known path first as it usually comes back the same.
+            devices.sort(key=lambda d: d['path'] != self._path)
+            for device in devices:
+                if self._is_identified(device):
+                    try:
+                        self._device = device_backend.Device(path=device['path'])
+                    except Exception:
+                        break
+                    self._path = device['path']
+                    self._disconnected = False
+                    break
+            return not self._disconnected
+
         for device in devices:
             path = device['path']
             try:
-                self._device = hid.Device(path=path)
+                self._device = device_backend.Device(path=path)
                 if self._get_serial() == self._serial:
                     self._path = path
                     self._disconnected = False
@@ -162,7 +584,47 @@ class Luxafor:
         """Close Luxafor device."""
 
         self._closed = True
-        return self._device.close()
+        if self._device is not None:
+            self._device.close()
+
+    @property
+    def connected(self):
+        """Check if the device is connected."""
+
+        return not self._disconnected
+
+    def _hold(self, cmd):
+        """Hold the report as the latest state until the device reconnects."""
+
+        target = report_target(cmd)
+        if target == LED_ALL:
+            self._offline.clear()
+        else:
+            self._offline.pop(target, None)
+        self._offline[target] = cmd
+
+    def _recover(self):
+        """
+        Reconnect the device and replay the state it missed.
+
+        Returns the number of reports replayed, or `None` if the device could not be reconnected.
+        """
+
+        with self._lock:
+            if not self._disconnected:
+                return 0
+            if not self._reconnect():
+                return None
+            reports = list(self._offline.values())
+            self._offline.clear()
+            try:
+                for report in reports:
+                    self._device.write(report)
+            except hid.HIDException:
+                self._disconnect()
+                self._offline.update((report_target(r), r) for r in reports)
+                return None
+        return len(reports)
 
     def off(self):
         """Set all LEDs to off."""
@@ -187,9 +649,7 @@ class Luxafor:
 
         """
 
-        color = ord(color.upper())
-        cmn.validate_simple_color(color)
-        return self._execute([CMD_REPORT_NUM, MODE_BASIC, color])
+        return self._execute(basic_color_report(color))
 
     def color(self, color, *, led=LED_ALL):
         """
@@ -209,12 +669,7 @@ class Luxafor:
 
         """
 
-        if isinstance(color, str) and len(color) == 1:
-            return self.basic_color(color)
-        else:
-            red, green, blue = resolve_color(color)
-            cmn.validate_led(led)
-            return self._execute([CMD_REPORT_NUM, MODE_STATIC, led, red, green, blue, 0, 0, 0])
+        return self._execute(color_report(color, led=led))
 
     def fade(self, color, *, led=LED_ALL, speed=1, wait=False):
         """
@@ -234,10 +689,7 @@ class Luxafor:
 
         """
 
-        red, green, blue = resolve_color(color)
-        cmn.validate_led(led)
-        cmn.validate_speed(speed)
-        return self._execute([CMD_REPORT_NUM, MODE_FADE, led, red, green, blue, speed, 0, 0], wait=wait)
+        return self._execute(fade_report(color, led=led, speed=speed), wait=wait)
 
     def wave(self, color, *, wave=WAVE_SHORT, speed=0, repeat=0, wait=False):
         """
@@ -257,14 +709,7 @@ class Luxafor:
 
         """
 
-        # We cannot wait when repeat is set to go on forever.
-        if repeat == 0:
-            wait = False
-        red, green, blue = resolve_color(color)
-        cmn.validate_wave(wave)
-        cmn.validate_speed(speed)
-        cmn.validate_repeat(repeat)
-        return self._execute([CMD_REPORT_NUM, MODE_WAVE, wave, red, green, blue, 0, repeat, speed], wait=wait)
+        return self.send_report(wave_report(color, wave=wave, speed=speed, repeat=repeat), wait=wait)
 
     def strobe(self, color, *, led=LED_ALL, speed=0, repeat=0, wait=False):
         """
@@ -284,14 +729,7 @@ class Luxafor:
 
         """
 
-        # We cannot wait when repeat is set to go on forever.
-        if repeat == 0:
-            wait = False
-        red, green, blue = resolve_color(color)
-        cmn.validate_led(led)
-        cmn.validate_speed(speed)
-        cmn.validate_repeat(repeat)
-        return self._execute([CMD_REPORT_NUM, MODE_STROBE, led, red, green, blue, speed, 0, repeat], wait=wait)
+        return self.send_report(strobe_report(color, led=led, speed=speed, repeat=repeat), wait=wait)
 
     def pattern(self, pattern, *, repeat=0, wait=False):
         """
@@ -306,12 +744,60 @@ class Luxafor:
 
         """
 
+        return self.send_report(pattern_report(pattern, repeat=repeat), wait=wait)
+
+    def send_report(self, report, *, wait=False):
+        """
+        Send a pre-encoded report.
+
+        The report is validated before it is sent to the device.
+        """
+
+        validate_report(report)
         # We cannot wait when repeat is set to go on forever.
-        if repeat == 0:
+        if report_repeat(report) == 0:
             wait = False
-        cmn.validate_pattern(pattern)
-        cmn.validate_repeat(repeat)
-        return self._execute([CMD_REPORT_NUM, MODE_PATTERN, pattern, repeat, 0, 0, 0, 0, 0], wait=wait)
+        return self._execute(report, wait=wait)
+
+    def pace(self, report):
+        """
+        Wait until the device can accept the report.
+
+        This is meant for callers that send reports concurrently. If a newer report that sets the same LEDs arrives
+        while waiting, the report is stale and `False` is returned, in which case it should not be sent.
+        """
+
+        if self.pacer is None:
+            return True
+
+        target = report_target(report)
+        self._seq += 1
+        seq = self._seq
+        self._latest[target] = seq
+        d = self.pacer.delay()
+        while d > 0:
+            self._sleep(d)
+            if self._latest[target] != seq or self._latest.get(LED_ALL, 0) > seq:
+                self.pacer.coalesced += 1
+                return False
+            d = self.pacer.delay()
+        return True
+
+    def _write(self, cmd):
+        """Write to the device, pacing writes if required."""
+
+        if self.pacer is None:
+            self._device.write(cmd)
+            return
+
+        self.pacer.wait(self._sleep)
+        start = time.perf_counter()
+        try:
+            self._device.write(cmd)
+        except hid.HIDException:
+            self.pacer.record(time.perf_counter() - start, True)
+            raise
+        self.pacer.record(time.perf_counter() - start)
 
     def _execute(self, cmd, wait=False):
         """
@@ -320,22 +806,33 @@ class Luxafor:
         Return false if there was an error.
         """
 
-        if self._disconnected and not self._reconnect():
+        if self._closed:
             return True
-        elif self._closed:
+
+        if self.supervisor is not None:
+            with self._lock:
+                if self._disconnected:
+                    self._hold(bytes(cmd))
+                    return True
+        elif self._disconnected and not self._reconnect():
             return True
 
         try:
-            self._device.write(bytes(cmd))
+            self._write(bytes(cmd))
         except hid.HIDException:
             # Failed to connect
             self._disconnect()
 
         # Attempt to reconnect and try again
         if self._disconnected:
+            if self.supervisor is not None:
+                with self._lock:
+                    self._hold(bytes(cmd))
+                self.supervisor.start(self)
+                return True
             if not self._reconnect():
                 return True
-            self._device.write(bytes(cmd))
+            self._write(bytes(cmd))
 
         # Wait for commands that take time to complete.
         # When the `hid` is released on Windows, the current
@@ -347,5 +844,261 @@ class Luxafor:
                     pass
             except hid.HIDException:
                 self._disconnect()
+                if self.supervisor is not None:
+                    self.supervisor.start(self)
                 return True
         return False
+
+
+class AsyncLuxafor:
+    """
+    Luxafor device driven by an `asyncio` event loop.
+
+    Commands are coroutines that return `True` if they failed, just like `Luxafor`. Waiting for a command to complete
+    never blocks the loop: with the hidraw backend, the device is watched by the loop and messages are dispatched as
+    they arrive, and with hidapi, which doesn't expose a descriptor, the device is polled with nonblocking reads while
+    commands are waiting. Writing never blocks the loop either: with hidraw, the loop waits for the device to accept
+    the report, and hidapi, whose writes block, writes from a worker thread, one report at a time and in order.
+
+    Every message read from the device is passed to `on_message`, if given.
+    """
+
+    def __init__(self, index=0, path=None, on_message=None, poll_interval=POLL_INTERVAL):
+        """Initialize."""
+
+        self.luxafor = Luxafor(index, path)
+        self.on_message = on_message
+        self.poll_interval = poll_interval
+        self._loop = None
+        self._watched = None
+        self._poller = None
+        self._waiters = deque()
+        self._executor = None
+
+    async def __aenter__(self):
+        """Enter."""
+
+        return self
+
+    async def __aexit__(self, type, value, traceback):  # noqa: A002
+        """Exit."""
+
+        self.close()
+
+    @property
+    def connected(self):
+        """Check if the device is connected."""
+
+        return self.luxafor.connected
+
+    def _fileno(self):
+        """Get the device's file descriptor, or `None` if it has to be polled."""
+
+        fileno = getattr(self.luxafor._device, 'fileno', None)
+        return fileno() if fileno is not None else None
+
+    def _watch(self):
+        """Watch the device for messages, if the device can be watched by the loop."""
+
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+        if self._watched is None and self.luxafor._device is not None:
+            fd = self._fileno()
+            if fd is not None:
+                self._loop.add_reader(fd, self._dispatch)
+                self._watched = fd
+
+    def _unwatch(self):
+        """Stop watching the device."""
+
+        if self._watched is not None:
+            self._loop.remove_reader(self._watched)
+            self._watched = None
+
+    def _dispatch(self):
+        """Read and dispatch all the messages that are available."""
+
+        device = self.luxafor._device
+        while device is not None:
+            try:
+                msg = device.read(MSG_SIZE, 0)
+            except hid.HIDException:
+                self._lost()
+                return
+            if not msg:
+                break
+            if self.on_message is not None:
+                self.on_message(msg)
+            if msg == MSG_NON_IMMEDIATE_COMPLETE:
+                while self._waiters:
+                    future = self._waiters.popleft()
+                    if not future.done():
+                        future.set_result(None)
+                        break
+
+    async def _poll(self):
+        """Poll a device that can't be watched while commands are waiting on it."""
+
+        try:
+            while self._waiters:
+                self._dispatch()
+                await asyncio.sleep(self.poll_interval)
+        finally:
+            self._poller = None
+
+    def _lost(self):
+        """Disconnect the lost device and fail anything waiting on it."""
+
+        self._unwatch()
+        self.luxafor._disconnect()
+        while self._waiters:
+            future = self._waiters.popleft()
+            if not future.done():
+                future.set_exception(hid.HIDException('device disconnected'))
+
+    def _reconnect(self):
+        """Reconnect the device and watch it again."""
+
+        if not self.luxafor._reconnect():
+            return False
+        self._watch()
+        return True
+
+    def close(self):
+        """Close Luxafor device."""
+
+        self._unwatch()
+        if self._poller is not None:
+            self._poller.cancel()
+        while self._waiters:
+            self._waiters.popleft().cancel()
+        if self._executor is not None:
+            # Let a write that is in progress finish before the device is closed.
+            self._executor.shutdown()
+            self._executor = None
+        self.luxafor.close()
+
+    async def _writable(self, fd):
+        """Wait for the device to accept a write."""
+
+        future = self._loop.create_future()
+
+        def ready():
+            """Wake up the writer."""
+
+            if not future.done():
+                future.set_result(None)
+
+        self._loop.add_writer(fd, ready)
+        try:
+            await asyncio.wait_for(future, hidraw.WRITE_TIMEOUT / 1000)
+        except asyncio.TimeoutError:
+            raise hid.HIDException('timed out writing to device') from None
+        finally:
+            self._loop.remove_writer(fd)
+
+    async def _write(self, cmd):
+        """Write a report without blocking the loop."""
+
+        if self._watched is not None:
+            # The hidraw descriptor is nonblocking, so the loop can wait for the device to be ready.
+            device = self.luxafor._device
+            if device.try_write(cmd) is None:
+                await self._writable(self._watched)
+                if device.try_write(cmd) is None:
+                    raise hid.HIDException('timed out writing to device')
+        else:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1)
+            await self._loop.run_in_executor(self._executor, self.luxafor._write, cmd)
+
+    async def _execute(self, cmd, wait=False):
+        """
+        Send the report, and if requested, wait for it to complete.
+
+        Return false if there was an error.
+        """
+
+        if self.luxafor._closed:
+            return True
+
+        self._watch()
+        if self.luxafor._disconnected and not self._reconnect():
+            return True
+
+        if wait and self._watched is None:
+            # Discard completions of earlier commands that nobody waited for.
+            self._dispatch()
+
+        for attempt in range(2):
+            # The loop runs while the report is written, so wait for the completion before it can be dispatched.
+            future = None
+            if wait:
+                future = self._loop.create_future()
+                self._waiters.append(future)
+            try:
+                await self._write(cmd)
+                break
+            except hid.HIDException:
+                if future is not None:
+                    future.cancel()
+                self._lost()
+                if attempt or not self._reconnect():
+                    return True
+
+        if future is not None:
+            if self._watched is None and self._poller is None:
+                self._poller = self._loop.create_task(self._poll())
+            try:
+                await future
+            except hid.HIDException:
+                return True
+        return False
+
+    async def send_report(self, report, *, wait=False):
+        """
+        Send a pre-encoded report.
+
+        The report is validated before it is sent to the device.
+        """
+
+        validate_report(report)
+        # We cannot wait when repeat is set to go on forever.
+        if report_repeat(report) == 0:
+            wait = False
+        return await self._execute(bytes(report), wait=wait)
+
+    async def off(self):
+        """Set all LEDs to off."""
+
+        return await self._execute(off_report())
+
+    async def basic_color(self, color):
+        """Set a basic color."""
+
+        return await self._execute(basic_color_report(color))
+
+    async def color(self, color, *, led=LED_ALL):
+        """Set a static color."""
+
+        return await self._execute(color_report(color, led=led))
+
+    async def fade(self, color, *, led=LED_ALL, speed=1, wait=False):
+        """Fade to a color."""
+
+        return await self._execute(fade_report(color, led=led, speed=speed), wait=wait)
+
+    async def wave(self, color, *, wave=WAVE_SHORT, speed=0, repeat=0, wait=False):
+        """Use the wave effect."""
+
+        return await self.send_report(wave_report(color, wave=wave, speed=speed, repeat=repeat), wait=wait)
+
+    async def strobe(self, color, *, led=LED_ALL, speed=0, repeat=0, wait=False):
+        """Strobe a color."""
+
+        return await self.send_report(strobe_report(color, led=led, speed=speed, repeat=repeat), wait=wait)
+
+    async def pattern(self, pattern, *, repeat=0, wait=False):
+        """Use a built-in pattern."""
+
+        return await self.send_report(pattern_report(pattern, repeat=repeat), wait=wait)
@@ -0,0 +1,116 @@
+"""
+Benchmark device enumeration.
+
+Compares the time and memory needed to enumerate devices as dictionaries (`DeviceInfo.as_dict`) against
+`DeviceRecord`. A simulated `hid_enumerate` result is used so no devices or hidapi library are required.
+
+```
+python tools/bench_enumerate.py --devices 200 --matches 2
+```
+"""
+import argparse
+import ctypes
+import os
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pyluxa4 import hid  # noqa: E402
+
+VENDOR = 0x04d8
+PRODUCT = 0xf372
+
+
+class FakeHidapi:
+    """Simulated hidapi library that returns a prebuilt enumeration."""
+
+    def __init__(self, count, matches):
+        """Build a linked list of `count` devices, `matches` of which are Luxafor devices."""
+
+        self.entries = (hid.DeviceInfo * count)()
+        self.strings = []
+        for i in range(count):
+            entry = self.entries[i]
+            match = i < matches
+            entry.path = self.keep(ctypes.create_string_buffer('/dev/hidraw{}'.format(i).encode('ascii')))
+            entry.vendor_id = VENDOR if match else 0x046d
+            entry.product_id = PRODUCT if match else 0xc000 + i
+            entry.serial_number = 'SERIAL{:08d}'.format(i)
+            entry.release_number = 0x100
+            entry.manufacturer_string = 'Manufacturer {}'.format(i)
+            entry.product_string = 'Product {}'.format(i)
+            entry.usage_page = 0xff00
+            entry.usage = 1
+            entry.interface_number = 0
+            if i + 1 < count:
+                entry.next = ctypes.pointer(self.entries[i + 1])
+
+    def keep(self, buf):
+        """Keep a buffer alive for as long as the enumeration."""
+
+        self.strings.append(buf)
+        return ctypes.cast(buf, ctypes.c_char_p).value
+
+    def hid_enumerate(self, vid, pid):
+        """Enumerate."""
+
+        return ctypes.pointer(self.entries[0])
+
+    def hid_free_enumeration(self, info):
+        """Free enumeration."""
+
+
+def enumerate_dicts(vid=0, pid=0):
+    """Enumerate devices as dictionaries, filtering afterwards (the previous behavior)."""
+
+    ret = []
+    info = hid.hidapi.hid_enumerate(vid, pid)
+    c = info
+    while c:
+        ret.append(c.contents.as_dict())
+        c = c.contents.next
+    hid.hidapi.hid_free_enumeration(info)
+    return [d for d in ret if (not vid or d['vendor_id'] == vid) and (not pid or d['product_id'] == pid)]
+
+
+def enumerate_records(vid=0, pid=0):
+    """Enumerate devices as records."""
+
+    return hid.enumerate(vid, pid)
+
+
+def measure(func, vid, pid, number):
+    """Return the average time and peak memory of the enumeration."""
+
+    elapsed = timeit.timeit(lambda: [d['path'] for d in func(vid, pid)], number=number) / number
+    tracemalloc.start()
+    result = func(vid, pid)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del result
+    return elapsed, peak
+
+
+def main():
+    """Main."""
+
+    parser = argparse.ArgumentParser(prog='bench_enumerate', description='Benchmark device enumeration.')
+    parser.add_argument('--devices', type=int, default=200, help="Number of simulated HID devices.")
+    parser.add_argument('--matches', type=int, default=2, help="Number of simulated Luxafor devices.")
+    parser.add_argument('--number', type=int, default=200, help="Number of enumerations to time.")
+    args = parser.parse_args()
+
+    hid.hidapi = FakeHidapi(args.devices, args.matches)
+
+    print('{:<24} {:>12} {:>12}'.format('', 'time (us)', 'peak (KiB)'))
+    for label, vid, pid in (('all devices', 0, 0), ('luxafor devices', VENDOR, PRODUCT)):
+        for name, func in (('dict', enumerate_dicts), ('record', enumerate_records)):
+            elapsed, peak = measure(func, vid, pid, args.number)
+            print('{:<24} {:>12.1f} {:>12.1f}'.format('{} ({})'.format(label, name), elapsed * 1e6, peak / 1024))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
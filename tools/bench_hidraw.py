@@ -0,0 +1,154 @@
+"""
+Benchmark the hidraw backend.
+
+Measures enumeration time and per-report write latency. By default, a simulated sysfs tree is built with named pipes
+standing in for the `/dev/hidrawN` device nodes, so no devices are required, and only the hidraw backend is measured.
+With `--device`, both the hidapi and hidraw backends write to a real device, which is set to off.
+
+```
+python tools/bench_hidraw.py --devices 50
+python tools/bench_hidraw.py --device /dev/hidraw3
+```
+"""
+import argparse
+import os
+import select
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pyluxa4 import hid  # noqa: E402
+from pyluxa4 import hidraw  # noqa: E402
+from pyluxa4 import usb  # noqa: E402
+
+VENDOR = 0x04d8
+PRODUCT = 0xf372
+
+
+def build_tree(root, count):
+    """Build a simulated sysfs tree and device nodes, where the first device is a Luxafor device."""
+
+    sysfs = os.path.join(root, 'sys')
+    dev = os.path.join(root, 'dev')
+    os.makedirs(os.path.join(sysfs, 'class', 'hidraw'))
+    os.makedirs(dev)
+    for i in range(count):
+        name = 'hidraw{}'.format(i)
+        port = '1-{}'.format(i + 1)
+        usb_device = os.path.join(sysfs, 'devices', 'pci0000:00', '0000:00:14.0', 'usb1', port)
+        interface = os.path.join(usb_device, '{}:1.0'.format(port))
+        vid, pid = (VENDOR, PRODUCT) if i == 0 else (0x046d, 0xc000 + i)
+        hid_device = os.path.join(interface, '0003:{:04X}:{:04X}.{:04X}'.format(vid, pid, i + 1))
+        os.makedirs(hid_device)
+        with open(os.path.join(hid_device, 'uevent'), 'w') as f:
+            f.write(
+                'DRIVER=hid-generic\nHID_ID=0003:{:08X}:{:08X}\nHID_NAME=Device {}\n'
+                'HID_PHYS=usb-0000:00:14.0-{}/input0\nHID_UNIQ=\n'.format(vid, pid, i, i + 1)
+            )
+        for attr, value in (('manufacturer', 'Manufacturer'), ('product', 'Product'), ('bcdDevice', '0100')):
+            with open(os.path.join(usb_device, attr), 'w') as f:
+                f.write(value + '\n')
+        os.makedirs(os.path.join(sysfs, 'class', 'hidraw', name))
+        os.symlink(hid_device, os.path.join(sysfs, 'class', 'hidraw', name, 'device'))
+        os.mkfifo(os.path.join(dev, name))
+    return sysfs, dev
+
+
+def drain(path, stop):
+    """Read everything written to a device node until stopped."""
+
+    fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+    poll = select.poll()
+    poll.register(fd, select.POLLIN)
+    try:
+        while not stop.is_set():
+            if poll.poll(10):
+                os.read(fd, 65536)
+    finally:
+        os.close(fd)
+
+
+def measure_writes(device, number):
+    """Return the average time to write a report."""
+
+    report = usb.off_report()
+    start = time.perf_counter()
+    for _ in range(number):
+        device.write(report)
+    return (time.perf_counter() - start) / number
+
+
+def measure_enumerate(module, number):
+    """Return the average time to enumerate Luxafor devices."""
+
+    start = time.perf_counter()
+    for _ in range(number):
+        module.enumerate(VENDOR, PRODUCT)
+    return (time.perf_counter() - start) / number
+
+
+def simulated(args):
+    """Benchmark the hidraw backend against a simulated tree."""
+
+    root = tempfile.mkdtemp(prefix='pyluxa4-hidraw-')
+    try:
+        sysfs, dev = build_tree(root, args.devices)
+        hidraw.init(sysfs, dev)
+        devices = hidraw.enumerate(VENDOR, PRODUCT)
+        print('Found {}: {}'.format(len(devices), ', '.join(os.fsdecode(d['path']) for d in devices)))
+        print('{:<24} {:>12}'.format('', 'time (us)'))
+        print('{:<24} {:>12.1f}'.format('enumerate (hidraw)', measure_enumerate(hidraw, args.enumerations) * 1e6))
+
+        stop = threading.Event()
+        thread = threading.Thread(target=drain, args=(os.fsdecode(devices[0]['path']), stop))
+        thread.start()
+        try:
+            with hidraw.Device(path=devices[0]['path']) as device:
+                elapsed = measure_writes(device, args.number)
+        finally:
+            stop.set()
+            thread.join()
+        print('{:<24} {:>12.1f}'.format('write (hidraw)', elapsed * 1e6))
+    finally:
+        shutil.rmtree(root)
+
+
+def real(args):
+    """Benchmark both backends against a real device."""
+
+    hidraw.init()
+    hid.init(args.hidapi)
+    print('{:<24} {:>12}'.format('', 'time (us)'))
+    for name, module in (('hidapi', hid), ('hidraw', hidraw)):
+        elapsed = measure_enumerate(module, args.enumerations)
+        print('{:<24} {:>12.1f}'.format('enumerate ({})'.format(name), elapsed * 1e6))
+    for name, module in (('hidapi', hid), ('hidraw', hidraw)):
+        with module.Device(path=os.fsencode(args.device)) as device:
+            elapsed = measure_writes(device, args.number)
+        print('{:<24} {:>12.1f}'.format('write ({})'.format(name), elapsed * 1e6))
+
+
+def main():
+    """Main."""
+
+    parser = argparse.ArgumentParser(prog='bench_hidraw', description='Benchmark the hidraw backend.')
+    parser.add_argument('--devices', type=int, default=50, help="Number of simulated HID devices.")
+    parser.add_argument('--device', default=None, help="Path of a real Luxafor hidraw device node to write to.")
+    parser.add_argument('--hidapi', default=None, help="Explicit, absolute path to the hidapi library.")
+    parser.add_argument('--number', type=int, default=1000, help="Number of reports to write.")
+    parser.add_argument('--enumerations', type=int, default=100, help="Number of enumerations to time.")
+    args = parser.parse_args()
+
+    if args.device:
+        real(args)
+    else:
+        simulated(args)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())